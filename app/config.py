@@ -1,12 +1,34 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Dict
+from typing import Dict, Optional
+
+from tortoise.backends.base.config_generator import expand_db_url
 
 
 class TortoiseORMSettings(BaseSettings):
     db_connection: str = "sqlite://db.sqlite3"
     apps_models_models: str = "app.models"
     apps_models_default_connection: str = "default"
+    # workers skip DDL on boot, run `python -m app.migrate` once per deploy instead
+    generate_schemas: bool = False
+    # asyncpg pool, not used with sqlite
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    # set to 0 behind pgbouncer in transaction mode
+    pool_statement_cache_size: int = 100
+    # idle connections above pool_min_size are closed after this many seconds
+    pool_idle_timeout: float = 300.0
+    pool_command_timeout: Optional[float] = 30.0
+    # a request waiting longer than this for a connection gets a 503
+    pool_acquire_timeout: float = 5.0
+    pool_retry_after: int = 1
+    # optional read replica for listing and reporting routes
+    replica_db_connection: Optional[str] = None
+    # a session that wrote reads from the primary for this many seconds
+    replica_sticky_seconds: int = 10
+    # the primary is used while the replica is further behind than this
+    replica_max_lag: float = 5.0
+    replica_lag_check_interval: float = 5.0
 
 
 class JWTSettings(BaseSettings):
@@ -30,18 +52,132 @@ class OTPSettings(BaseSettings):
     digits: int = 6
     interval: int = 21212
     resend_timeout: int = 60
+    cache_size: int = 10000
+    cache_ttl: int = 300
+
+
+class CacheSettings(BaseSettings):
+    principal_size: int = 10000
+    principal_ttl: int = 30
+    permission_size: int = 10000
+    permission_ttl: int = 300
+    # business of the /user/me profile, wallet balances are always read fresh
+    profile_size: int = 10000
+    profile_ttl: int = 60
+
+
+class PasswordSettings(BaseSettings):
+    hash_workers: int = 4
+    hash_max_pending: int = 32
+    hash_retry_after: int = 1
+
+
+class IPGSettings(BaseSettings):
+    timeout: float = 30.0
+    connect_timeout: float = 10.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    # finalised transactions remembered to answer repeated callbacks
+    callback_cache_size: int = 10000
+    callback_cache_ttl: int = 3600
+    # callbacks redirect at once and gateway verification runs in background tasks
+    verify_in_background: bool = True
+    verify_workers: int = 8
+    verify_max_attempts: int = 5
+    # seconds, doubled on every attempt up to verify_retry_max
+    verify_retry_base: float = 1.0
+    verify_retry_max: float = 60.0
+    # VERIFYING rows untouched this long are verified again, e.g. after a crash
+    verify_stuck_after: int = 300
+    verify_recovery_interval: float = 60.0
+    # failed gateway calls after which a row is no longer recovered, it stays
+    # VERIFYING for manual review
+    verify_max_failures: int = 20
+    # PENDING rows older than this are settled with the gateway by the sweeper,
+    # keep it above the gateway's payment page timeout
+    sweep_enabled: bool = True
+    sweep_pending_after: int = 3600
+    sweep_interval: float = 300.0
+    sweep_batch_size: int = 200
+    sweep_concurrency: int = 16
+
+
+class AuditSettings(BaseSettings):
+    # rows written outside a transaction are inserted in batches by a background task
+    buffered: bool = True
+    batch_size: int = 500
+    flush_interval: float = 1.0
+    # rows above this are dropped and counted while the database is unavailable
+    max_pending: int = 10000
+
+
+class QueryLogSettings(BaseSettings):
+    # per-request query counting, postgres only
+    enabled: bool = True
+    # a query shape run this many times in one request is logged as a likely N+1
+    repeat_threshold: int = 5
+    # adds a Server-Timing header, leave off in production
+    server_timing: bool = False
 
 
 class Settings(BaseSettings):
     encryption_key: bytes = b"TMWqqeqUi9Ip8vRz7iuc0O16BC6XY-FUOBbOEl-zvog="
+    # older keys that can still decrypt, newest first
+    previous_encryption_keys: list[bytes] = []
     password_hash_secret: bytes = b"your_secret_key_here"
+    # serve account-ms-openapi.json instead of generating the schema in each worker,
+    # the test suite runs `python -m app.openapi check` so the file matches the routes
+    openapi_precomputed: bool = True
+    # bearer token Prometheus scrapes /metrics with, /metrics is off while unset
+    metrics_scrape_token: Optional[str] = None
     tortoise_orm: TortoiseORMSettings = TortoiseORMSettings()
     jwt: JWTSettings = JWTSettings()
     sms: SMSSettings = SMSSettings()
     otp: OTPSettings = OTPSettings()
+    password: PasswordSettings = PasswordSettings()
+    cache: CacheSettings = CacheSettings()
+    ipg: IPGSettings = IPGSettings()
+    audit: AuditSettings = AuditSettings()
+    query_log: QueryLogSettings = QueryLogSettings()
 
 
 # Now you can load the settings
 
 
 settings = Settings()
+
+
+def _db_connection(db_url: str):
+    config = expand_db_url(db_url)
+    if config["engine"] != "tortoise.backends.asyncpg":
+        return db_url
+    return {
+        # asyncpg client whose pool reports wait times and bounds acquire time
+        "engine": "app.db",
+        "credentials": {
+            **config["credentials"],
+            "minsize": settings.tortoise_orm.pool_min_size,
+            "maxsize": settings.tortoise_orm.pool_max_size,
+            "statement_cache_size": settings.tortoise_orm.pool_statement_cache_size,
+            "max_inactive_connection_lifetime": settings.tortoise_orm.pool_idle_timeout,
+            "command_timeout": settings.tortoise_orm.pool_command_timeout,
+        },
+    }
+
+
+TORTOISE_ORM = {
+    "connections": {"default": _db_connection(settings.tortoise_orm.db_connection)},
+    "apps": {
+        "models": {
+            "models": ["app.models"],
+            "default_connection": "default",
+        }
+    },
+}
+
+if settings.tortoise_orm.replica_db_connection:
+    TORTOISE_ORM["connections"]["replica"] = _db_connection(
+        settings.tortoise_orm.replica_db_connection
+    )
+    TORTOISE_ORM["routers"] = ["app.services.replica.ReplicaRouter"]
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import asyncpg
+from tortoise.backends.asyncpg import AsyncpgDBClient
+
+from app.config import settings
+from app.services.metrics import record_query
+from app.services.querylog import track_query
+
+_pool_stats = {
+    "acquired": 0,
+    "waiting": 0,
+    "timeouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+_pools: list[asyncpg.Pool] = []
+
+
+class DatabaseOverloadedError(Exception):
+    """No pooled connection became free in time, answered with 503 by the app."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("No database connection available, retry later")
+        self.retry_after = retry_after
+
+
+def get_pool_stats() -> dict:
+    size = sum(pool.get_size() for pool in _pools)
+    idle = sum(pool.get_idle_size() for pool in _pools)
+    return {
+        **_pool_stats,
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "min_size": settings.tortoise_orm.pool_min_size,
+        "max_size": settings.tortoise_orm.pool_max_size,
+    }
+
+
+class InstrumentedPool(asyncpg.Pool):
+    async def _acquire(self, timeout):
+        if timeout is None:
+            timeout = settings.tortoise_orm.pool_acquire_timeout
+
+        _pool_stats["waiting"] += 1
+        started = time.perf_counter()
+        try:
+            connection = await super()._acquire(timeout)
+        except asyncio.TimeoutError:
+            _pool_stats["timeouts"] += 1
+            raise DatabaseOverloadedError(settings.tortoise_orm.pool_retry_after)
+        finally:
+            waited = time.perf_counter() - started
+            _pool_stats["waiting"] -= 1
+            _pool_stats["wait_seconds_total"] += waited
+            _pool_stats["wait_seconds_max"] = max(
+                _pool_stats["wait_seconds_max"], waited
+            )
+
+        _pool_stats["acquired"] += 1
+        return connection
+
+
+# the script asyncpg runs on a connection it takes back into the pool, after a
+# ROLLBACK if a transaction was left open. Not a query of the request
+_RESET_STATEMENTS = frozenset(
+    ("SELECT pg_advisory_unlock_all();", "CLOSE ALL;", "UNLISTEN *;", "RESET ALL;")
+)
+
+
+def _is_connection_reset(query: str) -> bool:
+    statements = query.split("\n")
+    if statements[0] == "ROLLBACK;":
+        statements = statements[1:]
+    return bool(statements) and _RESET_STATEMENTS.issuperset(statements)
+
+
+def _log_query(record) -> None:
+    if _is_connection_reset(record.query):
+        return
+    record_query(record)
+    if settings.query_log.enabled:
+        track_query(record)
+
+
+async def _init_connection(connection) -> None:
+    connection.add_query_logger(_log_query)
+
+
+class InstrumentedAsyncpgDBClient(AsyncpgDBClient):
+    async def create_pool(self, **kwargs) -> asyncpg.Pool:
+        # same defaults as asyncpg.create_pool, which has no pool class argument
+        kwargs.setdefault("max_queries", 50000)
+        kwargs.setdefault("max_inactive_connection_lifetime", 300.0)
+        pool = await InstrumentedPool(
+            None,
+            setup=None,
+            init=_init_connection,
+            record_class=asyncpg.Record,
+            **kwargs,
+        )
+        _pools.append(pool)
+        return pool
+
+    async def _close(self) -> None:
+        if self._pool in _pools:
+            _pools.remove(self._pool)
+        await super()._close()
+
+
+# Tortoise loads the client of an engine module through this name
+client_class = InstrumentedAsyncpgDBClient
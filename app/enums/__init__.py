@@ -1 +1,3 @@
-from .ipg import IPGType, TransactionStatus
\ No newline at end of file
+from .ipg import IPGType, TransactionStatus
+from .pagination import PaginationMode
+from .wallet import BatchPostingMode
\ No newline at end of file
@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class PaginationMode(str, Enum):
+    OFFSET = "offset"
+    CURSOR = "cursor"
@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class BatchPostingMode(str, Enum):
+    ALL_OR_NOTHING = "ALL_OR_NOTHING"
+    BEST_EFFORT = "BEST_EFFORT"
@@ -0,0 +1,62 @@
+"""
+Reports what importing the app costs, per module and per package.
+
+    python -m app.importtime                 top modules by cumulative import time
+    python -m app.importtime --budget 800    also exit non-zero if the import takes over 800 ms
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def measure(module: str) -> list[tuple[int, int, str, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(result.returncode)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.importtime")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget", type=float, help="Import budget in milliseconds")
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total_ms = sum(cumulative for _, cumulative, _, depth in rows if depth == 0) / 1000
+
+    packages = defaultdict(int)
+    for self_us, _, name, _ in rows:
+        packages[name.split(".")[0]] += self_us
+
+    print(f"import {args.module}: {total_ms:.1f} ms\n")
+    print("Packages by self time")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+    print("\nModules by cumulative time")
+    for _, cumulative, name, _ in sorted(rows, key=lambda row: -row[1])[: args.top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+    if args.budget is not None and total_ms > args.budget:
+        print(f"\nOver budget: {total_ms:.1f} ms > {args.budget:.1f} ms")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
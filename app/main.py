@@ -1,7 +1,16 @@
 # app/main.py
 
-from app.config import settings
+from app.config import TORTOISE_ORM, settings
+from app.db import DatabaseOverloadedError
+from app.openapi import serve_precomputed_openapi
 from app.models.user import UserAccount
+from app.services.audit import audit_writer
+from app.services.metrics import MetricsMiddleware
+from app.services.querylog import QueryLogMiddleware
+from app.services.auth.password import KDFOverloadedError, shutdown_kdf_executor
+from app.services.ipg.reconciliation import reconciliation_sweeper
+from app.services.ipg.verification import verification_worker
+from app.services.replica import ReadYourWritesMiddleware, replica_enabled
 from app.routes import (
     auth_router,
     business_router,
@@ -10,8 +19,11 @@ from app.routes import (
     wallet_router,
     ipg_router,
     wallet_transactions_router,
+    metrics_router,
+    prometheus_router,
 )
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from tortoise.contrib.fastapi import register_tortoise
@@ -34,6 +46,7 @@ app = FastAPI(
     description="This is the API documentation for the OWJ CRS Account Service.",
     version="1.0.0",
     generate_unique_id_function=custom_generate_unique_id,
+    default_response_class=ORJSONResponse,
     servers=[
         {"url": "https://account.owj.app", "description": "Production environment"},
         {"url": "http://localhost:8000", "description": "Local environment"},
@@ -48,6 +61,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if replica_enabled():
+    app.add_middleware(ReadYourWritesMiddleware)
+
+if settings.query_log.enabled:
+    app.add_middleware(QueryLogMiddleware)
+
+# added last so it is outermost and times the whole stack
+app.add_middleware(MetricsMiddleware)
+
 BASE_PREFIX = "/api/account/v1"
 
 app.include_router(user_router, prefix=BASE_PREFIX + "/user")
@@ -59,21 +81,27 @@ app.include_router(
 )
 app.include_router(wallet_router, prefix=BASE_PREFIX + "/wallet")
 app.include_router(ipg_router, prefix=BASE_PREFIX + "/ipg")
+app.include_router(metrics_router, prefix=BASE_PREFIX + "/metrics")
+app.include_router(prometheus_router)
+
+if settings.openapi_precomputed:
+    serve_precomputed_openapi(app)
+
+# registered before Tortoise so the last audit flush runs, and verification tasks
+# stop, while connections are open
+app.add_event_handler("startup", audit_writer.start)
+app.add_event_handler("shutdown", audit_writer.stop)
+app.add_event_handler("startup", verification_worker.start)
+app.add_event_handler("shutdown", verification_worker.stop)
+app.add_event_handler("startup", reconciliation_sweeper.start)
+app.add_event_handler("shutdown", reconciliation_sweeper.stop)
 
 
 register_tortoise(
     app,
-    config={
-        "connections": {"default": settings.tortoise_orm.db_connection},
-        "apps": {
-            "models": {
-                "models": ["app.models"],
-                "default_connection": "default",
-            }
-        },
-    },
-    # This will create the DB tables on startup (useful for development)
-    generate_schemas=True,
+    config=TORTOISE_ORM,
+    # Schema changes are applied by `python -m app.migrate`, enable only for local development
+    generate_schemas=settings.tortoise_orm.generate_schemas,
     add_exception_handlers=True,
 )
 
@@ -88,6 +116,20 @@ async def _http_exception_handler(request, exc):
     return await http_exception_handler(request, exc)
 
 
+@app.exception_handler(KDFOverloadedError)
+@app.exception_handler(DatabaseOverloadedError)
+async def _overloaded_handler(request, exc):
+    # same error body as any other HTTP error
+    return await http_exception_handler(
+        request,
+        StarletteHTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ),
+    )
+
+
 @app.exception_handler(RequestValidationError)
 async def _request_validation_exception_handler(request, exc):
     return await request_validation_exception_handler(request, exc)
@@ -97,3 +139,12 @@ async def _request_validation_exception_handler(request, exc):
 @app.on_event("startup")
 async def startup_event():
     return
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # imported here so the IPG HTTP stack stays out of worker boot
+    from app.services.ipg.transport import close_http_clients
+
+    await close_http_clients()
+    shutdown_kdf_executor()
@@ -0,0 +1,183 @@
+"""
+Applies the database schema once per deploy, so workers can boot without DDL.
+
+    python -m app.migrate          create missing tables and apply pending migrations
+    python -m app.migrate schema   print the schema generated from app/models
+
+A migration file starting with `-- migrate: no-transaction` runs statement by
+statement outside a transaction, as CREATE INDEX CONCURRENTLY requires.
+"""
+import argparse
+import logging
+import re
+from pathlib import Path
+
+from tortoise import Tortoise, connections, run_async
+from tortoise.exceptions import OperationalError
+from tortoise.transactions import in_transaction
+from tortoise.utils import generate_schema_for_client, get_schema_sql
+
+from app.config import TORTOISE_ORM
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+MIGRATIONS_TABLE = "schema_migrations"
+# arbitrary key so only one migrate process runs at a time on PostgreSQL
+ADVISORY_LOCK_ID = 727_001
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+_CREATE_INDEX = re.compile(
+    r'^CREATE (?:UNIQUE )?INDEX (?:IF NOT EXISTS )?"?(\w+)"? ON "?(\w+)"?', re.I
+)
+_CREATE_INDEX_CONCURRENTLY = re.compile(
+    r"^CREATE (?:UNIQUE )?INDEX CONCURRENTLY (?:IF NOT EXISTS )?(\w+)", re.I
+)
+
+
+def get_migration_files() -> list[Path]:
+    return sorted(MIGRATIONS_DIR.glob("[0-9][0-9][0-9][0-9]_*.sql"))
+
+
+async def _has_tables(connection) -> bool:
+    from app.models import UserAccount
+
+    try:
+        await connection.execute_query(
+            f"SELECT 1 FROM {UserAccount._meta.db_table} LIMIT 1"
+        )
+    except OperationalError:
+        return False
+    return True
+
+
+async def _existing_tables(connection) -> set[str]:
+    _, rows = await connection.execute_query(
+        "SELECT tablename FROM pg_tables WHERE schemaname = current_schema()"
+    )
+    return {row["tablename"] for row in rows}
+
+
+async def _generate_schema(connection, fresh: bool) -> None:
+    schema = get_schema_sql(connection, safe=True)
+    if not fresh:
+        # a plain CREATE INDEX blocks writes to the table for the whole build,
+        # indexes on existing tables come from no-transaction migrations instead
+        existing = await _existing_tables(connection)
+        schema = "\n".join(
+            line
+            for line in schema.splitlines()
+            if not (
+                (match := _CREATE_INDEX.match(line)) and match.group(2) in existing
+            )
+        )
+    await connection.schema_generator(connection).generate_from_string(schema)
+
+
+def _statements(script: str) -> list[str]:
+    lines = [line for line in script.splitlines() if not line.startswith("--")]
+    return [
+        statement.strip()
+        for statement in "\n".join(lines).split(";")
+        if statement.strip()
+    ]
+
+
+async def _apply_without_transaction(connection, script: str) -> None:
+    for statement in _statements(script):
+        match = _CREATE_INDEX_CONCURRENTLY.match(statement)
+        if match:
+            # a failed concurrent build leaves an invalid index behind, which
+            # IF NOT EXISTS would keep. Dropped so the build runs again
+            _, rows = await connection.execute_query(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = indexrelid "
+                "WHERE relname = $1 AND NOT indisvalid",
+                [match.group(1)],
+            )
+            if rows:
+                await connection.execute_script(
+                    f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}"
+                )
+        await connection.execute_script(statement)
+
+
+async def _applied_versions(connection) -> set[str]:
+    await connection.execute_script(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    _, rows = await connection.execute_query(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {row["version"] for row in rows}
+
+
+async def _record_version(connection, version: str) -> None:
+    param = "$1" if connection.capabilities.dialect == "postgres" else "?"
+    await connection.execute_query(
+        f"INSERT INTO {MIGRATIONS_TABLE} (version) VALUES ({param})", [version]
+    )
+
+
+async def upgrade() -> None:
+    await Tortoise.init(config=TORTOISE_ORM)
+    connection = connections.get("default")
+    postgres = connection.capabilities.dialect == "postgres"
+    try:
+        if postgres:
+            await connection.execute_query(
+                f"SELECT pg_advisory_lock({ADVISORY_LOCK_ID})"
+            )
+
+        fresh = not await _has_tables(connection)
+        applied = await _applied_versions(connection)
+
+        # creates tables and indexes that are missing, existing ones are left as
+        # they are. Only on the primary, a replica gets them through replication
+        if postgres:
+            await _generate_schema(connection, fresh)
+        else:
+            await generate_schema_for_client(connection, safe=True)
+
+        for path in get_migration_files():
+            version = path.stem
+            if version in applied:
+                continue
+            # a fresh schema already matches the models, migrations only need recording.
+            # migration files are written for PostgreSQL
+            script = path.read_text()
+            if postgres and not fresh and script.startswith(NO_TRANSACTION):
+                logger.info("Applying migration %s outside a transaction", version)
+                await _apply_without_transaction(connection, script)
+                await _record_version(connection, version)
+                continue
+            async with in_transaction("default") as transaction:
+                if postgres and not fresh:
+                    logger.info("Applying migration %s", version)
+                    await transaction.execute_script(script)
+                await _record_version(transaction, version)
+    finally:
+        # also releases the advisory lock, which belongs to the pooled session
+        await Tortoise.close_connections()
+
+
+async def print_schema() -> None:
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        print(get_schema_sql(connections.get("default"), safe=False))
+    finally:
+        await Tortoise.close_connections()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.migrate")
+    parser.add_argument(
+        "command", nargs="?", default="upgrade", choices=["upgrade", "schema"]
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_async(upgrade() if args.command == "upgrade" else print_schema())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from owjcommon.models import AuditLogBase
 
+from app.services.audit import apply_audit_policy, defer_audit_entry
+
 
 class AuditLog(AuditLogBase):
     class Meta:
@@ -8,3 +10,11 @@ class AuditLog(AuditLogBase):
         ordering = ["-timestamp"]
         verbose_name = "Audit Log"
         verbose_name_plural = "Audit Logs"
+
+    async def save(self, using_db=None, *args, **kwargs) -> None:
+        # new rows are trimmed by the model's audit policy and go through the
+        # audit writer, see app.services.audit
+        if not self._saved_in_db:
+            if not apply_audit_policy(self) or defer_audit_entry(self, using_db):
+                return
+        await super().save(using_db, *args, **kwargs)
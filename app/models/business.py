@@ -2,6 +2,8 @@ from tortoise import fields
 
 from owjcommon.models import AuditableModel
 
+from app.services.profile import invalidate_profiles
+
 from .audit import AuditLog
 
 
@@ -18,3 +20,11 @@ class BusinessAccount(AuditableModel):
 
     class Meta:
         table = "business_account"
+
+    async def save(self, *args, **kwargs) -> None:
+        await super().save(*args, **kwargs)
+        invalidate_profiles(business_ids=[self.id])
+
+    async def delete(self, *args, **kwargs) -> None:
+        await super().delete(*args, **kwargs)
+        invalidate_profiles(business_ids=[self.id])
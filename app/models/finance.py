@@ -3,6 +3,8 @@ from owjcommon.enums import CurrencyChoices
 from owjcommon.models import AuditableModel
 from .audit import AuditLog
 from app.enums import IPGType, TransactionStatus
+from app.services.audit import AuditPolicy
+from app.services.profile import invalidate_profiles
 
 
 class Wallet(AuditableModel):
@@ -18,6 +20,15 @@ class Wallet(AuditableModel):
     class Meta:
         table = "wallets"
         unique_together = ("user", "currency")
+        indexes = (("business", "currency"),)
+
+    async def save(self, *args, **kwargs) -> None:
+        await super().save(*args, **kwargs)
+        invalidate_profiles([self.user_id], [self.business_id])
+
+    async def delete(self, *args, **kwargs) -> None:
+        await super().delete(*args, **kwargs)
+        invalidate_profiles([self.user_id], [self.business_id])
 
 
 class WalletTransaction(AuditableModel):
@@ -31,10 +42,13 @@ class WalletTransaction(AuditableModel):
     reference = fields.CharField(max_length=100, null=True)
     balance = fields.DecimalField(max_digits=20, decimal_places=2, default=0)
     audit_log_class = AuditLog
+    # the ledger is append only, its rows are their own record
+    audit_policy = AuditPolicy(skip_create=True)
 
     class Meta:
         table = "wallet_transactions"
         ordering = ["-created_at"]
+        indexes = (("wallet", "created_at", "id"), ("created_at", "id"))
 
 
 class IPG(AuditableModel):
@@ -71,9 +85,16 @@ class IPGTransaction(AuditableModel):
     shaparak_reference_id = fields.CharField(max_length=100, null=True)
     trace_number = fields.CharField(max_length=100, null=True)
     token = fields.CharField(max_length=100, null=True)
+    # failed gateway calls while verifying, bounds recovery
+    verify_failures = fields.IntField(default=0)
     audit_log_class = AuditLog
 
     class Meta:
         table = "ipg_transactions"
         ordering = ["-created_at"]
+        indexes = (
+            ("ipg", "created_at", "id"),
+            ("status", "created_at"),
+            ("created_at", "id"),
+        )
 
@@ -8,3 +8,4 @@ class UserToken(models.Model):
 
     class Meta:
         table = "user_tokens"
+        indexes = (("user",), ("expire",))
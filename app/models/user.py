@@ -4,17 +4,21 @@ from datetime import datetime, timedelta
 import pytz
 from app.config import settings
 from app.schemas.auth import TokenResponse
+from app.services.audit import AuditPolicy
 from app.services.auth import (
     check_otp,
     check_password,
     create_access_token,
+    get_cached_permissions,
     get_otp,
     get_otp_hash,
     hash_password,
+    invalidate_principal,
+    resolve_permissions,
 )
 from tortoise import fields, models
 
-from owjcommon.enums import USER_TYPE_PERMISSIONS, UserTypeChoices
+from owjcommon.enums import UserTypeChoices
 from owjcommon.exceptions import OWJException
 from owjcommon.models import AuditableModel
 from owjcommon.validators import is_valid_email, is_valid_phone_number
@@ -52,6 +56,8 @@ class UserAccount(AuditableModel):
     )
 
     audit_log_class = AuditLog
+    # every OTP request stamps last_otp_sent, those saves are not audited
+    audit_policy = AuditPolicy(noisy={"last_otp_sent", "updated_at"})
 
     class Meta:
         table = "user_account"
@@ -59,6 +65,14 @@ class UserAccount(AuditableModel):
     def __str__(self):
         return f"{self.phone_number}"
 
+    async def save(self, *args, **kwargs) -> None:
+        await super().save(*args, **kwargs)
+        invalidate_principal(str(self.uuid))
+
+    async def delete(self, *args, **kwargs) -> None:
+        await super().delete(*args, **kwargs)
+        invalidate_principal(str(self.uuid))
+
     async def check_otp(self, code: str) -> bool:
         return await check_otp(self.otp_hash, code)
 
@@ -81,16 +95,12 @@ class UserAccount(AuditableModel):
         return await check_password(self.hashed_password, password)
 
     async def get_permissions(self) -> list[str]:
-        assigned_permissions = await self.user_groups.all().values_list(
-            "permissions", flat=True
-        )
-        permissions = USER_TYPE_PERMISSIONS.get(self.type, [])
-
-        for permission in assigned_permissions:
-            for sub_permission in permission:
-                permissions.append(sub_permission)
+        permissions = get_cached_permissions(self.id, self.type)
+        if permissions is None:
+            groups = await self.user_groups.all().values_list("id", "permissions")
+            permissions = resolve_permissions(self.id, self.type, groups)
 
-        return list(set(permissions))
+        return list(permissions)
 
     async def create_access_token(self) -> TokenResponse:
         jti = uuid.uuid4()
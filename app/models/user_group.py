@@ -3,6 +3,10 @@ import uuid
 from tortoise import fields, models
 
 from owjcommon.models import AuditableModel
+from app.services.auth import (
+    invalidate_group_permissions,
+    invalidate_user_permissions,
+)
 from .user import UserAccount
 from .audit import AuditLog
 from tortoise.exceptions import DoesNotExist
@@ -17,6 +21,15 @@ class UserGroup(AuditableModel):
     class Meta:
         table = "user_group"
 
+    async def save(self, *args, **kwargs) -> None:
+        await super().save(*args, **kwargs)
+        invalidate_group_permissions(self.id)
+
+    async def delete(self, *args, **kwargs) -> None:
+        group_id = self.id
+        await super().delete(*args, **kwargs)
+        invalidate_group_permissions(group_id)
+
     async def add_users(self, users: list[str]) -> None:
         # list of user uuids
         try:
@@ -25,6 +38,7 @@ class UserGroup(AuditableModel):
             return
 
         await self.users.add(*user_objects)
+        invalidate_user_permissions(*(user.id for user in user_objects))
 
     async def remove_users(self, users: list[str]) -> None:
         # list of user uuids
@@ -34,3 +48,4 @@ class UserGroup(AuditableModel):
             return
 
         await self.users.remove(*user_objects)
+        invalidate_user_permissions(*(user.id for user in user_objects))
@@ -0,0 +1,76 @@
+"""
+Builds and checks the committed OpenAPI document, and serves it without rebuilding it.
+
+    python -m app.openapi generate   write account-ms-openapi.json from the routers
+    python -m app.openapi check      exit non-zero if account-ms-openapi.json is out of date
+"""
+import argparse
+import gzip
+import hashlib
+import json
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+OPENAPI_ARTEFACT = Path(__file__).resolve().parent.parent / "account-ms-openapi.json"
+
+
+def render_openapi(app: FastAPI) -> bytes:
+    app.openapi_schema = None
+    return json.dumps(app.openapi()).encode("utf-8")
+
+
+def serve_precomputed_openapi(app: FastAPI, path: Path = OPENAPI_ARTEFACT) -> None:
+    if not path.exists():
+        return
+
+    body = path.read_bytes()
+    gzipped = gzip.compress(body, compresslevel=9)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    # /docs and app.openapi() use the artefact as well
+    app.openapi_schema = json.loads(body)
+
+    async def openapi(request: Request) -> Response:
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(gzipped, media_type="application/json", headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    app.router.routes = [
+        route
+        for route in app.router.routes
+        if getattr(route, "path", None) != app.openapi_url
+    ]
+    app.add_route(app.openapi_url, openapi, include_in_schema=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.openapi")
+    parser.add_argument("command", choices=["generate", "check"])
+    args = parser.parse_args()
+
+    from app.main import app
+
+    rendered = render_openapi(app)
+    if args.command == "generate":
+        OPENAPI_ARTEFACT.write_bytes(rendered)
+        print(f"Wrote {OPENAPI_ARTEFACT.name}")
+        return
+
+    committed = (
+        json.loads(OPENAPI_ARTEFACT.read_bytes()) if OPENAPI_ARTEFACT.exists() else None
+    )
+    if committed != json.loads(rendered):
+        print(
+            f"{OPENAPI_ARTEFACT.name} is out of date, run `python -m app.openapi generate`"
+        )
+        raise SystemExit(1)
+    print(f"{OPENAPI_ARTEFACT.name} is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from typing import Any, Optional
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+
+class TrustedResponse:
+    """
+    Renders a response schema straight from ORM output.
+
+    The schema is validated once from the ORM objects and dumped to JSON by
+    pydantic-core. Returning the Response directly skips FastAPI's second
+    validation of the response_model and its jsonable_encoder pass, so use it
+    only for data the route already trusts. Keep response_model on the route
+    for the OpenAPI document.
+    """
+
+    def __init__(self, schema: Any):
+        self.schema = schema
+        # built once per schema at import, not per request
+        self.adapter = TypeAdapter(schema)
+
+    def __call__(
+        self, content: Optional[Any] = None, status_code: int = 200, **fields
+    ) -> Response:
+        value = self.adapter.validate_python(
+            fields if content is None else content, from_attributes=True
+        )
+        return Response(
+            content=self.adapter.dump_json(value, by_alias=True),
+            status_code=status_code,
+            media_type="application/json",
+        )
+
+
+def projection(schema: Any) -> tuple[str, ...]:
+    """
+    Column names for a `.values()` read that feeds `schema` without building
+    model instances.
+    """
+    return tuple(schema.model_fields)
@@ -4,4 +4,6 @@ from .user_group import router as user_group_router
 from .business import router as business_router
 from .wallet import router as wallet_router
 from .ipg import router as ipg_router
-from .wallet_transactions import router as wallet_transactions_router
\ No newline at end of file
+from .wallet_transactions import router as wallet_transactions_router
+from .metrics import router as metrics_router
+from .metrics import prometheus_router
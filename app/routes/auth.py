@@ -19,7 +19,7 @@ from owjcommon.schemas import Response
 from app.services.auth.utils import get_current_active_user
 from owjcommon.exceptions import OWJException
 from owjcommon.response import responses
-from app.services.auth import validate_refresh_token
+from app.services.auth import invalidate_principal, validate_refresh_token
 from app.services.wallet import create_wallets
 from owjcommon.enums import UserTypeChoices
 
@@ -205,4 +205,5 @@ async def logout(refresh_token: RefreshTokenRequest):
         return Response()
     # delete old token
     await user_token.delete()
+    invalidate_principal(refresh_token_data.sub, refresh_token_data.jti)
     return Response()
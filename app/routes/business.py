@@ -13,6 +13,7 @@ from app.schemas.business import (
     BusinessAccountUpdateRequest,
 )
 from app.services.auth.utils import check_user_set, get_current_active_user
+from app.services.replica import use_replica
 from app.services.wallet import create_wallets
 from fastapi import APIRouter, Depends, HTTPException, Security
 
@@ -99,7 +100,12 @@ async def get_business_account_me(
     return {"data": business}
 
 
-@router.get("", response_model=BusinessAccountsResponse, responses=responses)
+@router.get(
+    "",
+    response_model=BusinessAccountsResponse,
+    responses=responses,
+    dependencies=[Depends(use_replica)],
+)
 async def list_business_accounts(
     pagination: dict = Depends(pagination),
     filters: BusinessAccountFilters = Depends(),
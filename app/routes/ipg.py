@@ -5,7 +5,6 @@ from fastapi import APIRouter, Depends, Form, HTTPException, Path, Query, Securi
 from fastapi.responses import RedirectResponse
 from owjcommon.dependencies import get_trace_id, pagination
 from owjcommon.enums import UserPermission, UserSet
-from owjcommon.exceptions import OWJException
 from owjcommon.logger import TraceLogger
 from owjcommon.models import get_paginated_results_with_filter
 from owjcommon.response import responses
@@ -15,23 +14,30 @@ from tortoise.transactions import in_transaction
 from app.enums import IPGType, TransactionStatus
 from app.models import IPG as IPGModel
 from app.models import IPGTransaction as IPGTransactionModel
-from app.models import Wallet as WalletModel
-from app.models import WalletTransaction as WalletTransactionModel
+from app.responses import TrustedResponse, projection
 from app.schemas import (
     IPGFilter,
     IPGRequest,
     IPGResponse,
     IPGsResponse,
+    IPGTransaction,
     IPGTransactionFilter,
     IPGTransactionResponse,
     IPGTransactionsResponse,
     IPGUpdateRequest,
 )
+from app.services.audit import audit_staging
 from app.services.auth.utils import check_user_set, get_current_active_user
-from app.services.ipg import get_ipg_client
+from app.services.ipg.callbacks import handle_callback
+from app.services.ipg.verification import schedule_verification
+from app.services.pagination import cursor_pagination, get_listing_results
+from app.services.replica import use_replica
 
 logger = TraceLogger(__name__)
 
+ipg_transactions_response = TrustedResponse(IPGTransactionsResponse)
+ipg_transaction_fields = projection(IPGTransaction)
+
 router = APIRouter(
     tags=["IPG"],
 )
@@ -48,56 +54,26 @@ async def nextpay_callback(
     ),
     order_id: str = Query(None, description="Order ID for NextPay", example="6"),
 ):
-    ipg_client = get_ipg_client(IPGType.NEXTPAY)
-
-    async with in_transaction():
-        transaction = (
-            await IPGTransactionModel.filter(pk=order_id, token=trans_id)
-            .select_for_update()
-            .first()
-        )
-
-        if transaction is None:
-            return OWJException("E1025")
-        if transaction.status != TransactionStatus.PENDING:
-            return OWJException("E1027")
-
-        ipg = await transaction.ipg
-
-        ipg_client = ipg_client(
-            terminal_id=ipg.terminal_id,
-            merchant_id=ipg.merchant_id,
-            merchant_key=ipg.merchant_key,
-            password=ipg.password,
-            callback_url=ipg.callback_url,
-            url=ipg.url,
-            currency=ipg.currency,
-        )
-
-        await ipg_client.verify(transaction)
-
-        if transaction.status == TransactionStatus.SUCCESS:
-            wallet = (
-                await WalletModel.filter(id=transaction.wallet_id)
+    async def process():
+        async with in_transaction("default") as connection, audit_staging(connection):
+            transaction = (
+                await IPGTransactionModel.filter(pk=order_id, token=trans_id)
                 .select_for_update()
                 .first()
             )
 
-            await WalletTransactionModel.create(
-                wallet=wallet,
-                amount=transaction.amount,
-                currency=transaction.currency,
-                preformed_by=await transaction.user,
-                note=transaction.note,
-                reference=transaction.reference_id,
-                balance=wallet.amount + transaction.amount,
-            )
+            # settled by a callback in another worker since the unlocked read
+            if transaction.status != TransactionStatus.PENDING:
+                return transaction.status
 
-            wallet.amount = wallet.amount + transaction.amount
-            await wallet.save()
+            transaction.status = TransactionStatus.VERIFYING
+            await transaction.save()
 
-        await transaction.save()
+        # the gateway is called after commit, the user does not wait for it
+        return await schedule_verification(transaction.pk)
 
+    # repeated callbacks get the same redirect as the first one
+    await handle_callback(IPGType.NEXTPAY, order_id, trans_id, process)
     return RedirectResponse(url="https://ptc7.ir", status_code=302)
 
 
@@ -117,76 +93,68 @@ async def sep_callback(
     Token: Optional[str] = Form(None),
     HashedCardNumber: Optional[str] = Form(None),
 ):
-    ipg_client = get_ipg_client(IPGType.SEP)
-
-    async with in_transaction():
-        transaction = (
-            await IPGTransactionModel.filter(pk=ResNum, token=Token)
-            .select_for_update()
-            .first()
-        )
-
-        if transaction is None:
-            return OWJException("E1025")
-        if transaction.status != TransactionStatus.PENDING:
-            return OWJException("E1027")
-
-        transaction.ipg_reference_id = RefNum
-        transaction.trace_number = TraceNo
-        transaction.shaparak_reference_id = Rrn
-        transaction.card_number = SecurePan
-
-        if Status == "1":
-            transaction.status = TransactionStatus.CANCELED
-        elif Status != "2" or RefNum is None:
-            transaction.status = TransactionStatus.FAILED
-        else:
-            ipg = await transaction.ipg
-
-            ipg_client = ipg_client(
-                terminal_id=ipg.terminal_id,
-                merchant_id=ipg.merchant_id,
-                merchant_key=ipg.merchant_key,
-                password=ipg.password,
-                callback_url=ipg.callback_url,
-                url=ipg.url,
-                currency=ipg.currency,
+    async def process():
+        async with in_transaction("default") as connection, audit_staging(connection):
+            transaction = (
+                await IPGTransactionModel.filter(pk=ResNum, token=Token)
+                .select_for_update()
+                .first()
             )
 
-            await ipg_client.verify(transaction)
-
-            if transaction.status == TransactionStatus.SUCCESS:
-                wallet = (
-                    await WalletModel.filter(id=transaction.wallet_id)
-                    .select_for_update()
-                    .first()
-                )
-
-                await WalletTransactionModel.create(
-                    wallet=wallet,
-                    amount=transaction.amount,
-                    currency=transaction.currency,
-                    preformed_by=await transaction.user,
-                    note=transaction.note,
-                    reference=transaction.reference_id,
-                    balance=wallet.amount + transaction.amount,
-                )
-
-                wallet.amount = wallet.amount + transaction.amount
-                await wallet.save()
-
-        await transaction.save()
-
+            # claimed by the reconciliation sweeper before the callback came, its
+            # inquiry has no RefNum and is discarded once the payload is stored
+            late = (
+                transaction.status == TransactionStatus.VERIFYING
+                and transaction.ipg_reference_id is None
+                and Status == "2"
+                and RefNum is not None
+            )
+            # settled by a callback in another worker since the unlocked read
+            if transaction.status != TransactionStatus.PENDING and not late:
+                return transaction.status
+
+            # the payload is kept for the verification worker
+            transaction.ipg_reference_id = RefNum
+            transaction.trace_number = TraceNo
+            transaction.shaparak_reference_id = Rrn
+            transaction.card_number = SecurePan
+
+            if Status == "1":
+                transaction.status = TransactionStatus.CANCELED
+            elif Status != "2" or RefNum is None:
+                transaction.status = TransactionStatus.FAILED
+            else:
+                transaction.status = TransactionStatus.VERIFYING
+
+            await transaction.save()
+
+        if transaction.status != TransactionStatus.VERIFYING:
+            return transaction.status
+        # the gateway is called after commit, the user does not wait for it
+        return await schedule_verification(transaction.pk)
+
+    # repeated callbacks get the same redirect as the first one
+    await handle_callback(
+        IPGType.SEP,
+        ResNum,
+        Token,
+        process,
+        open_statuses=(TransactionStatus.PENDING, TransactionStatus.VERIFYING),
+    )
     return RedirectResponse(url="https://ptc7.ir", status_code=302)
 
 
 # get all ipg transactions
 @router.get(
-    "/transactions", response_model=IPGTransactionsResponse, responses=responses
+    "/transactions",
+    response_model=IPGTransactionsResponse,
+    responses=responses,
+    dependencies=[Depends(use_replica)],
 )
 async def list_all_ipgs_transactions(
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     current_user: Annotated = Security(
         get_current_active_user, scopes=[UserPermission.IPG_TRANSACTION_READ]
     ),
@@ -194,13 +162,14 @@ async def list_all_ipgs_transactions(
 ):
     check_user_set(current_user, UserSet.AGENCY)
     logger.debug("Listing all ipg transactions", trace_id)
-    transactions = await get_paginated_results_with_filter(
+    transactions = await get_listing_results(
         IPGTransactionModel,
-        pagination["offset"],
-        pagination["size"],
+        pagination,
+        cursor_params,
         user_filters=filter.dict(exclude_unset=True),
+        fields=ipg_transaction_fields,
     )
-    return transactions
+    return ipg_transactions_response(transactions)
 
 
 @router.get(
@@ -327,6 +296,7 @@ async def list_ipg_transactions(
     ipg_id: int = Path(..., description="IPG ID", example=1),
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     current_user: Annotated = Security(
         get_current_active_user, scopes=[UserPermission.IPG_TRANSACTION_READ]
     ),
@@ -334,10 +304,12 @@ async def list_ipg_transactions(
 ):
     check_user_set(current_user, UserSet.AGENCY)
     logger.debug(f"Listing ipg transactions for ipg {ipg_id}", trace_id)
-    return await get_paginated_results_with_filter(
+    transactions = await get_listing_results(
         IPGTransactionModel,
-        pagination["offset"],
-        pagination["size"],
+        pagination,
+        cursor_params,
         user_filters=filter.dict(exclude_unset=True),
+        fields=ipg_transaction_fields,
         system_filters={"ipg_id": ipg_id},
     )
+    return ipg_transactions_response(transactions)
@@ -0,0 +1,108 @@
+import hmac
+from typing import Annotated, Optional
+
+from app.config import settings
+from app.db import get_pool_stats
+from app.services.audit import get_audit_stats
+from app.services.auth.password import get_kdf_stats
+from app.services.auth.utils import check_user_set, get_current_principal
+from app.services.ipg.callbacks import get_callback_stats
+from app.services.ipg.reconciliation import get_sweep_stats
+from app.services.ipg.verification import get_verification_stats
+from app.services.metrics import Gauge, register, render_metrics
+from app.services.replica import get_replica_state
+from fastapi import APIRouter, HTTPException, Response, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from owjcommon.enums import UserSet
+
+router = APIRouter(
+    tags=["Metrics"],
+)
+
+# mounted at the root, where Prometheus scrapes by default
+prometheus_router = APIRouter(
+    tags=["Metrics"],
+)
+
+SUBSYSTEM_STATS = Gauge(
+    "app_subsystem_stat",
+    "Numeric stats of the pool, password hashing and audit subsystems",
+    labels=("subsystem", "stat"),
+)
+
+
+def _collect_subsystem_stats() -> None:
+    for subsystem, stats in (
+        ("database", get_pool_stats()),
+        ("password_hashing", get_kdf_stats()),
+        ("audit", get_audit_stats()),
+        ("ipg_callbacks", get_callback_stats()),
+        ("ipg_verification", get_verification_stats()),
+        ("ipg_reconciliation", get_sweep_stats()),
+    ):
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                SUBSYSTEM_STATS.set(subsystem, stat, value=value)
+
+
+register(SUBSYSTEM_STATS, _collect_subsystem_stats)
+
+scrape_scheme = HTTPBearer(auto_error=False)
+
+
+def check_scrape_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(scrape_scheme),
+) -> None:
+    # a static token rather than a user login, so scrapers hold no agency account
+    token = settings.metrics_scrape_token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if credentials is None or not hmac.compare_digest(
+        credentials.credentials.encode("utf-8"), token.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid scrape token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+# operational endpoint, kept out of the OpenAPI document
+@router.get("/pool", include_in_schema=False)
+async def get_pool_metrics(
+    # claims only, so it still answers while the pool is exhausted
+    current_user: Annotated = Security(get_current_principal),
+):
+    """
+    Type and Scope:
+
+    - **Type**: AGENCY User Set
+    - **Scope**: None
+    """
+    check_user_set(current_user, UserSet.AGENCY)
+    return {
+        "database": get_pool_stats(),
+        "replica": get_replica_state(),
+        "password_hashing": get_kdf_stats(),
+        "audit": get_audit_stats(),
+        "ipg_callbacks": get_callback_stats(),
+        "ipg_verification": get_verification_stats(),
+        "ipg_reconciliation": get_sweep_stats(),
+    }
+
+
+# scraped with settings.metrics_scrape_token as the bearer token
+@prometheus_router.get(
+    "/metrics", include_in_schema=False, dependencies=[Security(check_scrape_token)]
+)
+async def get_prometheus_metrics():
+    """
+    Type and Scope:
+
+    - **Type**: Prometheus scrape token
+    - **Scope**: None
+    """
+    return Response(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
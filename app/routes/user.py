@@ -1,14 +1,11 @@
 from typing import Annotated, Union
 
-from app.models import Wallet as WalletModel
-from app.models.business import BusinessAccount as BusinessAccountModel
 from app.models.user import UserAccount
 from app.schemas.business import BusinessAccount
 from app.schemas.user import (
     UserAccountCreateRequest,
     UserAccountFilters,
     UserAccountFull,
-    UserAccountMe,
     UserAccountMeResponse,
     UserAccountResponse,
     UserAccountsResponse,
@@ -16,6 +13,8 @@ from app.schemas.user import (
     UserAccountUpdateRequestByAgency,
 )
 from app.services.auth.utils import check_user_set, get_current_active_user
+from app.services.profile import get_user_profile
+from app.services.replica import use_replica
 from fastapi import APIRouter, Depends, HTTPException, Security
 from pydantic import ValidationError
 
@@ -88,7 +87,12 @@ async def create_user_account(
 
 
 # get all
-@router.get("", response_model=UserAccountsResponse, responses=responses)
+@router.get(
+    "",
+    response_model=UserAccountsResponse,
+    responses=responses,
+    dependencies=[Depends(use_replica)],
+)
 async def get_user_accounts(
     current_user: UserAccount = Security(
         get_current_active_user, scopes=[UserPermission.USER_ACCOUNT_READ]
@@ -124,20 +128,7 @@ async def get_my_user_account(
     - **Type**: Any User Set
     - **Scope**: None
     """
-    # get user acount wallets
-    business = None
-    if current_user.type in UserSet.BUSINESS.value:
-        wallets = await WalletModel.filter(business_id=current_user.business_id)
-        business = await BusinessAccountModel.get(id=current_user.business_id)
-    else:
-        wallets = await WalletModel.filter(user=current_user)
-    permissions = await current_user.get_permissions()
-    data = UserAccountMe(
-        **current_user.__dict__,
-        wallets=wallets,
-        business=business,
-        permissions=permissions
-    )
+    data = await get_user_profile(current_user)
     return UserAccountMeResponse(data=data)
 
 
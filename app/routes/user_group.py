@@ -150,6 +150,7 @@ async def update_group(
         id=id, prefetch_related=["users"]
     )
     group = await group.update_from_dict(data.dict(exclude_unset=True))
+    await group.save()
     return {"data": group}
 
 
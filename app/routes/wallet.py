@@ -3,7 +3,9 @@ from typing import Annotated
 from app.models import UserAccount as UserAccountModel
 from app.models.business import BusinessAccount as BusinessAccountModel
 from app.models import Wallet as WalletModel
+from app.responses import TrustedResponse, projection
 from app.schemas import (
+    Wallet,
     WalletResponse,
     WalletsResponse,
     WalletTopOffRequest,
@@ -23,6 +25,9 @@ from owjcommon.schemas import Response
 
 logger = TraceLogger(__name__)
 
+wallets_response = TrustedResponse(WalletsResponse)
+wallet_fields = projection(Wallet)
+
 router = APIRouter(
     tags=["Wallet"],
 )
@@ -46,10 +51,14 @@ async def get_my_wallets(
     """
     logger.debug(f"Getting my wallets {current_user}", trace_id)
     if current_user.type in UserSet.BUSINESS.value:
-        wallets = await WalletModel.filter(business_id=current_user.business_id).all()
+        wallets = await WalletModel.filter(
+            business_id=current_user.business_id
+        ).values(*wallet_fields)
     else:
-        wallets = await WalletModel.filter(user=current_user).all()
-    return WalletsResponse(items=wallets)
+        wallets = await WalletModel.filter(user_id=current_user.id).values(
+            *wallet_fields
+        )
+    return wallets_response(items=wallets)
 
 
 # get my wallet based on currency
@@ -78,7 +87,7 @@ async def get_my_wallet(
         )
     else:
         wallet = await WalletModel.get_or_exception(
-            user=current_user, currency=currency
+            user_id=current_user.id, currency=currency
         )
     return WalletResponse(data=wallet)
 
@@ -134,12 +143,16 @@ async def get_business_wallets(
     if current_user.type in UserSet.BUSINESS.value:
         if business_account.id != current_user.business_id:
             raise OWJPermissionException()
-        wallets = await WalletModel.filter(business_id=business_account.id).all()
+        wallets = await WalletModel.filter(business_id=business_account.id).values(
+            *wallet_fields
+        )
 
     else:
-        wallets = await WalletModel.filter(business_id=business_account.id).all()
+        wallets = await WalletModel.filter(business_id=business_account.id).values(
+            *wallet_fields
+        )
 
-    return WalletsResponse(items=wallets)
+    return wallets_response(items=wallets)
 
 
 # update business wallet
@@ -204,12 +217,14 @@ async def get_user_wallets(
         raise OWJPermissionException()
 
     if user_account.type in UserSet.BUSINESS.value:
-        wallets = await WalletModel.filter(business_id=user_account.business_id).all()
+        wallets = await WalletModel.filter(
+            business_id=user_account.business_id
+        ).values(*wallet_fields)
 
     else:
-        wallets = await WalletModel.filter(user=user_id).all()
+        wallets = await WalletModel.filter(user=user_id).values(*wallet_fields)
 
-    return WalletsResponse(items=wallets)
+    return wallets_response(items=wallets)
 
 
 # update wallet
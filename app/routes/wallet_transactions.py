@@ -5,7 +5,11 @@ from app.models import UserAccount as UserAccountModel
 from app.models import Wallet as WalletModel
 from app.models import WalletTransaction as WalletTransactionModel
 from app.models.business import BusinessAccount as BusinessAccountModel
+from app.responses import TrustedResponse, projection
 from app.schemas import (
+    WalletTransaction,
+    WalletTransactionBatchRequest,
+    WalletTransactionBatchResponse,
     WalletTransactionFilter,
     WalletTransactionRequestByBusinessID,
     WalletTransactionRequestByUserID,
@@ -13,21 +17,28 @@ from app.schemas import (
     WalletTransactionsResponse,
 )
 from app.services.auth.utils import check_user_set, get_current_active_user
-from app.services.wallet import wallet_topoff
+from app.services.pagination import cursor_pagination, get_listing_results
+from app.services.replica import use_replica
+from app.services.wallet import (
+    post_wallet_transaction,
+    post_wallet_transactions,
+    wallet_topoff,
+)
 from fastapi import APIRouter, Depends, HTTPException, Path, Security
 from pydantic import ValidationError
-from tortoise.transactions import in_transaction
 
 from owjcommon.dependencies import get_trace_id, pagination
 from owjcommon.enums import CurrencyChoices, UserPermission, UserSet, UserTypeChoices
 from owjcommon.exceptions import OWJException, OWJPermissionException
 from owjcommon.logger import TraceLogger
-from owjcommon.models import get_paginated_results_with_filter
 from owjcommon.response import responses
 from owjcommon.schemas import Response
 
 logger = TraceLogger(__name__)
 
+wallet_transactions_response = TrustedResponse(WalletTransactionsResponse)
+wallet_transaction_fields = projection(WalletTransaction)
+
 router = APIRouter(
     tags=["Wallet Transaction"],
 )
@@ -56,53 +67,82 @@ async def create_wallet_transaction(
     """
     check_user_set(current_user, UserSet.AGENCY)
     logger.debug("Creating wallet transaction", trace_id)
-    wallet_transaction = None
-    async with in_transaction():
-        if isinstance(wallet_transaction_request, WalletTransactionRequestByUserID):
-            wallet = (
-                await WalletModel.filter(
-                    user_id=wallet_transaction_request.user_id,
-                    currency=wallet_transaction_request.currency,
-                )
-                .select_for_update()
-                .first()
+    if isinstance(wallet_transaction_request, WalletTransactionRequestByUserID):
+        wallet_id = (
+            await WalletModel.filter(
+                user_id=wallet_transaction_request.user_id,
+                currency=wallet_transaction_request.currency,
             )
-        else:
-            wallet = (
-                await WalletModel.filter(
-                    business_id=wallet_transaction_request.business_id,
-                    currency=wallet_transaction_request.currency,
-                )
-                .select_for_update()
-                .first()
+            .first()
+            .values_list("id", flat=True)
+        )
+    else:
+        wallet_id = (
+            await WalletModel.filter(
+                business_id=wallet_transaction_request.business_id,
+                currency=wallet_transaction_request.currency,
             )
-
-        if wallet is None:
-            raise OWJException("E1000")
-
-        wallet_transaction = await WalletTransactionModel.create(
-            wallet=wallet,
-            amount=wallet_transaction_request.amount,
-            currency=wallet_transaction_request.currency,
-            preformed_by=current_user,
-            note=wallet_transaction_request.note,
-            reference=wallet_transaction_request.reference,
-            balance=wallet.amount + wallet_transaction_request.amount,
+            .first()
+            .values_list("id", flat=True)
         )
-        wallet.amount = wallet.amount + wallet_transaction_request.amount
-        await wallet.save()
 
-    if wallet_transaction:
-        return WalletTransactionResponse(data=wallet_transaction)
-    else:
+    if wallet_id is None:
         raise OWJException("E1000")
 
+    wallet_transaction = await post_wallet_transaction(
+        wallet_id,
+        wallet_transaction_request.amount,
+        wallet_transaction_request.currency,
+        current_user.id,
+        note=wallet_transaction_request.note,
+        reference=wallet_transaction_request.reference,
+    )
+    return WalletTransactionResponse(data=wallet_transaction)
+
+
+# post many wallet transactions at once
+@router.post(
+    "/batch",
+    response_model=WalletTransactionBatchResponse,
+    responses=responses,
+)
+async def create_wallet_transactions(
+    batch_request: WalletTransactionBatchRequest,
+    current_user: Annotated = Security(
+        get_current_active_user, scopes=[UserPermission.WALLET_TRANSACTION_CREATE]
+    ),
+    trace_id=Depends(get_trace_id),
+):
+    """
+    Type and Scope:
+
+    - **Type**: AGENCY User Set
+    - **Scope**: WALLET_TRANSACTION:CREATE
+
+    Description:
+
+    All items are posted in one database transaction and a result is returned for every item, in request order.
+
+    - **ALL_OR_NOTHING**: If any item fails, nothing is posted.
+    - **BEST_EFFORT**: Items that fail are skipped and the rest are posted.
+    """
+    check_user_set(current_user, UserSet.AGENCY)
+    logger.debug(
+        f"Creating {len(batch_request.items)} wallet transactions in {batch_request.mode} mode",
+        trace_id,
+    )
+    results = await post_wallet_transactions(
+        batch_request.items, current_user.id, batch_request.mode
+    )
+    return WalletTransactionBatchResponse(items=results)
+
 
 # all transactions
 @router.get(
     "",
     response_model=WalletTransactionsResponse,
     responses=responses,
+    dependencies=[Depends(use_replica)],
 )
 async def get_wallet_transactions(
     current_user: Annotated = Security(
@@ -110,6 +150,7 @@ async def get_wallet_transactions(
     ),
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     filters: WalletTransactionFilter = Depends(),
 ):
     """
@@ -121,14 +162,15 @@ async def get_wallet_transactions(
     check_user_set(current_user, UserSet.AGENCY)
     logger.debug("Getting wallet transactions", trace_id)
 
-    transactions = await get_paginated_results_with_filter(
+    transactions = await get_listing_results(
         WalletTransactionModel,
-        pagination["offset"],
-        pagination["size"],
+        pagination,
+        cursor_params,
         user_filters=filters.dict(exclude_none=True),
+        fields=wallet_transaction_fields,
     )
 
-    return transactions
+    return wallet_transactions_response(transactions)
 
 
 # get my wallet transactions
@@ -143,6 +185,7 @@ async def get_my_wallet_transactions(
     ),
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     filters: WalletTransactionFilter = Depends(),
 ):
     """
@@ -154,22 +197,24 @@ async def get_my_wallet_transactions(
     logger.debug(f"Getting my wallet transactions {current_user}", trace_id)
 
     if current_user.type in UserSet.BUSINESS.value:
-        transactions = await get_paginated_results_with_filter(
+        transactions = await get_listing_results(
             WalletTransactionModel,
-            pagination["offset"],
-            pagination["size"],
+            pagination,
+            cursor_params,
             user_filters=filters.dict(exclude_none=True),
+            fields=wallet_transaction_fields,
             system_filters={"wallet__business_id": current_user.business_id},
         )
     else:
-        transactions = await get_paginated_results_with_filter(
+        transactions = await get_listing_results(
             WalletTransactionModel,
-            pagination["offset"],
-            pagination["size"],
+            pagination,
+            cursor_params,
             user_filters=filters.dict(exclude_none=True),
+            fields=wallet_transaction_fields,
             system_filters={"wallet__user_id": current_user.id},
         )
-    return transactions
+    return wallet_transactions_response(transactions)
 
 
 @router.get(
@@ -217,6 +262,7 @@ async def get_business_wallet_transactions(
     ),
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     filters: WalletTransactionFilter = Depends(),
 ):
     """
@@ -231,13 +277,15 @@ async def get_business_wallet_transactions(
     if current_user.type in UserSet.BUSINESS.value and current_user.id != business_id:
         raise OWJPermissionException()
 
-    return await get_paginated_results_with_filter(
+    transactions = await get_listing_results(
         WalletTransactionModel,
-        pagination["offset"],
-        pagination["size"],
+        pagination,
+        cursor_params,
         user_filters=filters.dict(exclude_none=True),
+        fields=wallet_transaction_fields,
         system_filters={"wallet__business_id": business_id},
     )
+    return wallet_transactions_response(transactions)
 
 
 # get user wallet transactions
@@ -253,6 +301,7 @@ async def get_user_wallet_transactions(
     ),
     trace_id=Depends(get_trace_id),
     pagination=Depends(pagination),
+    cursor_params=Depends(cursor_pagination),
     filters: WalletTransactionFilter = Depends(),
 ):
     """
@@ -279,21 +328,23 @@ async def get_user_wallet_transactions(
         raise OWJPermissionException()
 
     if user_account.type in UserSet.BUSINESS.value:
-        transactions = await get_paginated_results_with_filter(
+        transactions = await get_listing_results(
             WalletTransactionModel,
-            pagination["offset"],
-            pagination["size"],
+            pagination,
+            cursor_params,
             user_filters=filters.dict(exclude_none=True),
+            fields=wallet_transaction_fields,
             system_filters={"wallet__business_id": user_account.business_id},
         )
 
     else:
-        transactions = await get_paginated_results_with_filter(
+        transactions = await get_listing_results(
             WalletTransactionModel,
-            pagination["offset"],
-            pagination["size"],
+            pagination,
+            cursor_params,
             user_filters=filters.dict(exclude_none=True),
+            fields=wallet_transaction_fields,
             system_filters={"wallet__user_id": user_account.id},
         )
 
-    return transactions
+    return wallet_transactions_response(transactions)
@@ -1,4 +1,7 @@
 from .finance import (
+    Wallet,
+    WalletTransaction,
+    IPGTransaction,
     WalletsResponse,
     WalletResponse,
     WalletTopOffRequest,
@@ -16,5 +19,7 @@ from .finance import (
     IPGTransactionFilter,
     WalletTopOffResponse,
     WalletUpdate,
-    WalletTransactionFilter
+    WalletTransactionFilter,
+    WalletTransactionBatchRequest,
+    WalletTransactionBatchResponse,
 )
@@ -25,6 +25,15 @@ class TokenData(BaseModel):
     scopes: list[UserPermission]
     type: UserTypeChoices
     token_type: str
+    jti: Optional[str] = None
+
+    @property
+    def uuid(self) -> str:
+        return self.sub
+
+    @property
+    def business_id(self) -> Optional[int]:
+        return int(self.business) if self.business else None
 
 
 class RefreshTokenData(BaseModel):
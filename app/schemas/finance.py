@@ -4,8 +4,8 @@ from tortoise.contrib.pydantic import pydantic_model_creator
 from owjcommon.enums import CurrencyChoices
 from owjcommon.schemas import Response, PaginatedResult, Filters
 from decimal import Decimal
-from typing import Optional
-from app.enums import IPGType, TransactionStatus
+from typing import Optional, Union
+from app.enums import BatchPostingMode, IPGType, TransactionStatus
 
 from app.models.finance import (
     IPG as IPGModel,
@@ -165,6 +165,33 @@ class WalletTransactionRequestByBusinessID(_WalletTransactionRequest):
     business_id: int = Field(..., description="ID of the business")
 
 
+class WalletTransactionBatchRequest(BaseModel):
+    items: list[
+        Union[WalletTransactionRequestByUserID, WalletTransactionRequestByBusinessID]
+    ] = Field(..., min_length=1, max_length=5000, description="Transactions to post")
+    mode: BatchPostingMode = Field(
+        BatchPostingMode.ALL_OR_NOTHING,
+        description="ALL_OR_NOTHING posts nothing if any item fails, BEST_EFFORT posts every item that can be posted",
+    )
+
+
+class WalletTransactionBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    posted: bool = Field(..., description="Whether the transaction was posted")
+    wallet_id: Optional[int] = Field(None, description="ID of the wallet")
+    balance: Optional[Decimal] = Field(
+        None, description="Wallet balance after this transaction"
+    )
+    reference: Optional[str] = Field(None, description="Reference of the item")
+    error: Optional[str] = Field(None, description="Error code if the item failed")
+
+
+class WalletTransactionBatchResponse(Response):
+    items: list[WalletTransactionBatchItemResult] = Field(
+        ..., description="Result of each item, in request order"
+    )
+
+
 WalletTransaction = pydantic_model_creator(
     WalletTransactionModel, name="WalletTransaction"
 )
@@ -174,6 +201,12 @@ class WalletTransactionsResponse(PaginatedResult):
     items: list[WalletTransaction] = Field(
         ..., description="List of wallet transactions"
     )
+    total_pages: Optional[int] = Field(
+        None, description="Total number of pages, not set when count_total is false"
+    )
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, cursor mode only"
+    )
 
 
 class WalletTransactionResponse(Response):
@@ -195,6 +228,12 @@ IPGTransaction = pydantic_model_creator(IPGTransactionModel, name="IPGTransactio
 
 class IPGTransactionsResponse(PaginatedResult):
     items: list[IPGTransaction] = Field(..., description="List of IPG transactions")
+    total_pages: Optional[int] = Field(
+        None, description="Total number of pages, not set when count_total is false"
+    )
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, cursor mode only"
+    )
 
 
 class IPGTransactionResponse(Response):
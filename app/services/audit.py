@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from tortoise import Tortoise, timezone
+from tortoise.backends.base.client import BaseTransactionWrapper
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# audit rows of the transaction opened by audit_staging in this context
+_staged: ContextVar[Optional[list]] = ContextVar("staged_audit_entries", default=None)
+
+
+class AuditWriter:
+    """
+    Buffers audit rows written outside a transaction and inserts them in
+    batches from a background task, on batch size or after flush_interval.
+    """
+
+    def __init__(self):
+        self._pending: list = []
+        self._oldest: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"buffered": 0, "flushed": 0, "dropped": 0, "failed_flushes": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def get_stats(self) -> dict:
+        lag = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        return {
+            **self.stats,
+            "running": self.running,
+            "pending": len(self._pending),
+            "flush_lag_seconds": lag,
+        }
+
+    def add(self, entry) -> bool:
+        # without the background task, e.g. in CLI tools, rows are written inline
+        if not self.running:
+            return False
+        if len(self._pending) >= settings.audit.max_pending:
+            self.stats["dropped"] += 1
+            return True
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._pending.append(entry)
+        self.stats["buffered"] += 1
+        if len(self._pending) >= settings.audit.batch_size:
+            self._wake.set()
+        return True
+
+    async def flush(self) -> None:
+        while self._pending:
+            batch = self._pending[: settings.audit.batch_size]
+            del self._pending[: len(batch)]
+            try:
+                await _insert(batch)
+            except Exception:
+                self.stats["failed_flushes"] += 1
+                logger.exception("Audit flush of %s rows failed", len(batch))
+                # kept for the next flush as long as the buffer has room
+                room = settings.audit.max_pending - len(self._pending)
+                self.stats["dropped"] += max(len(batch) - room, 0)
+                self._pending[:0] = batch[: max(room, 0)]
+                break
+            self.stats["flushed"] += len(batch)
+        self._oldest = time.monotonic() if self._pending else None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), timeout=settings.audit.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if settings.audit.buffered and not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+async def _insert(entries: list, connection=None) -> None:
+    # one multi-row INSERT per audit table
+    by_model: dict = {}
+    for entry in entries:
+        by_model.setdefault(type(entry), []).append(entry)
+    for model, rows in by_model.items():
+        await model.bulk_create(
+            rows, batch_size=settings.audit.batch_size, using_db=connection
+        )
+
+
+audit_writer = AuditWriter()
+
+
+class AuditPolicy:
+    """
+    Declares what a model's audit rows record, set as `audit_policy` on the model.
+
+    - include / exclude: fields kept in `changes`. A row with no change left is skipped
+    - skip_create: no CREATE rows, for append-only tables that are their own record
+    - noisy / noisy_sample_rate: rows that only change noisy fields are kept at
+      this rate, 0 skips them
+    """
+
+    def __init__(
+        self,
+        include: Optional[set] = None,
+        exclude: Optional[set] = None,
+        skip_create: bool = False,
+        noisy: Optional[set] = None,
+        noisy_sample_rate: float = 0.0,
+    ):
+        self.include = frozenset(include) if include is not None else None
+        self.exclude = frozenset(exclude or ())
+        self.skip_create = skip_create
+        self.noisy = frozenset(noisy or ())
+        self.noisy_sample_rate = noisy_sample_rate
+
+    def apply(self, entry) -> bool:
+        kind = getattr(entry.type, "value", entry.type)
+        if self.skip_create and kind == "CREATE":
+            return False
+        if not isinstance(entry.changes, dict):
+            return True
+
+        changes = {
+            field: change
+            for field, change in entry.changes.items()
+            if field not in self.exclude
+            and (self.include is None or field in self.include)
+        }
+        if entry.changes and not changes and kind == "UPDATE":
+            return False
+        if self.noisy and changes and changes.keys() <= self.noisy:
+            if random.random() >= self.noisy_sample_rate:
+                return False
+        entry.changes = changes
+        return True
+
+
+_audit_policies: Optional[dict] = None
+
+
+def _get_audit_policy(model_name: str) -> Optional[AuditPolicy]:
+    global _audit_policies
+    if _audit_policies is None and Tortoise.apps:
+        # audit rows name their model by class or by table
+        _audit_policies = {}
+        for app_models in Tortoise.apps.values():
+            for model in app_models.values():
+                policy = getattr(model, "audit_policy", None)
+                if policy is not None:
+                    _audit_policies[model.__name__] = policy
+                    _audit_policies[model._meta.db_table] = policy
+    return (_audit_policies or {}).get(model_name)
+
+
+def apply_audit_policy(entry) -> bool:
+    """Trims an audit row by its model's policy, False when it is not written."""
+    policy = _get_audit_policy(entry.model_name)
+    return policy is None or policy.apply(entry)
+
+
+def get_audit_stats() -> dict:
+    return audit_writer.get_stats()
+
+
+def defer_audit_entry(entry, using_db=None) -> bool:
+    """
+    Takes an audit row instead of saving it now. Returns False when the row
+    has to be written inline.
+    """
+    # stamped now, the row may be inserted later
+    if entry.timestamp is None:
+        entry.timestamp = timezone.now()
+
+    staged = _staged.get()
+    if staged is not None:
+        staged.append(entry)
+        return True
+    # rows of other transactions commit or roll back with them
+    if isinstance(using_db or type(entry)._choose_db(True), BaseTransactionWrapper):
+        return False
+    return audit_writer.add(entry)
+
+
+@asynccontextmanager
+async def audit_staging(connection):
+    """
+    Collects the audit rows written inside the block and inserts them with one
+    multi-row INSERT on `connection` when the block ends, so they commit or roll
+    back with the transaction.
+    """
+    if _staged.get() is not None:
+        # an outer block on the same transaction inserts them
+        yield
+        return
+
+    token = _staged.set([])
+    try:
+        yield
+        staged = _staged.get()
+        if staged:
+            await _insert(staged, connection)
+    finally:
+        _staged.reset(token)
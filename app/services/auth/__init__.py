@@ -1,5 +1,12 @@
 from .otp import check_otp, get_otp, get_otp_hash
 from .password import check_password, hash_password
+from .permissions import (
+    get_cached_permissions,
+    invalidate_group_permissions,
+    invalidate_user_permissions,
+    resolve_permissions,
+)
+from .principal import invalidate_principal
 from .token import create_access_token, validate_refresh_token
 
 __all__ = [
@@ -12,4 +19,9 @@ __all__ = [
     "get_current_active_user",
     "get_current_user",
     "get_token",
+    "invalidate_principal",
+    "get_cached_permissions",
+    "resolve_permissions",
+    "invalidate_user_permissions",
+    "invalidate_group_permissions",
 ]
@@ -1,21 +1,48 @@
 import base64
+from functools import lru_cache
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
 from app.config import settings
 
+# every Fernet token starts with the version byte 0x80, which is "gA" in base64
+_FERNET_TOKEN_PREFIX = b"gA"
+
+
+@lru_cache(maxsize=1)
+def get_cipher() -> MultiFernet:
+    keys = [settings.encryption_key, *settings.previous_encryption_keys]
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+def _to_token(encrypted_string: str) -> bytes:
+    token = encrypted_string.encode("utf-8")
+    if not token.startswith(_FERNET_TOKEN_PREFIX):
+        # older values were base64 encoded a second time on top of the Fernet token
+        token = base64.urlsafe_b64decode(token)
+    return token
+
 
 def encrypt(secret: str) -> str:
-    cipher_suite = Fernet(settings.encryption_key)
-    encrypted_secret = cipher_suite.encrypt(secret.encode("utf-8"))
-    # Convert bytes to Base64 encoded string
-    encrypted_string = base64.urlsafe_b64encode(encrypted_secret).decode("utf-8")
-    return encrypted_string
+    return get_cipher().encrypt(secret.encode("utf-8")).decode("utf-8")
 
 
 async def decrypt(encrypted_string: str) -> str:
-    cipher_suite = Fernet(settings.encryption_key)
-    # Convert Base64 encoded string back to bytes
-    encrypted_secret_bytes = base64.urlsafe_b64decode(encrypted_string)
-    decrypted_secret = cipher_suite.decrypt(encrypted_secret_bytes).decode("utf-8")
-    return decrypted_secret
+    return get_cipher().decrypt(_to_token(encrypted_string)).decode("utf-8")
+
+
+def rotate(encrypted_string: str) -> str:
+    # re-encrypt with the current encryption key, see app.rotate_keys
+    return get_cipher().rotate(_to_token(encrypted_string)).decode("utf-8")
+
+
+def needs_rotation(encrypted_string: str) -> bool:
+    """True for values stored the old way or under a previous key."""
+    token = encrypted_string.encode("utf-8")
+    if not token.startswith(_FERNET_TOKEN_PREFIX):
+        return True
+    try:
+        Fernet(settings.encryption_key).decrypt(token)
+    except InvalidToken:
+        return True
+    return False
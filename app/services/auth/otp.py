@@ -1,21 +1,33 @@
 from pyotp import TOTP, random_base32
 
 from app.config import settings
+from app.services.cache import TTLCache
 
 from .encrypt import decrypt, encrypt
 
+_totp_cache = TTLCache(settings.otp.cache_size, settings.otp.cache_ttl)
+
 
 def get_otp_hash() -> str:
     return encrypt(random_base32())
 
 
+async def _get_totp(encrypted_hash: str) -> TOTP:
+    totp = _totp_cache.get(encrypted_hash)
+    if totp is None:
+        otp_hash = await decrypt(encrypted_hash)
+        totp = TOTP(
+            s=otp_hash, digits=settings.otp.digits, interval=settings.otp.interval
+        )
+        _totp_cache.set(encrypted_hash, totp)
+    return totp
+
+
 async def check_otp(encrypted_hash: str, code: str) -> bool:
-    otp_hash = await decrypt(encrypted_hash)
-    totp = TOTP(s=otp_hash, digits=settings.otp.digits, interval=settings.otp.interval)
+    totp = await _get_totp(encrypted_hash)
     return totp.verify(code)
 
 
 async def get_otp(encrypted_hash) -> str:
-    otp_hash = await decrypt(encrypted_hash)
-    totp = TOTP(s=otp_hash, digits=settings.otp.digits, interval=settings.otp.interval)
+    totp = await _get_totp(encrypted_hash)
     return totp.now()
@@ -1,4 +1,6 @@
+import asyncio
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import bcrypt
@@ -10,6 +12,50 @@ from tortoise import fields, models
 
 from app.config import settings
 
+# bcrypt releases the GIL, so a small thread pool keeps KDF work off the event loop
+_kdf_executor = ThreadPoolExecutor(
+    max_workers=settings.password.hash_workers, thread_name_prefix="kdf"
+)
+_kdf_stats = {"pending": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+
+class KDFOverloadedError(Exception):
+    """Too many password operations are queued, answered with 503 by the app."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent password operations, retry later")
+        self.retry_after = retry_after
+
+
+def get_kdf_stats() -> dict:
+    return {
+        **_kdf_stats,
+        "workers": settings.password.hash_workers,
+        "max_pending": settings.password.hash_max_pending,
+    }
+
+
+def shutdown_kdf_executor() -> None:
+    _kdf_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_kdf(func, *args):
+    if _kdf_stats["pending"] >= settings.password.hash_max_pending:
+        _kdf_stats["rejected"] += 1
+        raise KDFOverloadedError(settings.password.hash_retry_after)
+
+    _kdf_stats["pending"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_kdf_executor, func, *args)
+    except BaseException:
+        _kdf_stats["failed"] += 1
+        raise
+    finally:
+        _kdf_stats["pending"] -= 1
+    _kdf_stats["completed"] += 1
+    return result
+
 
 async def hmac_hash_password(password: str) -> bytes:
     hmac_key = hmac.HMAC(
@@ -19,12 +65,16 @@ async def hmac_hash_password(password: str) -> bytes:
     return hmac_key.finalize()
 
 
+def _bcrypt_hash(hmac_hash: bytes) -> bytes:
+    return bcrypt.hashpw(hmac_hash, bcrypt.gensalt())
+
+
 async def hash_password(password: str) -> str:
     # Hash the password with HMAC
     hmac_hash = await hmac_hash_password(password)
 
     # Hash the HMAC hash with bcrypt
-    hashed = bcrypt.hashpw(hmac_hash, bcrypt.gensalt())
+    hashed = await _run_kdf(_bcrypt_hash, hmac_hash)
     return hashed.decode("utf-8")
 
 
@@ -33,4 +83,4 @@ async def check_password(hashed_password: str, password: str) -> bool:
     hmac_hash = await hmac_hash_password(password)
 
     # Use bcrypt's checkpw for verification
-    return bcrypt.checkpw(hmac_hash, hashed_password.encode("utf-8"))
+    return await _run_kdf(bcrypt.checkpw, hmac_hash, hashed_password.encode("utf-8"))
@@ -0,0 +1,51 @@
+from typing import Iterable, Optional
+
+from owjcommon.enums import USER_TYPE_PERMISSIONS
+
+from app.config import settings
+from app.services.cache import TTLCache
+
+_type_permissions: dict = {}
+# (user id, user type) -> (ids of the user's groups, effective permissions)
+_user_permissions = TTLCache(
+    settings.cache.permission_size, settings.cache.permission_ttl
+)
+
+
+def _get_type_permissions(user_type) -> frozenset:
+    permissions = _type_permissions.get(user_type)
+    if permissions is None:
+        permissions = frozenset(USER_TYPE_PERMISSIONS.get(user_type, []))
+        _type_permissions[user_type] = permissions
+    return permissions
+
+
+def get_cached_permissions(user_id: int, user_type) -> Optional[frozenset]:
+    entry = _user_permissions.get((user_id, user_type))
+    return entry[1] if entry is not None else None
+
+
+def resolve_permissions(
+    user_id: int, user_type, groups: Iterable[tuple[int, list[str]]]
+) -> frozenset:
+    # group grants come from the caller's fresh read, revocations in another
+    # worker are picked up once permission_ttl expires
+    groups = list(groups)
+    permissions = _get_type_permissions(user_type).union(
+        *(grants or () for _, grants in groups)
+    )
+    # kept with the groups it was built from, so a group change finds its members
+    group_ids = frozenset(group_id for group_id, _ in groups)
+    _user_permissions.set((user_id, user_type), (group_ids, permissions))
+    return permissions
+
+
+def invalidate_user_permissions(*user_ids: int) -> None:
+    user_ids = set(user_ids)
+    _user_permissions.pop_matching(lambda key: key[0] in user_ids)
+
+
+def invalidate_group_permissions(group_id: int) -> None:
+    # users added to or removed from the group are dropped by add_users and
+    # remove_users, this covers changes to the group itself
+    _user_permissions.pop_matching_values(lambda entry: group_id in entry[0])
@@ -0,0 +1,25 @@
+import copy
+from typing import Optional
+
+from app.config import settings
+from app.services.cache import TTLCache
+
+# authenticated users keyed by (sub, jti) of the access token they presented
+_principal_cache = TTLCache(settings.cache.principal_size, settings.cache.principal_ttl)
+
+
+# each request gets its own copy, handlers may change and save the user they get
+def get_cached_principal(sub: str, jti: Optional[str]):
+    user = _principal_cache.get((sub, jti))
+    return copy.copy(user) if user is not None else None
+
+
+def cache_principal(sub: str, jti: Optional[str], user) -> None:
+    _principal_cache.set((sub, jti), copy.copy(user))
+
+
+def invalidate_principal(sub: str, jti: Optional[str] = None) -> None:
+    if jti is not None:
+        _principal_cache.pop((sub, jti))
+    else:
+        _principal_cache.pop_matching(lambda key: key[0] == sub)
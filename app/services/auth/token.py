@@ -34,6 +34,7 @@ async def create_access_token(
         "scopes": scopes,
         "type": type.value,
         "token_type": "access",
+        "jti": str(jti),
     }
     token = jwt.encode(data, settings.jwt.secret_key, algorithm=settings.jwt.algorithm)
     refresh_token = jwt.encode(
@@ -3,6 +3,8 @@ from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from typing import Annotated
 from fastapi import Depends
 from .token import validate_token
+from .principal import cache_principal, get_cached_principal
+from app.schemas.auth import TokenData
 from owjcommon.exceptions import OWJException, OWJPermissionException
 from owjcommon.enums import UserTypeChoices, UserSet
 from fastapi import HTTPException, status
@@ -19,12 +21,23 @@ async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
 ):
     token_data = await validate_token(security_scopes, token)
-    user = await UserAccount.get_or_none(uuid=token_data.sub)
+    user = get_cached_principal(token_data.sub, token_data.jti)
     if user is None:
-        raise credentials_exception
+        user = await UserAccount.get_or_none(uuid=token_data.sub)
+        if user is None:
+            raise credentials_exception
+        cache_principal(token_data.sub, token_data.jti, user)
     return user
 
 
+# for read only endpoints that only need the identity carried by the token
+async def get_current_principal(
+    security_scopes: SecurityScopes,
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> TokenData:
+    return await validate_token(security_scopes, token)
+
+
 async def get_current_active_user(
     current_user: Annotated[UserAccount, Depends(get_current_user)],
 ):
@@ -1,10 +1,13 @@
 from app.enums import IPGType
-from .nextpay import NextPayClient
-from .sep import SepClient
 
 
+# gateway clients and their HTTP stack are only imported when a gateway is used
 def get_ipg_client(type: IPGType):
     if type == IPGType.NEXTPAY:
+        from .nextpay import NextPayClient
+
         return NextPayClient
     if type == IPGType.SEP:
-        return SepClient
\ No newline at end of file
+        from .sep import SepClient
+
+        return SepClient
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from owjcommon.exceptions import OWJException
+
+from app.config import settings
+from app.enums import IPGType, TransactionStatus
+from app.services.cache import TTLCache
+
+# (ipg type, transaction id, token) -> status of transactions that left PENDING
+_finalised = TTLCache(settings.ipg.callback_cache_size, settings.ipg.callback_cache_ttl)
+# callbacks being processed in this worker, duplicates wait for the first one
+_in_flight: dict[tuple, asyncio.Future] = {}
+_callback_stats = {"processed": 0, "cached": 0, "coalesced": 0, "finalised": 0}
+
+
+def get_callback_stats() -> dict:
+    return {**_callback_stats, "cache_size": len(_finalised)}
+
+
+async def handle_callback(
+    ipg_type: IPGType,
+    transaction_id,
+    token: Optional[str],
+    process: Callable[[], Awaitable[TransactionStatus]],
+    open_statuses: tuple = (TransactionStatus.PENDING,),
+) -> TransactionStatus:
+    """
+    Runs `process` at most once per transaction and returns the resulting
+    status.
+
+    Repeated callbacks for a finalised transaction are answered from memory or
+    from an unlocked read, without opening a transaction. Concurrent duplicates
+    wait for the callback already being processed instead of locking the row
+    and verifying again. `process` only runs for rows in `open_statuses`, it
+    locks the row, checks its status again, and returns the status it left
+    the transaction in.
+    """
+    from app.models import IPGTransaction
+
+    # a callback carrying another transaction's token must not share its result
+    key = (ipg_type, str(transaction_id), token)
+    status = _finalised.get(key)
+    if status is not None:
+        _callback_stats["cached"] += 1
+        return status
+
+    future = _in_flight.get(key)
+    if future is not None:
+        _callback_stats["coalesced"] += 1
+        try:
+            # shielded so a client disconnect does not cancel the shared result
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the first caller was cancelled, not this one, which takes its place
+            if not future.cancelled():
+                raise
+        return await handle_callback(
+            ipg_type, transaction_id, token, process, open_statuses
+        )
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        # settled by another worker or an earlier callback, no lock needed
+        status = (
+            await IPGTransaction.filter(pk=transaction_id, token=token)
+            .first()
+            .values_list("status", flat=True)
+        )
+        if status is None:
+            raise OWJException("E1025")
+        if status in open_statuses:
+            _callback_stats["processed"] += 1
+            status = await process()
+        if status != TransactionStatus.PENDING:
+            _callback_stats["finalised"] += 1
+            _finalised.set(key, status)
+        future.set_result(status)
+        return status
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # marks the exception retrieved when no duplicate was waiting
+        future.exception()
+        raise
+    finally:
+        del _in_flight[key]
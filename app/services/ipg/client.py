@@ -1,6 +1,11 @@
+import time
 from abc import ABC, abstractmethod
 from owjcommon.enums import CurrencyChoices
 
+from app.services.metrics import IPG_DURATION
+
+from .transport import get_http_client, _host_key
+
 
 class Client(ABC):
     def __init__(self, terminal_id, merchant_id, merchant_key, password, callback_url, url, currency):
@@ -12,12 +17,34 @@ class Client(ABC):
         self.currency = currency
         self.url = url
 
+    async def post(self, path, data=None, json=None, headers=None):
+        if data is not None:
+            # gateways expect unset form fields to be left out, not sent empty
+            data = {key: value for key, value in data.items() if value is not None}
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            response = await get_http_client(self.url).post(
+                self.url + path, data=data, json=json, headers=headers
+            )
+            outcome = str(response.status_code)
+            return response
+        finally:
+            IPG_DURATION.observe(
+                time.perf_counter() - started, _host_key(self.url), outcome
+            )
+
     @abstractmethod
-    def pay(
+    async def pay(
         self, amount, currency, phone_number, order_id, reference=None, description=None
     ):
         pass
 
     @abstractmethod
-    def verify(self, transaction):
+    async def verify(self, transaction):
         pass
+
+    async def inquire(self, transaction):
+        # sets the final status of a transaction whose callback may never have
+        # arrived, gateways confirm a payment through their verify call
+        await self.verify(transaction)
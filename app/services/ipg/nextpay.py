@@ -1,6 +1,7 @@
+import json
+
 from .client import Client
 from owjcommon.enums import CurrencyChoices
-import requests
 from app.schemas import WalletTopOffResponse
 from app.models import IPGTransaction as IPGTransactionModel
 from app.enums import TransactionStatus
@@ -36,7 +37,7 @@ class NextPayClient(Client):
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-    def pay(
+    async def pay(
         self, amount, currency, phone_number, order_id, reference=None, description=None
     ):
         request_data = {
@@ -46,15 +47,17 @@ class NextPayClient(Client):
             "callback_uri": self.callback_url,
             "currency": currency,
             "customer_phone": phone_number,
-            "custom_json_fields": {
-                "description": description,
-                "reference": reference,
-            },
+            "custom_json_fields": json.dumps(
+                {
+                    "description": description,
+                    "reference": reference,
+                }
+            ),
             "payer_desc": description,
         }
 
-        response = requests.post(
-            url=self.url + self.TOKEN_URL,
+        response = await self.post(
+            self.TOKEN_URL,
             data=request_data,
             headers=self.headers,
         )
@@ -75,8 +78,8 @@ class NextPayClient(Client):
             "currency": transaction.currency,
         }
 
-        response = requests.post(
-            url=self.url + self.VERIFY_URL,
+        response = await self.post(
+            self.VERIFY_URL,
             data=request_data,
             headers=self.headers,
         )
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+
+from tortoise import timezone
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.enums import TransactionStatus
+from app.models import IPG, IPGTransaction
+from app.services.audit import audit_staging
+
+from .verification import (
+    VERIFIED_FIELDS,
+    get_gateway_client,
+    record_failure,
+    settle_transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationSweeper:
+    """
+    Settles PENDING transactions whose callback never arrived, e.g. because
+    the user left the gateway page. Every sweep_interval, rows older than
+    sweep_pending_after are claimed in batches and the gateway is asked
+    about them concurrently. Each answer is settled like a callback's, under
+    the row lock. Rows the gateway did not answer for go back to PENDING for
+    the next sweep, until verify_max_failures inquiries failed on them. Those
+    stay VERIFYING for manual review.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "sweeps": 0,
+            "swept": 0,
+            "errors": 0,
+            "left_for_review": 0,
+            "by_status": {},
+            "last_sweep_seconds": 0.0,
+            "last_sweep_rate": 0.0,
+            # age of the oldest stale PENDING row when the last sweep started
+            "lag_seconds": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "running": self.running}
+
+    async def _claim(self, cutoff, after: Optional[tuple]) -> list:
+        # SKIP LOCKED lets sweepers in other processes take other rows
+        async with in_transaction("default") as connection, audit_staging(connection):
+            query = IPGTransaction.filter(
+                status=TransactionStatus.PENDING, created_at__lt=cutoff
+            )
+            if after is not None:
+                query = query.filter(
+                    Q(created_at__gt=after[0])
+                    | Q(created_at=after[0], id__gt=after[1])
+                )
+            batch = (
+                await query.order_by("created_at", "id")
+                .limit(settings.ipg.sweep_batch_size)
+                .select_for_update(skip_locked=True)
+                .using_db(connection)
+            )
+            # late callbacks see VERIFYING and leave the row to the sweep, except
+            # SEP ones which store their RefNum on it. Saved row by row for the
+            # audit log, the fresh updated_at keeps verification recovery off it
+            for transaction in batch:
+                transaction.status = TransactionStatus.VERIFYING
+                await transaction.save(
+                    using_db=connection, update_fields=["status", "updated_at"]
+                )
+        return batch
+
+    async def _reconcile(self, batch: list) -> None:
+        clients = {
+            ipg.id: get_gateway_client(ipg)
+            for ipg in await IPG.filter(
+                id__in={transaction.ipg_id for transaction in batch}
+            )
+        }
+        semaphore = asyncio.Semaphore(settings.ipg.sweep_concurrency)
+
+        async def reconcile(transaction) -> None:
+            # restored when the inquiry fails part way
+            known = {field: getattr(transaction, field) for field in VERIFIED_FIELDS}
+            async with semaphore:
+                try:
+                    await clients[transaction.ipg_id].inquire(transaction)
+                except Exception:
+                    logger.warning(
+                        "Inquiry of IPG transaction %s failed",
+                        transaction.id,
+                        exc_info=True,
+                    )
+                    for field, value in known.items():
+                        setattr(transaction, field, value)
+                    await record_failure(transaction.id)
+                    transaction.verify_failures += 1
+                answered = transaction.status not in (
+                    TransactionStatus.PENDING,
+                    TransactionStatus.VERIFYING,
+                )
+                if not answered:
+                    if transaction.verify_failures < settings.ipg.verify_max_failures:
+                        # back to PENDING for the next sweep
+                        transaction.status = TransactionStatus.PENDING
+                    else:
+                        # an inquiry that always fails, e.g. on a malformed
+                        # answer. Left VERIFYING, which recovery skips as well
+                        self.stats["left_for_review"] += 1
+                        logger.error(
+                            "Inquiry of IPG transaction %s failed %s times, left "
+                            "VERIFYING for manual review",
+                            transaction.id,
+                            transaction.verify_failures,
+                        )
+                # written under the row lock, a late callback wins over the answer
+                try:
+                    status = await settle_transaction(transaction)
+                except Exception:
+                    # left VERIFYING, the verification worker recovers it
+                    self.stats["errors"] += 1
+                    logger.exception(
+                        "Settling IPG transaction %s failed", transaction.id
+                    )
+                    return
+            if answered:
+                self._count(status)
+            else:
+                self.stats["errors"] += 1
+
+        await asyncio.gather(*(reconcile(transaction) for transaction in batch))
+
+    def _count(self, status: TransactionStatus, amount: int = 1) -> None:
+        by_status = self.stats["by_status"]
+        by_status[status.value] = by_status.get(status.value, 0) + amount
+
+    async def sweep(self) -> int:
+        """Runs one sweep over every stale PENDING row, returns the rows swept."""
+        started = time.monotonic()
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.ipg.sweep_pending_after)
+        oldest = (
+            await IPGTransaction.filter(
+                status=TransactionStatus.PENDING, created_at__lt=cutoff
+            )
+            .order_by("created_at")
+            .first()
+            .values_list("created_at", flat=True)
+        )
+        self.stats["lag_seconds"] = (
+            (now - oldest).total_seconds() if oldest is not None else 0.0
+        )
+
+        swept = 0
+        after = None
+        while True:
+            batch = await self._claim(cutoff, after)
+            if not batch:
+                break
+            await self._reconcile(batch)
+            swept += len(batch)
+            after = (batch[-1].created_at, batch[-1].id)
+
+        elapsed = time.monotonic() - started
+        self.stats["sweeps"] += 1
+        self.stats["swept"] += swept
+        self.stats["last_sweep_seconds"] = elapsed
+        self.stats["last_sweep_rate"] = swept / elapsed if elapsed else 0.0
+        if swept:
+            logger.info(
+                "Reconciled %s stale IPG transactions in %.1fs, oldest was %.0fs old",
+                swept,
+                elapsed,
+                self.stats["lag_seconds"],
+            )
+        return swept
+
+    async def _run(self) -> None:
+        while True:
+            # first run after startup, once Tortoise is initialised
+            await asyncio.sleep(settings.ipg.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Reconciling stale IPG transactions failed")
+
+    def start(self) -> None:
+        if settings.ipg.sweep_enabled and not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        # rows claimed by an interrupted sweep are recovered by the verification
+        # worker once they are verify_stuck_after old
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reconciliation_sweeper = ReconciliationSweeper()
+
+
+def get_sweep_stats() -> dict:
+    return reconciliation_sweeper.get_stats()
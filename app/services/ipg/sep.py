@@ -1,12 +1,15 @@
 from .client import Client
 from owjcommon.enums import CurrencyChoices
-import requests
 from app.schemas import WalletTopOffResponse
 from app.models import IPGTransaction as IPGTransactionModel
 from app.enums import TransactionStatus
 from decimal import Decimal
 
 
+# ResultCode of a verify repeated after an earlier one succeeded
+ALREADY_VERIFIED = 2
+
+
 class SepClient(Client):
     TOKEN_URL = "/onlinepg/onlinepg"
     VERIFY_URL = "/verifyTxnRandomSessionkey/ipg/VerifyTransaction"
@@ -32,7 +35,7 @@ class SepClient(Client):
             currency,
         )
 
-    def pay(
+    async def pay(
         self, amount, currency, phone_number, order_id, reference=None, description=None
     ):
         request_data = {
@@ -48,8 +51,8 @@ class SepClient(Client):
         }
         print(request_data)
 
-        response = requests.post(
-            url=self.url + self.TOKEN_URL,
+        response = await self.post(
+            self.TOKEN_URL,
             data=request_data,
         )
 
@@ -67,15 +70,17 @@ class SepClient(Client):
             "TerminalNumber": self.terminal_id,
         }
 
-        response = requests.post(
-            url=self.url + self.VERIFY_URL,
+        response = await self.post(
+            self.VERIFY_URL,
             json=request_data,
         )
         print(response.text)
 
         response = response.json()
 
-        if response["ResultCode"] != 0:
+        # a retried verify whose first answer was lost reports the payment as
+        # verified, it is settled like the first answer would have been
+        if response["ResultCode"] not in (0, ALREADY_VERIFIED):
             transaction.status = TransactionStatus.FAILED
             transaction.card_number = response["TransactionDetail"]["MaskedPan"]
             transaction.shaparak_reference_id = response["TransactionDetail"]["RRN"]
@@ -97,3 +102,11 @@ class SepClient(Client):
         transaction.card_number = response["TransactionDetail"]["MaskedPan"]
         transaction.shaparak_reference_id = response["TransactionDetail"]["RRN"]
         return
+
+    async def inquire(self, transaction: IPGTransactionModel):
+        # without the RefNum of a callback there is nothing to verify, and SEP
+        # reverses payments that are never verified
+        if transaction.ipg_reference_id is None:
+            transaction.status = TransactionStatus.FAILED
+            return
+        await self.verify(transaction)
@@ -0,0 +1,36 @@
+import httpx
+
+from app.config import settings
+
+# one pooled keep-alive client per gateway host, shared by every Client instance
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _host_key(url: str) -> str:
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    key = _host_key(url)
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.ipg.timeout, connect=settings.ipg.connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.ipg.max_connections,
+                max_keepalive_connections=settings.ipg.max_keepalive_connections,
+                keepalive_expiry=settings.ipg.keepalive_expiry,
+            ),
+        )
+        _clients[key] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
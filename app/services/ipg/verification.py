@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Optional
+
+from tortoise import timezone
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.enums import TransactionStatus
+from app.models import IPGTransaction
+from app.services.audit import audit_staging
+from app.services.ipg import get_ipg_client
+from app.services.wallet import post_wallet_transaction
+
+logger = logging.getLogger(__name__)
+
+# fields IPG clients set on the transaction while verifying
+VERIFIED_FIELDS = ("status", "card_number", "shaparak_reference_id")
+
+
+def is_transport_error(error: Exception) -> bool:
+    """
+    True when the gateway call never got an answer. Verify is not idempotent
+    on the gateway side, so only these are retried.
+    """
+    # imported here, the HTTP stack stays out of worker boot
+    import httpx
+
+    return isinstance(error, httpx.TransportError)
+
+
+async def record_failure(transaction_id) -> None:
+    """Counts a failed gateway call on the row, see verify_max_failures."""
+    try:
+        await IPGTransaction.filter(pk=transaction_id).update(
+            verify_failures=F("verify_failures") + 1
+        )
+    except Exception:
+        logger.exception("Counting a failed verification of %s failed", transaction_id)
+
+
+def get_gateway_client(ipg):
+    return get_ipg_client(ipg.type)(
+        terminal_id=ipg.terminal_id,
+        merchant_id=ipg.merchant_id,
+        merchant_key=ipg.merchant_key,
+        password=ipg.password,
+        callback_url=ipg.callback_url,
+        url=ipg.url,
+        currency=ipg.currency,
+    )
+
+
+async def verify_transaction(transaction_id) -> Optional[TransactionStatus]:
+    """
+    Verifies a VERIFYING transaction with its gateway and credits the wallet
+    on success.
+    """
+    transaction = (
+        await IPGTransaction.filter(pk=transaction_id).select_related("ipg").first()
+    )
+    if transaction is None or transaction.status != TransactionStatus.VERIFYING:
+        return getattr(transaction, "status", None)
+
+    await get_gateway_client(transaction.ipg).inquire(transaction)
+    return await settle_transaction(transaction)
+
+
+async def settle_transaction(transaction) -> TransactionStatus:
+    """
+    Writes the gateway's answer for a VERIFYING transaction. The gateway is
+    called without holding the row lock, so the row is locked and checked
+    again here, and a transaction is only credited once.
+    """
+    async with in_transaction("default") as connection, audit_staging(connection):
+        locked = (
+            await IPGTransaction.filter(pk=transaction.pk).select_for_update().first()
+        )
+        # settled by another worker while the gateway answered
+        if locked.status != TransactionStatus.VERIFYING:
+            return locked.status
+        # a late callback stored the payload after the row was read, the answer
+        # is discarded and the callback has the row verified again
+        if locked.ipg_reference_id != transaction.ipg_reference_id:
+            return locked.status
+
+        for field in VERIFIED_FIELDS:
+            setattr(locked, field, getattr(transaction, field))
+
+        if locked.status == TransactionStatus.SUCCESS:
+            await post_wallet_transaction(
+                locked.wallet_id,
+                locked.amount,
+                locked.currency,
+                locked.user_id,
+                note=locked.note,
+                reference=locked.reference_id,
+            )
+
+        await locked.save()
+    return locked.status
+
+
+class VerificationWorker:
+    """
+    Verifies transactions that callbacks marked VERIFYING, with at most
+    verify_workers gateway calls at a time. Calls that got no answer are
+    retried with exponential backoff, other errors are not. Rows left
+    VERIFYING by a crash or by giving up are picked up again once they are
+    verify_stuck_after old, until verify_max_failures calls failed on them.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        # ids queued or being verified, a transaction is only queued once
+        self._queued: set = set()
+        self._tasks: list[asyncio.Task] = []
+        self.stats = {
+            "queued": 0,
+            "verified": 0,
+            "retried": 0,
+            "gave_up": 0,
+            "recovered": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "running": self.running,
+            "pending": len(self._queued),
+        }
+
+    def submit(self, transaction_id) -> bool:
+        # without the background tasks, e.g. in CLI tools, callers verify inline
+        if not self.running:
+            return False
+        if transaction_id not in self._queued:
+            self._queued.add(transaction_id)
+            self._queue.put_nowait((transaction_id, 1))
+            self.stats["queued"] += 1
+        return True
+
+    def _backoff(self, attempt: int) -> float:
+        delay = settings.ipg.verify_retry_base * 2 ** (attempt - 1)
+        # jitter keeps retries for one gateway outage from arriving together
+        return min(delay, settings.ipg.verify_retry_max) * random.uniform(0.5, 1.0)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            transaction_id, attempt = await self._queue.get()
+            try:
+                await verify_transaction(transaction_id)
+            except Exception as error:
+                await record_failure(transaction_id)
+                if (
+                    not is_transport_error(error)
+                    or attempt >= settings.ipg.verify_max_attempts
+                ):
+                    self.stats["gave_up"] += 1
+                    self._queued.discard(transaction_id)
+                    logger.exception(
+                        "Verifying IPG transaction %s failed on attempt %s, left "
+                        "for recovery",
+                        transaction_id,
+                        attempt,
+                    )
+                    continue
+                self.stats["retried"] += 1
+                logger.warning(
+                    "Verifying IPG transaction %s failed, attempt %s",
+                    transaction_id,
+                    attempt,
+                    exc_info=True,
+                )
+                loop.call_later(
+                    self._backoff(attempt),
+                    self._queue.put_nowait,
+                    (transaction_id, attempt + 1),
+                )
+                continue
+            self.stats["verified"] += 1
+            self._queued.discard(transaction_id)
+
+    async def recover(self) -> int:
+        """
+        Queues VERIFYING rows that nobody has touched for verify_stuck_after.
+        Rows whose gateway calls failed verify_max_failures times are left for
+        manual review.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.ipg.verify_stuck_after)
+        stuck = await IPGTransaction.filter(
+            status=TransactionStatus.VERIFYING,
+            updated_at__lt=cutoff,
+            verify_failures__lt=settings.ipg.verify_max_failures,
+        ).values_list("id", flat=True)
+        recovered = 0
+        for transaction_id in stuck:
+            if transaction_id in self._queued:
+                continue
+            # bumping updated_at claims the row, other processes skip it
+            claimed = await IPGTransaction.filter(
+                pk=transaction_id,
+                status=TransactionStatus.VERIFYING,
+                updated_at__lt=cutoff,
+            ).update(updated_at=timezone.now())
+            if claimed and self.submit(transaction_id):
+                recovered += 1
+        self.stats["recovered"] += recovered
+        return recovered
+
+    async def _recover_forever(self) -> None:
+        while True:
+            # first run after startup, once Tortoise is initialised
+            await asyncio.sleep(settings.ipg.verify_recovery_interval)
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Recovering stuck IPG verifications failed")
+
+    def start(self) -> None:
+        if not settings.ipg.verify_in_background or self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._queued.clear()
+        self._tasks = [
+            loop.create_task(self._run()) for _ in range(settings.ipg.verify_workers)
+        ]
+        self._tasks.append(loop.create_task(self._recover_forever()))
+
+    async def stop(self) -> None:
+        # queued rows stay VERIFYING and are recovered by the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+verification_worker = VerificationWorker()
+
+
+def get_verification_stats() -> dict:
+    return verification_worker.get_stats()
+
+
+async def schedule_verification(transaction_id) -> TransactionStatus:
+    """
+    Hands a committed VERIFYING transaction to the worker. Without a running
+    worker it is verified inline and its final status returned.
+    """
+    if verification_worker.submit(transaction_id):
+        return TransactionStatus.VERIFYING
+    return await verify_transaction(transaction_id)
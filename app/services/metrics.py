@@ -0,0 +1,176 @@
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Prometheus text exposition without a client library. Metrics are plain dicts
+# updated from the event loop thread, so no locking is needed
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float) -> None:
+        self._values[labels] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket plus +Inf, sum]
+        self._values: dict = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by operation ID",
+    labels=("operation",),
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests by operation ID and status code",
+    labels=("operation", "status"),
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled")
+DB_QUERIES = Counter("db_queries_total", "Database queries executed")
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Database query latency")
+IPG_DURATION = Histogram(
+    "ipg_request_duration_seconds",
+    "Payment gateway call latency by host and outcome",
+    labels=("host", "outcome"),
+)
+
+_metrics = [
+    REQUEST_DURATION,
+    REQUESTS,
+    IN_FLIGHT,
+    DB_QUERIES,
+    DB_QUERY_DURATION,
+    IPG_DURATION,
+]
+# called on every scrape to refresh gauges that mirror other stats
+_collectors: list[Callable[[], None]] = []
+
+
+def register(metric, collector: Callable[[], None] = None):
+    _metrics.append(metric)
+    if collector is not None:
+        _collectors.append(collector)
+    return metric
+
+
+def render_metrics() -> str:
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def record_query(record) -> None:
+    # asyncpg query logger, installed on every pooled connection by app.db
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(record.elapsed)
+
+
+class MetricsMiddleware:
+    """Records latency, status and in-flight count of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            # the router stores the matched route in the scope
+            route = scope.get("route")
+            operation = getattr(route, "unique_id", None) or "unmatched"
+            REQUEST_DURATION.observe(elapsed, operation)
+            REQUESTS.inc(operation, status)
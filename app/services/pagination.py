@@ -0,0 +1,147 @@
+import base64
+import json
+import math
+from datetime import datetime
+from enum import Enum
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Query, status
+from tortoise.expressions import Q
+
+from owjcommon.models import get_paginated_results_with_filter
+
+from app.enums import PaginationMode
+
+
+def cursor_pagination(
+    mode: PaginationMode = Query(
+        PaginationMode.OFFSET,
+        description="Use cursor to page with next_cursor instead of offset. Cursor paging stays fast on deep pages",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor of the previous page, cursor mode only"
+    ),
+    count_total: bool = Query(
+        False,
+        description="Set to true to also compute total_pages, cursor mode only. Counting reads every matching row",
+    ),
+):
+    return {"mode": mode, "cursor": cursor, "count_total": count_total}
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("utf-8")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def _filter_condition(model, user_filters: dict) -> Optional[Q]:
+    # same filter semantics as the offset paginator: match_type applies to every
+    # field and the fields are joined with logical_op
+    filters = dict(user_filters)
+    logical_op = getattr(filters.pop("logical_op", "and"), "value", "and")
+    match_type = getattr(filters.pop("match_type", "like"), "value", "like")
+
+    conditions = []
+    for key, value in filters.items():
+        if key in model._meta.fk_fields:
+            key = f"{key}_id"
+        if (
+            match_type in ("like", "not_like")
+            and isinstance(value, str)
+            and not isinstance(value, Enum)
+        ):
+            condition = Q(**{f"{key}__icontains": value})
+        else:
+            condition = Q(**{key: value})
+        if match_type in ("not_exact", "not_like"):
+            condition = ~condition
+        conditions.append(condition)
+
+    if not conditions:
+        return None
+    return Q(*conditions, join_type=Q.OR if logical_op == "or" else Q.AND)
+
+
+async def get_cursor_results_with_filter(
+    model,
+    size: int,
+    cursor: Optional[str] = None,
+    user_filters: Optional[dict] = None,
+    system_filters: Optional[dict] = None,
+    count_total: bool = False,
+    fields: Optional[Sequence[str]] = None,
+):
+    query = model.filter(**(system_filters or {}))
+    condition = _filter_condition(model, user_filters or {})
+    if condition is not None:
+        query = query.filter(condition)
+
+    page_query = query
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        page_query = page_query.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+        )
+
+    # one extra row tells whether there is a next page without counting
+    page_query = page_query.order_by("-created_at", "-id").limit(size + 1)
+    if fields:
+        # plain dict rows, no model instances are built
+        columns = dict.fromkeys((*fields, "created_at", "id"))
+        items = await page_query.values(*columns)
+    else:
+        items = await page_query
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        if fields:
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        else:
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+    total_pages = None
+    if count_total:
+        total_pages = math.ceil(await query.count() / size) if size else 0
+
+    return {"items": items, "total_pages": total_pages, "next_cursor": next_cursor}
+
+
+async def get_listing_results(
+    model,
+    pagination: dict,
+    cursor_params: dict,
+    user_filters: Optional[dict] = None,
+    system_filters: Optional[dict] = None,
+    fields: Optional[Sequence[str]] = None,
+):
+    # fields opts the cursor mode into the projected read path, offset mode
+    # always pages through owjcommon with model instances
+    if cursor_params["mode"] == PaginationMode.CURSOR:
+        return await get_cursor_results_with_filter(
+            model,
+            pagination["size"],
+            cursor_params["cursor"],
+            user_filters=user_filters,
+            system_filters=system_filters,
+            count_total=cursor_params["count_total"],
+            fields=fields,
+        )
+    kwargs = {"system_filters": system_filters} if system_filters is not None else {}
+    return await get_paginated_results_with_filter(
+        model,
+        pagination["offset"],
+        pagination["size"],
+        user_filters=user_filters,
+        **kwargs,
+    )
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Iterable, Optional
+
+from owjcommon.enums import UserSet
+
+from app.config import settings
+from app.services.cache import TTLCache
+
+# (user id, business id) -> (business,) of the /user/me profile. Wallets are
+# read on every call, their balances change in any worker, and the user fields
+# and permissions come from the principal and permission caches
+_profile_cache = TTLCache(settings.cache.profile_size, settings.cache.profile_ttl)
+
+
+def invalidate_profiles(
+    user_ids: Iterable[int] = (), business_ids: Iterable[Optional[int]] = ()
+) -> None:
+    user_ids = set(user_ids)
+    business_ids = set(business_ids) - {None}
+    _profile_cache.pop_matching(
+        lambda key: key[0] in user_ids or key[1] in business_ids
+    )
+
+
+async def _get_wallets(user):
+    # imported here, the models invalidate profiles through this module
+    from app.models import Wallet as WalletModel
+    from app.schemas.finance import Wallet
+
+    wallet_fields = tuple(Wallet.model_fields)
+    if user.type in UserSet.BUSINESS.value:
+        wallets = WalletModel.filter(business_id=user.business_id)
+    else:
+        wallets = WalletModel.filter(user_id=user.id)
+    return [
+        Wallet.model_validate(wallet)
+        for wallet in await wallets.values(*wallet_fields)
+    ]
+
+
+async def _get_business(user):
+    from app.models import BusinessAccount as BusinessAccountModel
+    from app.schemas.business import BusinessAccount
+
+    if user.type not in UserSet.BUSINESS.value:
+        return (None,)
+    business = (
+        await BusinessAccountModel.filter(id=user.business_id)
+        .first()
+        .values(*BusinessAccount.model_fields)
+    )
+    return (BusinessAccount.model_validate(business) if business else None,)
+
+
+async def get_user_profile(user):
+    from app.schemas.user import UserAccountFull, UserAccountMe
+
+    key = (user.id, user.business_id)
+    cached = _profile_cache.get(key)
+    if cached is None:
+        wallets, permissions, cached = await asyncio.gather(
+            _get_wallets(user), user.get_permissions(), _get_business(user)
+        )
+        _profile_cache.set(key, cached)
+    else:
+        wallets, permissions = await asyncio.gather(
+            _get_wallets(user), user.get_permissions()
+        )
+
+    (business,) = cached
+    return UserAccountMe(
+        **{field: getattr(user, field) for field in UserAccountFull.model_fields},
+        wallets=wallets,
+        business=business,
+        permissions=permissions,
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import re
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# placeholder lists differ in length between calls of the same query
+_PLACEHOLDERS = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+
+
+class QueryStats:
+    """Queries run on behalf of one request or one query_budget block."""
+
+    __slots__ = ("count", "duration", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def add(self, query: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[_PLACEHOLDERS.sub("?", query)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+# set by QueryLogMiddleware, tasks started by the request share the same object
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+# open query_budget blocks, they count queries from any context
+_budgets: list[QueryStats] = []
+
+
+def get_request_query_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+def track_query(record) -> None:
+    # asyncpg query logger, scheduled with call_soon in the context of the caller
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(record.query, record.elapsed)
+    for budget in _budgets:
+        budget.add(record.query, record.elapsed)
+
+
+class QueryLogMiddleware:
+    """
+    Counts the queries and database time of every HTTP request and logs query
+    shapes that repeat within it, which usually means a lazy relation is
+    being loaded in a loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # let query loggers scheduled by the last query run first
+                await asyncio.sleep(0)
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (
+                        b"server-timing",
+                        f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} '
+                        f'queries"'.encode("latin-1"),
+                    )
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(
+                scope,
+                receive,
+                send_wrapper if settings.query_log.server_timing else send,
+            )
+        finally:
+            _request_stats.reset(token)
+            repeated = stats.repeated(settings.query_log.repeat_threshold)
+            if repeated:
+                logger.warning(
+                    "%s %s ran %d queries in %.1f ms, repeated: %s",
+                    scope["method"],
+                    scope["path"],
+                    stats.count,
+                    stats.duration * 1000,
+                    "; ".join(f"{count}x {shape}" for shape, count in repeated),
+                )
+
+
+@asynccontextmanager
+async def query_budget(max_queries: int):
+    """
+    Fails with AssertionError when the block runs more than `max_queries`
+    queries. Meant for tests against postgres:
+
+        async with query_budget(3):
+            await client.get("/api/account/v1/user/me", headers=headers)
+    """
+    stats = QueryStats()
+    _budgets.append(stats)
+    try:
+        yield stats
+        # query loggers run on the next loop iteration
+        await asyncio.sleep(0)
+    finally:
+        _budgets.remove(stats)
+    if stats.count > max_queries:
+        shapes = "\n".join(
+            f"  {count}x {shape}" for shape, count in stats.shapes.most_common()
+        )
+        raise AssertionError(
+            f"ran {stats.count} queries, budget is {max_queries}:\n{shapes}"
+        )
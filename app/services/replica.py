@@ -0,0 +1,114 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from tortoise import connections
+from tortoise.backends.base.client import BaseTransactionWrapper
+
+from app.config import settings
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+REPLICA = "replica"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# set by use_replica, each request runs in its own context
+_read_from_replica: ContextVar[bool] = ContextVar("read_from_replica", default=False)
+# Authorization headers of sessions that wrote recently
+_sticky_sessions = TTLCache(10000, settings.tortoise_orm.replica_sticky_seconds)
+_replica_state = {"checked_at": 0.0, "fresh": False, "lag": None}
+
+# seconds since the last replayed transaction, 0 when nothing is waiting to be replayed
+LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag"
+)
+
+
+def replica_enabled() -> bool:
+    return bool(settings.tortoise_orm.replica_db_connection)
+
+
+def get_replica_state() -> dict:
+    return {"enabled": replica_enabled(), **_replica_state}
+
+
+class ReplicaRouter:
+    """Reads of replica routed requests go to the replica, the rest to the primary."""
+
+    def db_for_read(self, model) -> Optional[str]:
+        if not _read_from_replica.get():
+            return None
+        # reads inside a transaction stay on its connection
+        if isinstance(
+            connections.get(model._meta.default_connection), BaseTransactionWrapper
+        ):
+            return None
+        return REPLICA
+
+    def db_for_write(self, model) -> Optional[str]:
+        return None
+
+
+async def _check_replica_lag() -> Optional[float]:
+    replica = connections.get(REPLICA)
+    if replica.capabilities.dialect != "postgres":
+        return 0.0
+    _, rows = await replica.execute_query(LAG_QUERY)
+    return float(rows[0]["lag"] or 0)
+
+
+async def _replica_is_fresh() -> bool:
+    now = time.monotonic()
+    interval = settings.tortoise_orm.replica_lag_check_interval
+    if now - _replica_state["checked_at"] < interval:
+        return _replica_state["fresh"]
+
+    # stamped before the query so concurrent requests do not all check
+    _replica_state["checked_at"] = now
+    try:
+        lag = await _check_replica_lag()
+    except Exception:
+        logger.exception("Replica lag check failed, reading from the primary")
+        lag = None
+    _replica_state["lag"] = lag
+    _replica_state["fresh"] = (
+        lag is not None and lag <= settings.tortoise_orm.replica_max_lag
+    )
+    return _replica_state["fresh"]
+
+
+async def use_replica(request: Request) -> None:
+    """
+    Route dependency for read only endpoints. Their reads go to the replica
+    unless the session wrote recently or the replica lags.
+    """
+    if not replica_enabled():
+        return
+    if _sticky_sessions.get(request.headers.get("authorization")):
+        return
+    if await _replica_is_fresh():
+        _read_from_replica.set(True)
+
+
+class ReadYourWritesMiddleware:
+    """Pins a session to the primary for a while after a successful write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                session = dict(scope["headers"]).get(b"authorization")
+                if session:
+                    _sticky_sessions.set(session.decode("latin-1"), True)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,19 +1,228 @@
+from decimal import Decimal
+
 from owjcommon.enums import CurrencyChoices, UserSet
 from app.models import Wallet as WalletModel
+from app.models import WalletTransaction as WalletTransactionModel
 from app.models.finance import IPG as IPGModel, IPGTransaction as IPGTransactionModel
-from app.schemas.finance import WalletTopOffRequest
+from app.enums import BatchPostingMode
+from app.schemas.finance import WalletTopOffRequest, WalletTransactionRequestByUserID
+from app.services.audit import audit_staging
 from app.services.ipg import get_ipg_client
+from app.services.profile import invalidate_profiles
 from owjcommon.exceptions import OWJException
+from tortoise import timezone
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+WALLET_NOT_FOUND = "E1000"
+# owjcommon error code for a debit that would go below the wallet limit
+INSUFFICIENT_BALANCE = "E1033"
 
 
 async def create_wallets(user_account, business=None):
-    for currency in CurrencyChoices:
-        wallet = await WalletModel.create(
-            user=user_account,
+    await create_wallets_for_users([user_account.pk], business=business)
+
+
+async def create_wallets_for_users(user_ids, business=None, batch_size=1000):
+    # one wallet per currency for every user, wallets that already exist are skipped
+    async with in_transaction("default") as connection:
+        existing = set(
+            await WalletModel.filter(user_id__in=user_ids)
+            .using_db(connection)
+            .values_list("user_id", "currency")
+        )
+        wallets = [
+            WalletModel(user_id=user_id, currency=currency, business=business)
+            for user_id in user_ids
+            for currency in CurrencyChoices
+            if (user_id, currency) not in existing
+        ]
+        # no ignore_conflicts, a row that still conflicts fails the whole batch
+        await WalletModel.bulk_create(
+            wallets, batch_size=batch_size, using_db=connection
+        )
+    invalidate_profiles(user_ids, [getattr(business, "id", None)])
+
+
+def _apply_balance_query(dialect: str, wallet_id: int, amount: Decimal):
+    debit = amount < 0
+    values = [amount, wallet_id, amount] if debit else [amount, wallet_id]
+    if dialect == "postgres":
+        params = [f"${i}" for i in range(1, len(values) + 1)]
+    else:
+        params = ["?"] * len(values)
+        values = [str(v) if isinstance(v, Decimal) else v for v in values]
+
+    query = (
+        f"UPDATE {WalletModel._meta.db_table} "
+        f"SET amount = amount + {params[0]}, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE id = {params[1]}"
+    )
+    if debit:
+        # debits may not take the balance below the negative of the wallet limit
+        query += f' AND amount + {params[2]} >= -"limit"'
+    return query + " RETURNING amount, user_id, business_id", values
+
+
+async def apply_wallet_balance(wallet_id: int, amount: Decimal, connection) -> dict:
+    query, values = _apply_balance_query(
+        connection.capabilities.dialect, wallet_id, amount
+    )
+    # execute_query drops the RETURNING rows of an UPDATE on asyncpg
+    rows = await connection.execute_query_dict(query, values)
+    if not rows:
+        # either the wallet does not exist or the debit is over its limit
+        if await WalletModel.filter(id=wallet_id).using_db(connection).exists():
+            raise OWJException(INSUFFICIENT_BALANCE)
+        raise OWJException(WALLET_NOT_FOUND)
+    return {
+        "balance": Decimal(str(rows[0]["amount"])),
+        "user_id": rows[0]["user_id"],
+        "business_id": rows[0]["business_id"],
+    }
+
+
+async def post_wallet_transaction(
+    wallet_id: int,
+    amount: Decimal,
+    currency: CurrencyChoices,
+    preformed_by_id: int,
+    note=None,
+    reference=None,
+) -> WalletTransactionModel:
+    # the balance change and its ledger row are written together, and the wallet
+    # row lock is only held between the UPDATE and the INSERT
+    async with in_transaction("default") as connection, audit_staging(connection):
+        wallet = await apply_wallet_balance(wallet_id, amount, connection)
+        transaction = await WalletTransactionModel.create(
+            wallet_id=wallet_id,
+            amount=amount,
             currency=currency,
-            business=business,
+            preformed_by_id=preformed_by_id,
+            note=note,
+            reference=reference,
+            balance=wallet["balance"],
+            using_db=connection,
         )
-        await wallet.save()
+    # after commit, so a concurrent /user/me cannot cache the old balance again
+    invalidate_profiles([wallet["user_id"]], [wallet["business_id"]])
+    return transaction
+
+
+async def _resolve_wallet_ids(items) -> list:
+    user_ids = set()
+    business_ids = set()
+    for item in items:
+        if isinstance(item, WalletTransactionRequestByUserID):
+            user_ids.add(item.user_id)
+        else:
+            business_ids.add(item.business_id)
+
+    wallets = (
+        await WalletModel.filter(
+            Q(user_id__in=user_ids) | Q(business_id__in=business_ids)
+        )
+        .order_by("-id")
+        .values("id", "user_id", "business_id", "currency")
+    )
+    by_user = {}
+    by_business = {}
+    for wallet in wallets:
+        by_user[(wallet["user_id"], wallet["currency"])] = wallet["id"]
+        if wallet["business_id"] is not None:
+            by_business[(wallet["business_id"], wallet["currency"])] = wallet["id"]
+
+    return [
+        by_user.get((item.user_id, item.currency))
+        if isinstance(item, WalletTransactionRequestByUserID)
+        else by_business.get((item.business_id, item.currency))
+        for item in items
+    ]
+
+
+async def post_wallet_transactions(
+    items, preformed_by_id: int, mode: BatchPostingMode
+) -> list[dict]:
+    wallet_ids = await _resolve_wallet_ids(items)
+    results = [
+        {
+            "index": index,
+            "posted": False,
+            "wallet_id": wallet_id,
+            "balance": None,
+            "reference": item.reference,
+            "error": None if wallet_id is not None else WALLET_NOT_FOUND,
+        }
+        for index, (item, wallet_id) in enumerate(zip(items, wallet_ids))
+    ]
+
+    async with in_transaction("default") as connection:
+        # lock in id order so concurrent batches touching the same wallets cannot deadlock
+        wallets = {
+            wallet.id: wallet
+            for wallet in await WalletModel.filter(
+                id__in={wallet_id for wallet_id in wallet_ids if wallet_id is not None}
+            )
+            .order_by("id")
+            .select_for_update()
+            .using_db(connection)
+        }
+
+        ledger = []
+        now = timezone.now()
+        for item, result in zip(items, results):
+            wallet = wallets.get(result["wallet_id"])
+            if wallet is None:
+                result["error"] = WALLET_NOT_FOUND
+                continue
+            balance = wallet.amount + item.amount
+            if item.amount < 0 and balance < -wallet.limit:
+                result["error"] = INSUFFICIENT_BALANCE
+                continue
+            wallet.amount = balance
+            wallet.updated_at = now
+            result["balance"] = balance
+            ledger.append(
+                (
+                    result,
+                    WalletTransactionModel(
+                        wallet_id=wallet.id,
+                        amount=item.amount,
+                        currency=item.currency,
+                        preformed_by_id=preformed_by_id,
+                        note=item.note,
+                        reference=item.reference,
+                        balance=balance,
+                    ),
+                )
+            )
+
+        failed = any(result["error"] for result in results)
+        if mode == BatchPostingMode.ALL_OR_NOTHING and failed:
+            for result in results:
+                result["balance"] = None
+            return results
+
+        if ledger:
+            await WalletTransactionModel.bulk_create(
+                [transaction for _, transaction in ledger], using_db=connection
+            )
+            await WalletModel.bulk_update(
+                [
+                    wallets[wallet_id]
+                    for wallet_id in {transaction.wallet_id for _, transaction in ledger}
+                ],
+                fields=["amount", "updated_at"],
+                using_db=connection,
+            )
+            for result, _ in ledger:
+                result["posted"] = True
+
+    posted = [wallets[transaction.wallet_id] for _, transaction in ledger]
+    invalidate_profiles(
+        [wallet.user_id for wallet in posted], [wallet.business_id for wallet in posted]
+    )
+    return results
 
 
 async def wallet_topoff(current_user, requested_for_user, request: WalletTopOffRequest):
@@ -59,7 +268,7 @@ async def wallet_topoff(current_user, requested_for_user, request: WalletTopOffR
         wallet=wallet,
     )
 
-    transaction = ipg_client.pay(
+    transaction = await ipg_client.pay(
         amount=request.amount,
         currency=request.currency,
         phone_number=current_user.phone_number,
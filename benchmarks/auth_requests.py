@@ -0,0 +1,88 @@
+"""
+Sends authenticated requests and counts the queries each one runs.
+
+    python -m benchmarks.auth_requests                  1000 GET /wallet/me
+    python -m benchmarks.auth_requests --requests 5000
+    python -m benchmarks.auth_requests --db-url postgres://localhost/auth_bench
+
+Before the principal cache every authenticated request loaded its user with
+a SELECT. The "no principal cache" variant restores that. Queries are
+counted from Tortoise's query log, so on SQLite as well. --db-url names a
+database the run creates and drops.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from .common import (
+    close_db,
+    count_queries,
+    create_fixtures,
+    init_db,
+    percentile,
+)
+
+URL = "/api/account/v1/wallet/me"
+
+
+async def run_variant(name: str, client, headers: dict, counter, args) -> bool:
+    latencies = []
+    queries = counter.count
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        request_started = time.perf_counter()
+        response = await client.get(URL, headers=headers)
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code != 200:
+            print(f"{name}: {response.status_code} {response.text}")
+            return False
+    elapsed = time.perf_counter() - started
+
+    print(name)
+    print(f"  {args.requests / elapsed:.0f} requests/s")
+    print(f"  p50 {percentile(latencies, 0.5) * 1000:.2f} ms")
+    print(f"  queries per request: {(counter.count - queries) / args.requests:.2f}")
+    return True
+
+
+async def run(args) -> bool:
+    from app.main import app
+    from app.services.auth import utils
+
+    counter = count_queries()
+    await init_db(args.db_url)
+    try:
+        user, _, _ = await create_fixtures()
+        token = (await user.create_access_token()).access_token
+        headers = {"Authorization": f"Bearer {token}"}
+        cached_principal = utils.get_cached_principal
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            # every request loads the user, as before the cache
+            utils.get_cached_principal = lambda sub, jti: None
+            ok = await run_variant(
+                "no principal cache (before)", client, headers, counter, args
+            )
+            utils.get_cached_principal = cached_principal
+            ok &= await run_variant(
+                "principal cache (after)", client, headers, counter, args
+            )
+        return ok
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.auth_requests")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
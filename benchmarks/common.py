@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+from decimal import Decimal
+
+import httpx
+from owjcommon.enums import CurrencyChoices
+from tortoise import Tortoise
+
+from app.enums import IPGType, TransactionStatus
+
+
+async def init_db(db_url: str) -> None:
+    # the database is created here and dropped by close_db, an existing one
+    # fails the run instead of being written to
+    await Tortoise.init(
+        db_url=db_url, modules={"models": ["app.models"]}, _create_db=True
+    )
+    await Tortoise.generate_schemas()
+
+
+async def close_db() -> None:
+    await Tortoise._drop_databases()
+
+
+async def create_fixtures(ipg_type: IPGType = IPGType.SEP) -> tuple:
+    from app.models import IPG, UserAccount, Wallet
+
+    user = await UserAccount.create(phone_number="+989120000000")
+    wallet = await Wallet.create(user=user, currency=CurrencyChoices.IRR)
+    ipg = await IPG.create(
+        name=ipg_type.value.lower(),
+        type=ipg_type,
+        callback_url="http://localhost:8000/api/account/v1/ipg/callback",
+        url="http://gateway.invalid",
+    )
+    return user, wallet, ipg
+
+
+async def create_transactions(user, wallet, ipg, count: int, **kwargs) -> list:
+    from app.models import IPGTransaction
+
+    transactions = [
+        IPGTransaction(
+            user=user,
+            ipg=ipg,
+            wallet=wallet,
+            type="TOP_UP",
+            amount=Decimal("10000"),
+            status=TransactionStatus.PENDING,
+            token=f"token-{index}",
+            **kwargs,
+        )
+        for index in range(count)
+    ]
+    await IPGTransaction.bulk_create(transactions, batch_size=1000)
+    return await IPGTransaction.all().order_by("id")
+
+
+async def create_wallet_transactions(user, wallet, count: int) -> None:
+    from app.models import WalletTransaction
+
+    await WalletTransaction.bulk_create(
+        [
+            WalletTransaction(
+                wallet=wallet,
+                amount=Decimal("10000"),
+                currency=CurrencyChoices.IRR,
+                preformed_by=user,
+                note=f"top up {index}",
+                reference=f"ref-{index}",
+                balance=Decimal("10000") * (index + 1),
+            )
+            for index in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+class FakeGateway:
+    """
+    Stands in for an IPG client, shared with the tests. Every inquiry takes
+    `latency` seconds and pops the next of `answers`, a status or an exception
+    to raise, the last answer repeating. Without answers it picks one of
+    `statuses`, and a `failure_rate` share of inquiries fail instead.
+    """
+
+    answers: list = []
+    statuses = (TransactionStatus.SUCCESS,)
+    latency = 0.0
+    failure_rate = 0.0
+    # transaction ids, once per inquiry
+    inquiries: list = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    @classmethod
+    def reset(
+        cls,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        statuses: tuple = (TransactionStatus.SUCCESS,),
+    ) -> None:
+        cls.answers = []
+        cls.latency = latency
+        cls.failure_rate = failure_rate
+        cls.statuses = statuses
+        cls.inquiries = []
+
+    def _answer(self):
+        answers = FakeGateway.answers
+        if answers:
+            return answers.pop(0) if len(answers) > 1 else answers[0]
+        if random.random() < FakeGateway.failure_rate:
+            return httpx.ConnectError("gateway unavailable")
+        return random.choice(FakeGateway.statuses)
+
+    async def inquire(self, transaction):
+        FakeGateway.inquiries.append(transaction.id)
+        if FakeGateway.latency:
+            await asyncio.sleep(FakeGateway.latency)
+        answer = self._answer()
+        if isinstance(answer, Exception):
+            raise answer
+        transaction.status = answer
+        if answer == TransactionStatus.SUCCESS:
+            transaction.card_number = "6037-99**-****-1234"
+            transaction.shaparak_reference_id = f"rrn-{transaction.id}"
+
+
+def use_fake_gateway(
+    latency: float,
+    failure_rate: float = 0.0,
+    statuses: tuple = (TransactionStatus.SUCCESS,),
+) -> type:
+    from app.services.ipg import verification
+
+    FakeGateway.reset(latency, failure_rate, statuses)
+    verification.get_ipg_client = lambda type: FakeGateway
+    return FakeGateway
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def ticker(lags: list, stop: asyncio.Event, interval: float = 0.01) -> None:
+    """Records how late the event loop wakes a sleeper, until `stop` is set."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+class QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def count_queries() -> QueryCounter:
+    """Counts queries from Tortoise's query log, on every backend."""
+    counter = QueryCounter()
+    db_log = logging.getLogger("tortoise.db_client")
+    db_log.setLevel(logging.DEBUG)
+    db_log.addHandler(counter)
+    db_log.propagate = False
+    return counter
@@ -0,0 +1,68 @@
+"""
+Compares the worker boot import with and without the IPG clients.
+
+    python -m benchmarks.import_time                  median of 15 imports each
+    python -m benchmarks.import_time --runs 50
+
+The eager variant also imports the SEP and NextPay clients, and the httpx
+stack behind them, which is what app.main imported before get_ipg_client
+loaded them on first use. Each import runs in a fresh interpreter through
+app.importtime. Exits non-zero when app.main pulls the clients in again.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+from app.importtime import measure
+
+CLIENTS = ("app.services.ipg.sep", "app.services.ipg.nextpay")
+
+
+def import_ms(module: str) -> tuple[float, float]:
+    """The whole import, and the part of it spent on the IPG clients."""
+    rows = measure(module)
+    total = sum(cumulative for _, cumulative, _, depth in rows if depth == 0)
+    clients = sum(cumulative for _, cumulative, name, _ in rows if name in CLIENTS)
+    return total / 1000, clients / 1000
+
+
+def loads_clients() -> bool:
+    check = f"import app.main, sys; print(any(m in sys.modules for m in {CLIENTS}))"
+    result = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip() == "True"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time")
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+
+    variants = {
+        "app.main, clients imported eagerly": ", ".join(("app.main",) + CLIENTS),
+        "app.main, clients imported lazily": "app.main",
+    }
+    timings = {name: [] for name in variants}
+    clients = []
+    # a warm-up, then the variants alternate so drift hits both alike
+    import_ms("app.main")
+    for _ in range(args.runs):
+        for name, module in variants.items():
+            total, client_ms = import_ms(module)
+            timings[name].append(total)
+            if client_ms:
+                clients.append(client_ms)
+    for name, values in timings.items():
+        median = statistics.median(values)
+        print(f"{name}: median {median:.1f} ms, min {min(values):.1f} ms")
+    # the totals are noisy, the clients' own share is measured directly
+    print(f"IPG clients and httpx: median {statistics.median(clients):.1f} ms")
+    if loads_clients():
+        print("app.main imports the IPG clients")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Replays one SEP callback many times through the ASGI app and checks the
+transaction is verified and credited once. Half of the duplicates arrive at
+once, the other half after the first half was answered.
+
+    python -m benchmarks.ipg_callbacks                     1000 duplicates on SQLite
+    python -m benchmarks.ipg_callbacks --db-url postgres://localhost/callbacks_bench
+
+The gateway is replaced by a fake that answers SUCCESS after --gateway-latency
+seconds. Exits non-zero when the gateway was asked more than once or the wallet
+got more than one ledger row. --db-url names a database the run creates and
+drops.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from .common import (
+    close_db,
+    create_fixtures,
+    create_transactions,
+    init_db,
+    percentile,
+    use_fake_gateway,
+)
+
+CALLBACK_URL = "/api/account/v1/ipg/callback/sep"
+
+
+async def replay(args) -> bool:
+    from app.enums import TransactionStatus
+    from app.main import app
+    from app.models import WalletTransaction
+    from app.services.ipg.callbacks import get_callback_stats
+
+    await init_db(args.db_url)
+    try:
+        gateway = use_fake_gateway(args.gateway_latency)
+        user, wallet, ipg = await create_fixtures()
+        (transaction,) = await create_transactions(user, wallet, ipg, 1)
+        payload = {
+            "ResNum": str(transaction.id),
+            "Token": transaction.token,
+            "RefNum": "ref-1",
+            "TraceNo": "trace-1",
+            "Rrn": "rrn-1",
+            "SecurePan": "6037-99**-****-1234",
+            "State": "OK",
+            "Status": "2",
+        }
+
+        latencies = []
+
+        async def callback(client):
+            started = time.perf_counter()
+            response = await client.post(CALLBACK_URL, data=payload)
+            latencies.append(time.perf_counter() - started)
+            return response.status_code
+
+        # the app's lifespan is not run, so verification happens inline
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            started = time.perf_counter()
+            codes = []
+            for wave in (args.duplicates // 2, args.duplicates - args.duplicates // 2):
+                codes += await asyncio.gather(*(callback(client) for _ in range(wave)))
+            elapsed = time.perf_counter() - started
+
+        await transaction.refresh_from_db()
+        ledger_rows = await WalletTransaction.filter(wallet_id=wallet.id).count()
+        inquiries = gateway.inquiries.count(transaction.id)
+
+        print(f"{args.duplicates} callbacks in {elapsed:.2f}s")
+        print(f"  p50 {percentile(latencies, 0.5) * 1000:.1f} ms")
+        print(f"  p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+        print(f"  responses: {sorted(set(codes))}")
+        print(f"  final status: {transaction.status.value}")
+        print(f"  gateway inquiries: {inquiries}")
+        print(f"  ledger rows: {ledger_rows}")
+        print(f"  callback stats: {get_callback_stats()}")
+        return (
+            inquiries == 1
+            and ledger_rows == 1
+            and transaction.status == TransactionStatus.SUCCESS
+        )
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ipg_callbacks")
+    parser.add_argument("--duplicates", type=int, default=1000)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--gateway-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not asyncio.run(replay(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
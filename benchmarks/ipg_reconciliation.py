@@ -0,0 +1,127 @@
+"""
+Sweeps stale PENDING IPG transactions and reports throughput.
+
+    python -m benchmarks.ipg_reconciliation                  2000 stale rows on SQLite
+    python -m benchmarks.ipg_reconciliation --concurrency 64
+    python -m benchmarks.ipg_reconciliation --sweepers 4 \
+        --db-url postgres://localhost/sweep_bench
+
+The gateway is replaced by a fake that answers after --gateway-latency seconds
+with SUCCESS, FAILED or CANCELED, and fails --failure-rate of the calls.
+Several --sweepers run at once like sweepers in separate processes, which
+SKIP LOCKED keeps apart on PostgreSQL. A row put back to PENDING by one of
+them may be swept again by another. Exits non-zero when a stale row is not
+swept, any other row is swept twice, a successful row is not credited exactly
+once, a fresh row is touched or a row is left VERIFYING. --db-url names a
+database the run creates and drops.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from tortoise import timezone
+
+from app.config import settings
+
+from .common import (
+    close_db,
+    create_fixtures,
+    create_transactions,
+    init_db,
+    use_fake_gateway,
+)
+
+
+async def run(args) -> bool:
+    from app.enums import TransactionStatus
+    from app.models import IPGTransaction, Wallet, WalletTransaction
+    from app.services.ipg.reconciliation import ReconciliationSweeper
+
+    settings.ipg.sweep_batch_size = args.batch_size
+    settings.ipg.sweep_concurrency = args.concurrency
+
+    await init_db(args.db_url)
+    try:
+        use_fake_gateway(
+            args.gateway_latency,
+            args.failure_rate,
+            (
+                TransactionStatus.SUCCESS,
+                TransactionStatus.FAILED,
+                TransactionStatus.FAILED,
+                TransactionStatus.CANCELED,
+            ),
+        )
+        user, wallet, ipg = await create_fixtures()
+        stale = await create_transactions(user, wallet, ipg, args.rows)
+        stale_at = timezone.now() - timedelta(
+            seconds=settings.ipg.sweep_pending_after + 60
+        )
+        await IPGTransaction.all().update(created_at=stale_at)
+        fresh = await create_transactions(user, wallet, ipg, args.fresh)
+        fresh = fresh[len(stale) :]
+
+        sweepers = [ReconciliationSweeper() for _ in range(args.sweepers)]
+        started = time.perf_counter()
+        swept = await asyncio.gather(*(sweeper.sweep() for sweeper in sweepers))
+        elapsed = time.perf_counter() - started
+
+        by_status: dict = {}
+        for sweeper in sweepers:
+            for status, count in sweeper.stats["by_status"].items():
+                by_status[status] = by_status.get(status, 0) + count
+        errors = sum(sweeper.stats["errors"] for sweeper in sweepers)
+        statuses = {}
+        for status in TransactionStatus:
+            count = await IPGTransaction.filter(status=status).count()
+            if count:
+                statuses[status.value] = count
+        credited = statuses.get(TransactionStatus.SUCCESS.value, 0)
+        ledger_rows = await WalletTransaction.filter(wallet_id=wallet.id).count()
+        balance = (await Wallet.get(id=wallet.id)).amount
+        fresh_touched = await IPGTransaction.filter(
+            id__in=[transaction.id for transaction in fresh]
+        ).exclude(status=TransactionStatus.PENDING).count()
+
+        print(f"{args.rows} stale rows, {args.sweepers} sweeper(s)")
+        print(f"  swept {sum(swept)} in {elapsed:.2f}s ({sum(swept) / elapsed:.0f}/s)")
+        print(f"  per sweeper: {swept}, {sum(swept) - args.rows} swept again")
+        print(f"  lag: {sweepers[0].stats['lag_seconds']:.0f}s")
+        print(f"  by status: {by_status}, gateway errors: {errors}")
+        print(f"  rows now: {statuses}")
+        print(f"  credited: {credited}, ledger rows: {ledger_rows}")
+        print(f"  fresh rows touched: {fresh_touched} of {len(fresh)}")
+        return (
+            args.rows <= sum(swept) <= args.rows + errors
+            and ledger_rows == credited
+            and balance == Decimal("10000") * credited
+            and fresh_touched == 0
+            and TransactionStatus.VERIFYING.value not in statuses
+        )
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ipg_reconciliation")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--fresh", type=int, default=100)
+    parser.add_argument("--sweepers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--gateway-latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # gateway errors are logged as warnings
+    logging.basicConfig(level=logging.ERROR)
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
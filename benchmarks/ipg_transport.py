@@ -0,0 +1,118 @@
+"""
+Compares gateway calls made with blocking requests.post against the pooled
+httpx transport, from inside the event loop like a request handler.
+
+    python -m benchmarks.ipg_transport                  200 calls, 50 at a time
+    python -m benchmarks.ipg_transport --latency 0.2
+
+A local HTTP server stands in for the gateway and answers SEP's token call
+after --latency seconds. A ticker on the event loop measures how long other
+requests would wait: with requests.post the loop is stuck for every round
+trip. The server counts the TCP connections each variant opens.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .common import percentile, ticker
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    # keep-alive, so pooled connections are reused
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(GatewayHandler.latency)
+        body = json.dumps({"token": "t-1"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+async def run_variant(name: str, call, args, server) -> None:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    lags: list = []
+    stop = asyncio.Event()
+    connections = server.connections
+
+    async def limited():
+        async with semaphore:
+            await call()
+
+    tick = asyncio.ensure_future(ticker(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    print(f"{name}")
+    print(f"  {args.calls} calls in {elapsed:.2f}s ({args.calls / elapsed:.0f}/s)")
+    print(
+        f"  event loop lag p50 {percentile(lags, 0.5) * 1000:.0f} ms, "
+        f"max {max(lags) * 1000:.0f} ms"
+    )
+    print(f"  connections opened: {server.connections - connections}")
+
+
+async def run(args, url: str, server) -> None:
+    import requests
+
+    from app.services.ipg.sep import SepClient
+    from app.services.ipg.transport import close_http_clients
+
+    data = {"action": "token", "TerminalId": "1", "Amount": 10000, "ResNum": "1"}
+    client = SepClient("1", None, None, None, url + "/callback", url, "IRR")
+
+    async def blocking():
+        # what the clients did before, inside an async handler
+        requests.post(url=url + SepClient.TOKEN_URL, data=data).json()
+
+    async def pooled():
+        (await client.post(SepClient.TOKEN_URL, data=data)).json()
+
+    try:
+        await run_variant("requests.post (before)", blocking, args, server)
+        await run_variant("pooled httpx.AsyncClient (after)", pooled, args, server)
+    finally:
+        await close_http_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ipg_transport")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    GatewayHandler.latency = args.latency
+    server = GatewayServer(("127.0.0.1", 0), GatewayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        asyncio.run(run(args, url, server))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Measures how fast SEP callbacks are acknowledged and their transactions verified.
+
+    python -m benchmarks.ipg_verification                  500 callbacks, 8 workers
+    python -m benchmarks.ipg_verification --workers 32
+    python -m benchmarks.ipg_verification --inline         verify inside the callback
+
+The gateway is replaced by a fake that answers SUCCESS after --gateway-latency
+seconds and fails --failure-rate of the calls. Exits non-zero when a
+transaction is left unsettled or a wallet is not credited exactly once per
+transaction. --db-url names a database the run creates and drops.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from decimal import Decimal
+
+import httpx
+
+from app.config import settings
+
+from .common import (
+    close_db,
+    create_fixtures,
+    create_transactions,
+    init_db,
+    percentile,
+    use_fake_gateway,
+)
+
+CALLBACK_URL = "/api/account/v1/ipg/callback/sep"
+
+
+async def run(args) -> bool:
+    from app.enums import TransactionStatus
+    from app.main import app
+    from app.models import IPGTransaction, Wallet, WalletTransaction
+    from app.services.ipg.verification import verification_worker
+
+    settings.ipg.verify_workers = args.workers
+    settings.ipg.verify_retry_base = args.retry_base
+    settings.ipg.verify_max_attempts = args.max_attempts
+
+    await init_db(args.db_url)
+    if not args.inline:
+        verification_worker.start()
+    try:
+        gateway = use_fake_gateway(args.gateway_latency, args.failure_rate)
+        user, wallet, ipg = await create_fixtures()
+        transactions = await create_transactions(user, wallet, ipg, args.callbacks)
+
+        latencies = []
+
+        async def callback(client, transaction):
+            started = time.perf_counter()
+            await client.post(
+                CALLBACK_URL,
+                data={
+                    "ResNum": str(transaction.id),
+                    "Token": transaction.token,
+                    "RefNum": f"ref-{transaction.id}",
+                    "Status": "2",
+                },
+            )
+            latencies.append(time.perf_counter() - started)
+
+        # inline verify errors become 500 responses, the row stays VERIFYING
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(callback(client, t) for t in transactions))
+            acknowledged = time.perf_counter() - started
+
+            # rows that ran out of attempts would wait verify_stuck_after for recovery
+            while await IPGTransaction.filter(
+                status=TransactionStatus.VERIFYING
+            ).exists():
+                if not verification_worker.get_stats()["pending"]:
+                    break
+                await asyncio.sleep(0.05)
+            settled = time.perf_counter() - started
+
+        unsettled = await IPGTransaction.filter(
+            status=TransactionStatus.VERIFYING
+        ).count()
+        credited = await IPGTransaction.filter(status=TransactionStatus.SUCCESS).count()
+        ledger_rows = await WalletTransaction.filter(wallet_id=wallet.id).count()
+        balance = (await Wallet.get(id=wallet.id)).amount
+        attempts = len(gateway.inquiries)
+
+        mode = "inline" if args.inline else f"{args.workers} workers"
+        print(f"{args.callbacks} callbacks, {mode}")
+        print(f"  acknowledged in {acknowledged:.2f}s")
+        print(f"  callback p50 {percentile(latencies, 0.5) * 1000:.0f} ms")
+        print(f"  callback p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+        print(f"  settled in {settled:.2f}s ({args.callbacks / settled:.0f}/s)")
+        print(f"  gateway calls: {attempts}, {attempts - args.callbacks} retries")
+        print(f"  credited: {credited}, ledger rows: {ledger_rows}")
+        print(f"  unsettled: {unsettled}")
+        if not args.inline:
+            print(f"  worker stats: {verification_worker.get_stats()}")
+        # inline failures are left VERIFYING for the worker's recovery
+        return (
+            ledger_rows == credited
+            and balance == Decimal("10000") * credited
+            and (args.inline or unsettled == 0)
+        )
+    finally:
+        await verification_worker.stop()
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.ipg_verification")
+    parser.add_argument("--callbacks", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--inline", action="store_true")
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--gateway-latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--retry-base", type=float, default=0.1)
+    parser.add_argument("--max-attempts", type=int, default=10)
+    args = parser.parse_args()
+
+    # retried gateway errors are logged as warnings, only give-ups are shown
+    logging.basicConfig(level=logging.ERROR)
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Times a cursor listing page read as model instances and as projected rows.
+
+    python -m benchmarks.list_projection                  500 rows, 100 requests
+    python -m benchmarks.list_projection --db-url postgres://localhost/list_bench
+
+Each request reads one page of wallet transactions with get_listing_results
+and renders it with the route's TrustedResponse. The "hydrated" variant is
+what the listings did before they passed fields=: every row became a model
+instance, with its audit state. Peak memory of one request is measured
+with tracemalloc, outside the timed runs. Exits non-zero when the two
+bodies hold different JSON. --db-url names a database the run creates and
+drops.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+
+from app.enums import PaginationMode
+
+from .common import close_db, create_fixtures, create_wallet_transactions, init_db
+
+CURSOR = {"mode": PaginationMode.CURSOR, "cursor": None, "count_total": False}
+
+
+async def timed(name: str, request, args) -> bytes:
+    timings = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        body = await request()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+
+    tracemalloc.start()
+    await request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(name)
+    print(f"  median {median * 1000:.1f} ms per request")
+    print(f"  {args.rows / median:.0f} rows/s")
+    print(f"  peak {peak / 2**20:.2f} MiB")
+    return body
+
+
+async def run(args) -> bool:
+    from app.models import WalletTransaction
+    from app.routes.wallet_transactions import (
+        wallet_transaction_fields,
+        wallet_transactions_response,
+    )
+    from app.services.pagination import get_listing_results
+
+    await init_db(args.db_url)
+    try:
+        user, wallet, _ = await create_fixtures()
+        await create_wallet_transactions(user, wallet, args.rows)
+
+        async def request(fields) -> bytes:
+            page = await get_listing_results(
+                WalletTransaction,
+                {"offset": 0, "size": args.rows},
+                CURSOR,
+                system_filters={"wallet__user_id": user.id},
+                fields=fields,
+            )
+            return wallet_transactions_response(page).body
+
+        print(f"{args.rows} wallet transactions per page, {args.requests} requests")
+        hydrated = await timed("model instances (before)", lambda: request(None), args)
+        projected = await timed(
+            "projected rows (after)",
+            lambda: request(wallet_transaction_fields),
+            args,
+        )
+        return json.loads(hydrated) == json.loads(projected)
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.list_projection")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Times rendering one listing page the way FastAPI did and with TrustedResponse.
+
+    python -m benchmarks.list_serialization                  500 rows, 200 renders
+    python -m benchmarks.list_serialization --rows 100
+
+The rows are read once, as wallet transaction model instances, and only
+the rendering is timed. The "before" variant is what the listing routes
+did: return the page and let FastAPI validate it against the
+response_model, run jsonable_encoder over the result and render it with
+JSONResponse. Exits non-zero when the two bodies hold different JSON.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.enums import PaginationMode
+
+from .common import close_db, create_fixtures, create_wallet_transactions, init_db
+
+
+async def timed(name: str, render, renders: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(renders):
+        started = time.perf_counter()
+        body = await render()
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"  {name}: median {median * 1000:.2f} ms per page")
+    return median, body
+
+
+async def run(args) -> bool:
+    from app.models import WalletTransaction
+    from app.routes.wallet_transactions import wallet_transactions_response
+    from app.schemas import WalletTransactionsResponse
+    from app.services.pagination import get_listing_results
+
+    await init_db(args.db_url)
+    try:
+        user, wallet, _ = await create_fixtures()
+        await create_wallet_transactions(user, wallet, args.rows)
+        page = await get_listing_results(
+            WalletTransaction,
+            {"offset": 0, "size": args.rows},
+            {"mode": PaginationMode.CURSOR, "cursor": None, "count_total": False},
+        )
+    finally:
+        await close_db()
+
+    field = create_response_field(
+        name="WalletTransactionsResponse",
+        type_=WalletTransactionsResponse,
+        mode="serialization",
+    )
+
+    async def before() -> bytes:
+        content = await serialize_response(field=field, response_content=page)
+        return JSONResponse(content).body
+
+    async def after() -> bytes:
+        return wallet_transactions_response(page).body
+
+    print(f"{args.rows} wallet transactions, {args.renders} renders")
+    old, old_body = await timed(
+        "response_model and JSONResponse (before)", before, args.renders
+    )
+    new, new_body = await timed("TrustedResponse (after)", after, args.renders)
+    print(f"  speed-up {old / new:.1f}x")
+    return json.loads(old_body) == json.loads(new_body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.list_serialization")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--renders", type=int, default=200)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Times OTP checks and secret decryption with and without the cached cipher
+and TOTP objects.
+
+    python -m benchmarks.otp_crypto                  20000 calls each
+    python -m benchmarks.otp_crypto --calls 100000
+
+The "before" variants are the code as it was: a Fernet built from the key
+on every call, the token base64 encoded a second time, and a TOTP built
+after decrypting the secret on every check. Exits non-zero when a variant
+gives a different answer.
+"""
+import argparse
+import asyncio
+import base64
+import time
+
+from cryptography.fernet import Fernet
+from pyotp import TOTP, random_base32
+
+
+async def decrypt_before(encrypted_string: str) -> str:
+    from app.config import settings
+
+    cipher_suite = Fernet(settings.encryption_key)
+    encrypted_secret_bytes = base64.urlsafe_b64decode(encrypted_string)
+    return cipher_suite.decrypt(encrypted_secret_bytes).decode("utf-8")
+
+
+async def check_otp_before(encrypted_hash: str, code: str) -> bool:
+    from app.config import settings
+
+    otp_hash = await decrypt_before(encrypted_hash)
+    totp = TOTP(s=otp_hash, digits=settings.otp.digits, interval=settings.otp.interval)
+    return totp.verify(code)
+
+
+async def timed(name: str, call, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    elapsed = time.perf_counter() - started
+    print(f"  {name}: {elapsed / calls * 1e6:.1f} us per call")
+    return elapsed
+
+
+async def run(args) -> bool:
+    # the models import app.services.auth, in the order the app loads them
+    import app.models  # noqa: F401
+    from app.config import settings
+    from app.services.auth import check_otp, get_otp
+    from app.services.auth.encrypt import decrypt, encrypt
+
+    secret = random_base32()
+    old_value = base64.urlsafe_b64encode(
+        Fernet(settings.encryption_key).encrypt(secret.encode("utf-8"))
+    ).decode("utf-8")
+    new_value = encrypt(secret)
+    code = await get_otp(new_value)
+
+    ok = await decrypt_before(old_value) == await decrypt(new_value) == secret
+    ok &= await check_otp_before(old_value, code) and await check_otp(new_value, code)
+
+    print(f"decrypt, {args.calls} calls")
+    before = await timed(
+        "Fernet per call (before)", lambda: decrypt_before(old_value), args.calls
+    )
+    after = await timed(
+        "cached MultiFernet (after)", lambda: decrypt(new_value), args.calls
+    )
+    print(f"  speed-up {before / after:.1f}x")
+
+    print(f"check_otp, {args.calls} calls")
+    before = await timed(
+        "decrypt and TOTP per call (before)",
+        lambda: check_otp_before(old_value, code),
+        args.calls,
+    )
+    after = await timed(
+        "cached TOTP (after)", lambda: check_otp(new_value, code), args.calls
+    )
+    print(f"  speed-up {before / after:.1f}x")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.otp_crypto")
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Checks passwords concurrently, as a burst of logins would, and reports how
+the event loop keeps up.
+
+    python -m benchmarks.password_hashing                 64 checks
+    python -m benchmarks.password_hashing --checks 200
+
+Before, bcrypt ran inline in the async handlers, so every check stalled the
+loop for its whole duration. check_password now runs it on the KDF thread
+pool, password.hash_workers at a time. A burst over password.hash_max_pending
+is refused with KDFOverloadedError instead of queueing. A ticker on the loop
+measures how long other requests would wait. Exits non-zero when a check
+gives the wrong answer.
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+
+from .common import percentile, ticker
+
+
+async def check_inline(hashed_password: str, password: str) -> bool:
+    from app.services.auth.password import hmac_hash_password
+
+    # the check as it ran before, on the event loop
+    hmac_hash = await hmac_hash_password(password)
+    return bcrypt.checkpw(hmac_hash, hashed_password.encode("utf-8"))
+
+
+async def run_variant(name: str, check, hashed: str, args) -> bool:
+    from app.services.auth.password import KDFOverloadedError
+
+    lags: list = []
+    stop = asyncio.Event()
+
+    async def login():
+        try:
+            return await check(hashed, "secret")
+        except KDFOverloadedError:
+            return None
+
+    tick = asyncio.ensure_future(ticker(lags, stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(args.checks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    checked = [result for result in results if result is not None]
+    print(name)
+    print(f"  {len(checked)} checks in {elapsed:.2f}s ({len(checked) / elapsed:.0f}/s)")
+    print(f"  refused with 503: {results.count(None)}")
+    print(
+        f"  event loop lag p50 {percentile(lags, 0.5) * 1000:.0f} ms, "
+        f"max {max(lags) * 1000:.0f} ms"
+    )
+    return all(checked)
+
+
+async def run(args) -> bool:
+    # the models import app.services.auth, in the order the app loads them
+    import app.models  # noqa: F401
+    from app.config import settings
+    from app.services.auth.password import (
+        check_password,
+        get_kdf_stats,
+        hash_password,
+    )
+
+    hashed = await hash_password("secret")
+    print(
+        f"{settings.password.hash_workers} KDF workers, "
+        f"{settings.password.hash_max_pending} pending at most"
+    )
+    ok = await run_variant("inline bcrypt (before)", check_inline, hashed, args)
+    ok &= await run_variant("KDF thread pool (after)", check_password, hashed, args)
+    print(f"  KDF stats: {get_kdf_stats()}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.password_hashing")
+    parser.add_argument("--checks", type=int, default=64)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
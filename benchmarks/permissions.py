@@ -0,0 +1,84 @@
+"""
+Resolves a user's permissions repeatedly, as token issue and /user/me do.
+
+    python -m benchmarks.permissions                  5000 calls, 5 groups
+    python -m benchmarks.permissions --groups 20
+
+Before the permission cache every call read the user's groups and merged
+their grants. The "no cache" variant restores that. Between the variants,
+one of the user's groups is edited, which must reach the user, while an
+edit to a group the user is not in must leave the cached set alone. Exits
+non-zero when it does not.
+"""
+import argparse
+import asyncio
+import time
+
+from .common import close_db, count_queries, create_fixtures, init_db
+
+
+async def timed(name: str, user, counter, calls: int) -> None:
+    queries = counter.count
+    started = time.perf_counter()
+    for _ in range(calls):
+        await user.get_permissions()
+    elapsed = time.perf_counter() - started
+    print(name)
+    print(f"  {elapsed / calls * 1e6:.0f} us per call")
+    print(f"  queries per call: {(counter.count - queries) / calls:.2f}")
+
+
+async def run(args) -> bool:
+    from owjcommon.enums import UserPermission
+
+    from app.models import UserAccount, UserGroup, user as user_module
+    from app.services.auth.permissions import get_cached_permissions
+
+    counter = count_queries()
+    await init_db(args.db_url)
+    try:
+        user, _, _ = await create_fixtures()
+        other = await UserAccount.create(phone_number="+989120000001")
+        grants = [permission.value for permission in UserPermission]
+        groups = []
+        for index in range(args.groups):
+            group = await UserGroup.create(
+                name=f"group-{index}", permissions=grants[index :: args.groups]
+            )
+            await group.add_users([user.id])
+            groups.append(group)
+        unrelated = await UserGroup.create(name="unrelated", permissions=[])
+        await unrelated.add_users([other.id])
+
+        # every call reads the groups, as before the cache
+        user_module.get_cached_permissions = lambda user_id, user_type: None
+        await timed("no cache (before)", user, counter, args.calls)
+        user_module.get_cached_permissions = get_cached_permissions
+        await timed("cache (after)", user, counter, args.calls)
+
+        unrelated.permissions = grants
+        await unrelated.save()
+        kept = get_cached_permissions(user.id, user.type) is not None
+        groups[0].permissions = []
+        await groups[0].save()
+        revoked = grants[0] not in await user.get_permissions()
+        print(f"  unrelated group edit kept the cache: {kept}")
+        print(f"  own group edit reached the user: {revoked}")
+        return kept and revoked
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.permissions")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Times per-request query tracking and checks that an N+1 handler is reported.
+
+    python -m benchmarks.query_log --db-url postgres://localhost/query_log_bench
+    python -m benchmarks.query_log --db-url ... --queries 20000
+
+Tracking relies on asyncpg query loggers, so it needs PostgreSQL. Three
+measurements:
+
+- the query logger on its own, called with a logged query inside a
+  request, with query_log.enabled on and off;
+- the same single-row read run through QueryLogMiddleware with tracking on
+  and off, alternating over rounds. A database round trip dwarfs the
+  logger, so expect noise of the same size as the difference;
+- a request that loads a relation once per row, which must be logged.
+
+Exits non-zero when the reads are not all counted or the N+1 request is not
+logged. --db-url names a database the run creates and drops.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from asyncpg.connection import LoggedQuery
+from tortoise import Tortoise
+
+from .common import close_db, create_fixtures
+
+SCOPE = {"type": "http", "method": "GET", "path": "/bench", "headers": []}
+VARIANTS = {"query_log off": False, "query_log on": True}
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+class Warnings(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+async def init_app_db(db_url: str) -> None:
+    from app.config import _db_connection
+
+    # the app's own engine, whose pooled connections carry the query loggers
+    await Tortoise.init(
+        config={
+            "connections": {"default": _db_connection(db_url)},
+            "apps": {
+                "models": {"models": ["app.models"], "default_connection": "default"}
+            },
+        },
+        _create_db=True,
+    )
+    await Tortoise.generate_schemas()
+
+
+async def time_logger(args, settings) -> None:
+    from app.db import _log_query
+    from app.services.querylog import QueryLogMiddleware
+
+    record = LoggedQuery(
+        'SELECT "id" FROM "wallets" WHERE "user_id"=$1 LIMIT 1',
+        (1,),
+        None,
+        0.0005,
+        None,
+        None,
+        None,
+    )
+    timings = {}
+
+    async def handler(scope, receive, send):
+        started = time.perf_counter()
+        for _ in range(args.queries):
+            _log_query(record)
+        timings[name] = (time.perf_counter() - started) / args.queries
+
+    for name, enabled in VARIANTS.items():
+        settings.query_log.enabled = enabled
+        await QueryLogMiddleware(handler)(dict(SCOPE), receive, send)
+
+    print(f"query logger, {args.queries} calls")
+    for name, elapsed in timings.items():
+        print(f"  {name}: {elapsed * 1e6:.2f} us per query")
+
+
+async def time_queries(args, settings, user) -> bool:
+    from app.models import Wallet
+    from app.services.querylog import QueryLogMiddleware, get_request_query_stats
+
+    per_round = args.queries // args.rounds
+    counted = []
+
+    async def handler(scope, receive, send):
+        for _ in range(per_round):
+            await Wallet.filter(user_id=user.id).first()
+        # query loggers run on the next loop iteration
+        await asyncio.sleep(0)
+        if settings.query_log.enabled:
+            counted.append(get_request_query_stats().count)
+
+    middleware = QueryLogMiddleware(handler)
+    timings = {name: [] for name in VARIANTS}
+    for _ in range(args.rounds):
+        for name, enabled in VARIANTS.items():
+            settings.query_log.enabled = enabled
+            started = time.perf_counter()
+            await middleware(dict(SCOPE), receive, send)
+            timings[name].append((time.perf_counter() - started) / per_round)
+
+    print(f"single-row reads, {args.rounds} rounds of {per_round}")
+    for name, values in timings.items():
+        print(f"  {name}: median {statistics.median(values) * 1e6:.0f} us per query")
+    return counted == [per_round] * args.rounds
+
+
+async def check_n_plus_one(settings, wallet) -> bool:
+    from app.models import UserAccount
+    from app.services.querylog import QueryLogMiddleware
+
+    async def handler(scope, receive, send):
+        # a relation loaded once per row, repeat_threshold rows
+        for _ in range(settings.query_log.repeat_threshold):
+            await UserAccount.get(id=wallet.user_id)
+
+    log = logging.getLogger("app.services.querylog")
+    warnings = Warnings()
+    log.addHandler(warnings)
+    try:
+        await QueryLogMiddleware(handler)(dict(SCOPE), receive, send)
+    finally:
+        log.removeHandler(warnings)
+    print(f"N+1 request logged: {bool(warnings.messages)}")
+    return bool(warnings.messages)
+
+
+async def run(args) -> bool:
+    from app.config import settings
+
+    enabled = settings.query_log.enabled
+    threshold = settings.query_log.repeat_threshold
+    await init_app_db(args.db_url)
+    try:
+        user, wallet, _ = await create_fixtures()
+        # the timed runs repeat one shape on purpose, not worth a warning each
+        settings.query_log.repeat_threshold = args.queries + 1
+        await time_logger(args, settings)
+        ok = await time_queries(args, settings, user)
+        settings.query_log.enabled = True
+        settings.query_log.repeat_threshold = threshold
+        ok &= await check_n_plus_one(settings, wallet)
+        return ok
+    finally:
+        settings.query_log.enabled = enabled
+        settings.query_log.repeat_threshold = threshold
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.query_log")
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--db-url", required=True)
+    args = parser.parse_args()
+
+    if not args.db_url.startswith("postgres"):
+        parser.error("query tracking needs a postgres --db-url")
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
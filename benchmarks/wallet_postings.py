@@ -0,0 +1,105 @@
+"""
+Posts concurrently to one wallet and reports throughput and latency.
+
+    python -m benchmarks.wallet_postings                  100 postings on SQLite
+    python -m benchmarks.wallet_postings --locked         the old locking path
+    python -m benchmarks.wallet_postings \
+        --db-url "postgres://localhost/postings_bench?maxsize=20"
+
+Every posting contends for the same wallet row. The default path is
+post_wallet_transaction, a single balance UPDATE followed by the ledger
+INSERT. --locked runs what the posting endpoint did before it: SELECT ...
+FOR UPDATE, the ledger INSERT, then a save of every wallet column, with the
+row lock held across all three. Exits non-zero when the balance does not
+match the ledger. --db-url names a database the run creates and drops.
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+from owjcommon.enums import CurrencyChoices
+from tortoise.transactions import in_transaction
+
+from .common import close_db, create_fixtures, init_db, percentile
+
+AMOUNT = Decimal("100")
+
+
+async def post_locked(wallet_id: int, amount: Decimal, user_id: int) -> None:
+    from app.models import Wallet, WalletTransaction
+
+    async with in_transaction("default") as connection:
+        wallet = (
+            await Wallet.filter(id=wallet_id)
+            .select_for_update()
+            .using_db(connection)
+            .first()
+        )
+        await WalletTransaction.create(
+            wallet=wallet,
+            amount=amount,
+            currency=CurrencyChoices.IRR,
+            preformed_by_id=user_id,
+            balance=wallet.amount + amount,
+            using_db=connection,
+        )
+        wallet.amount = wallet.amount + amount
+        await wallet.save(using_db=connection)
+
+
+async def run(args) -> bool:
+    from app.models import Wallet, WalletTransaction
+    from app.services.wallet import post_wallet_transaction
+
+    await init_db(args.db_url)
+    try:
+        user, wallet, _ = await create_fixtures()
+
+        async def post() -> float:
+            started = time.perf_counter()
+            if args.locked:
+                await post_locked(wallet.id, AMOUNT, user.id)
+            else:
+                await post_wallet_transaction(
+                    wallet.id, AMOUNT, CurrencyChoices.IRR, user.id
+                )
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(post() for _ in range(args.postings)))
+        elapsed = time.perf_counter() - started
+
+        balance = (await Wallet.get(id=wallet.id)).amount
+        balances = sorted(
+            await WalletTransaction.filter(wallet_id=wallet.id).values_list(
+                "balance", flat=True
+            )
+        )
+        expected = [AMOUNT * (index + 1) for index in range(args.postings)]
+
+        path = "locked" if args.locked else "single UPDATE"
+        print(f"{args.postings} concurrent postings on one wallet, {path}")
+        print(f"  posted in {elapsed:.2f}s ({args.postings / elapsed:.0f}/s)")
+        print(f"  posting p50 {percentile(latencies, 0.5) * 1000:.0f} ms")
+        print(f"  posting p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+        print(f"  balance: {balance:.2f}, ledger rows: {len(balances)}")
+        # every ledger row carries the running balance after its own posting
+        return balance == AMOUNT * args.postings and balances == expected
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.wallet_postings")
+    parser.add_argument("--postings", type=int, default=100)
+    parser.add_argument("--locked", action="store_true")
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Times a worker's database startup with and without generate_schemas.
+
+    python -m benchmarks.worker_boot                  median of 20 boots each
+    python -m benchmarks.worker_boot --db-url postgres://localhost/boot_bench
+
+Before the migrate step every worker ran generate_schemas on boot, which
+sends the whole CREATE TABLE/INDEX IF NOT EXISTS script to a database that
+already has the schema. Both variants boot against the same migrated
+database, the variants alternate so drift hits both alike. --db-url names a
+database the run creates and drops, the default is a temporary SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from tortoise import Tortoise, connections
+from tortoise.utils import get_schema_sql
+
+from .common import close_db, init_db
+
+MODULES = {"models": ["app.models"]}
+
+
+async def boot(db_url: str, generate_schemas: bool) -> float:
+    started = time.perf_counter()
+    await Tortoise.init(db_url=db_url, modules=MODULES)
+    if generate_schemas:
+        await Tortoise.generate_schemas(safe=True)
+    # the first query opens the pool, as the first request would
+    await Tortoise.get_connection("default").execute_query("SELECT 1")
+    elapsed = time.perf_counter() - started
+    await Tortoise.close_connections()
+    return elapsed
+
+
+async def run(args, db_url: str) -> None:
+    # creates the database with the schema, as app.migrate would
+    await init_db(db_url)
+    schema = get_schema_sql(connections.get("default"), safe=True)
+    await Tortoise.close_connections()
+
+    variants = {
+        "generate_schemas on boot (before)": True,
+        "migrate step (after)": False,
+    }
+    timings = {name: [] for name in variants}
+    try:
+        await boot(db_url, True)
+        for _ in range(args.runs):
+            for name, generate_schemas in variants.items():
+                timings[name].append(await boot(db_url, generate_schemas))
+    finally:
+        await Tortoise.init(db_url=db_url, modules=MODULES)
+        await close_db()
+
+    print(f"DDL statements run by generate_schemas: {schema.count(';')}")
+    for name, values in timings.items():
+        print(
+            f"{name}: median {statistics.median(values) * 1000:.1f} ms, "
+            f"min {min(values) * 1000:.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.worker_boot")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--db-url")
+    args = parser.parse_args()
+
+    if args.db_url:
+        asyncio.run(run(args, args.db_url))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "boot_bench.sqlite3")
+        asyncio.run(run(args, f"sqlite://{path}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+-- migrate: no-transaction
+-- Indexes for the wallet, ledger, IPG and token lookups and listings.
+-- Names match the ones generated from Meta.indexes on the models.
+-- Built CONCURRENTLY so ledger and IPG writes go on during the build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_wallets_busines_949f81 ON public.wallets USING btree (business_id, currency);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_wallet_tran_wallet__0efa19 ON public.wallet_transactions USING btree (wallet_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_wallet_tran_created_28b827 ON public.wallet_transactions USING btree (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ipg_transac_ipg_id_55dfc5 ON public.ipg_transactions USING btree (ipg_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ipg_transac_status_4ccf0d ON public.ipg_transactions USING btree (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ipg_transac_created_8fdbdb ON public.ipg_transactions USING btree (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_tokens_user_id_d47a88 ON public.user_tokens USING btree (user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_tokens_expire_d1de25 ON public.user_tokens USING btree (expire);
@@ -0,0 +1,3 @@
+-- Failed gateway calls per IPG transaction, verification recovery stops at
+-- verify_max_failures. A constant default adds the column without a rewrite.
+ALTER TABLE ipg_transactions ADD COLUMN IF NOT EXISTS verify_failures INT NOT NULL DEFAULT 0;
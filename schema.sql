@@ -565,6 +565,41 @@ ALTER TABLE ONLY public.wallets
 CREATE INDEX idx_user_accoun_uuid_fec5eb ON public.user_account USING btree (uuid);
 
 
+--
+-- Name: idx_user_tokens_expire_d1de25; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_user_tokens_expire_d1de25 ON public.user_tokens USING btree (expire);
+
+
+--
+-- Name: idx_user_tokens_user_id_d47a88; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_user_tokens_user_id_d47a88 ON public.user_tokens USING btree (user_id);
+
+
+--
+-- Name: idx_wallet_tran_created_28b827; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_wallet_tran_created_28b827 ON public.wallet_transactions USING btree (created_at, id);
+
+
+--
+-- Name: idx_wallet_tran_wallet__0efa19; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_wallet_tran_wallet__0efa19 ON public.wallet_transactions USING btree (wallet_id, created_at, id);
+
+
+--
+-- Name: idx_wallets_busines_949f81; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_wallets_busines_949f81 ON public.wallets USING btree (business_id, currency);
+
+
 --
 -- Name: ipgtransaction ipgtransaction_ipg_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
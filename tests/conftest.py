@@ -0,0 +1,88 @@
+import os
+from decimal import Decimal
+
+import pytest
+from owjcommon.enums import CurrencyChoices
+from tortoise import Tortoise
+
+from app.enums import IPGType, TransactionStatus
+from app.models import IPG, IPGTransaction, UserAccount, Wallet
+from app.services.ipg import callbacks
+from benchmarks.common import FakeGateway
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# e.g. postgres://postgres@localhost:5432/account_test, created and dropped per test
+TEST_DB_URL = os.environ.get("TEST_DB_URL", "sqlite://:memory:")
+postgres_only = pytest.mark.skipif(
+    not TEST_DB_URL.startswith("postgres"), reason="needs row locks, set TEST_DB_URL"
+)
+
+
+@pytest.fixture
+async def db():
+    # select_for_update is a no-op on SQLite, its transactions are serialised instead
+    await Tortoise.init(
+        db_url=TEST_DB_URL, modules={"models": ["app.models"]}, _create_db=True
+    )
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise._drop_databases()
+
+
+@pytest.fixture(autouse=True)
+def reset_callbacks():
+    callbacks._finalised.clear()
+    callbacks._in_flight.clear()
+    for name in callbacks._callback_stats:
+        callbacks._callback_stats[name] = 0
+
+
+@pytest.fixture
+async def user(db):
+    return await UserAccount.create(phone_number="+989120000000")
+
+
+@pytest.fixture
+async def wallet(user):
+    return await Wallet.create(user=user, currency=CurrencyChoices.IRR)
+
+
+@pytest.fixture
+async def ipg(db):
+    return await IPG.create(
+        name="sep",
+        type=IPGType.SEP,
+        callback_url="https://account.owj.app/api/account/v1/ipg/callback/sep",
+        url="https://sep.shaparak.ir",
+    )
+
+
+@pytest.fixture
+def make_transaction(user, wallet, ipg):
+    async def make(**kwargs):
+        values = {
+            "user": user,
+            "ipg": ipg,
+            "wallet": wallet,
+            "type": "TOP_UP",
+            "amount": Decimal("10000"),
+            "status": TransactionStatus.PENDING,
+        }
+        values.update(kwargs)
+        return await IPGTransaction.create(**values)
+
+    return make
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    from app.services.ipg import verification
+
+    FakeGateway.reset()
+    monkeypatch.setattr(verification, "get_ipg_client", lambda type: FakeGateway)
+    return FakeGateway
@@ -0,0 +1,230 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.models import AuditLog, UserAccount, Wallet, WalletTransaction
+from app.services import audit
+from app.services.audit import AuditPolicy, AuditWriter, audit_staging
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def policies(monkeypatch):
+    # read from the models once, reset so a patched policy is picked up
+    monkeypatch.setattr(audit, "_audit_policies", None)
+
+    def use(model, policy: AuditPolicy) -> None:
+        monkeypatch.setattr(model, "audit_policy", policy, raising=False)
+        monkeypatch.setattr(audit, "_audit_policies", None)
+
+    return use
+
+
+async def wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+async def _entries(instance) -> list:
+    model = type(instance)
+    rows = await AuditLog.filter(
+        model_name__in=[model.__name__, model._meta.db_table],
+        model_pk=str(instance.pk),
+    ).order_by("timestamp")
+    return [(getattr(row.type, "value", row.type), set(row.changes)) for row in rows]
+
+
+async def test_changes_outside_include_are_dropped(wallet, policies):
+    policies(Wallet, AuditPolicy(include={"amount", "limit"}))
+
+    wallet.amount = Decimal("100")
+    await wallet.save()
+    # only updated_at changes, nothing included is left
+    await wallet.save()
+
+    assert (await _entries(wallet))[-1] == ("UPDATE", {"amount"})
+    assert len(await _entries(wallet)) == 2
+
+
+async def test_excluded_fields_are_dropped(user, policies):
+    created = await Wallet.create(user=user, currency="IRR")
+    policies(Wallet, AuditPolicy(exclude={"amount", "updated_at"}))
+
+    created.amount = Decimal("100")
+    await created.save()
+    created.limit = Decimal("50")
+    await created.save()
+
+    assert (await _entries(created))[1:] == [("UPDATE", {"limit"})]
+
+
+async def test_skip_create_keeps_later_updates(user, wallet):
+    ledger_row = await WalletTransaction.create(
+        wallet=wallet, preformed_by=user, amount=Decimal("100")
+    )
+    ledger_row.note = "corrected"
+    await ledger_row.save()
+
+    entries = await _entries(ledger_row)
+    assert [kind for kind, _ in entries] == ["UPDATE"]
+    assert "note" in entries[0][1]
+
+
+async def test_noisy_only_saves_are_skipped(user):
+    user.last_otp_sent = timezone.now()
+    await user.save()
+    user.first_name = "Sara"
+    await user.save()
+
+    entries = await _entries(user)
+    assert [kind for kind, _ in entries] == ["CREATE", "UPDATE"]
+    assert "first_name" in entries[1][1]
+
+
+async def test_noisy_saves_are_sampled(user, policies, monkeypatch):
+    monkeypatch.setattr(audit.random, "random", lambda: 0.2)
+    policies(
+        UserAccount,
+        AuditPolicy(noisy={"last_otp_sent", "updated_at"}, noisy_sample_rate=0.5),
+    )
+
+    user.last_otp_sent = timezone.now()
+    await user.save()
+
+    assert (await _entries(user))[-1] == ("UPDATE", {"last_otp_sent", "updated_at"})
+
+
+async def test_models_without_a_policy_are_audited_in_full(user):
+    wallet = await Wallet.create(user=user, currency="IRR")
+    fetched = await Wallet.get(id=wallet.id)
+    fetched.amount = Decimal("100")
+    await fetched.save()
+
+    entries = await _entries(wallet)
+    assert [kind for kind, _ in entries] == ["CREATE", "UPDATE"]
+    assert {"amount", "currency"} <= entries[0][1]
+    assert "amount" in entries[1][1]
+
+
+@pytest.fixture
+def audit_settings(monkeypatch):
+    monkeypatch.setattr(settings.audit, "buffered", True)
+    monkeypatch.setattr(settings.audit, "batch_size", 2)
+    monkeypatch.setattr(settings.audit, "flush_interval", 60.0)
+
+
+@pytest.fixture
+async def writer(db, audit_settings, monkeypatch):
+    writer = AuditWriter()
+    monkeypatch.setattr(audit, "audit_writer", writer)
+    writer.start()
+    yield writer
+    await writer.stop()
+
+
+@pytest.fixture
+def inserts(monkeypatch):
+    batches = []
+    insert = audit._insert
+
+    async def recording(entries, connection=None):
+        batches.append(len(entries))
+        await insert(entries, connection)
+
+    monkeypatch.setattr(audit, "_insert", recording)
+    return batches
+
+
+async def test_buffered_rows_are_inserted_in_batches(user, writer, inserts):
+    for index in range(5):
+        user.first_name = f"name-{index}"
+        await user.save()
+
+    # a full batch wakes the task at once, the flush interval is far away
+    await wait_until(lambda: writer.stats["flushed"] >= 4)
+    await writer.flush()
+
+    assert inserts == [2, 2, 1]
+    assert writer.stats["flushed"] == 5
+    assert len(await _entries(user)) == 6
+
+
+async def test_flush_runs_on_the_interval(user, writer, monkeypatch):
+    monkeypatch.setattr(settings.audit, "flush_interval", 0.01)
+    # the task is waiting out the old interval, woken to pick up the new one
+    writer._wake.set()
+    user.first_name = "Sara"
+    await user.save()
+
+    await wait_until(lambda: writer.stats["flushed"] == 1)
+
+    assert writer.get_stats()["flush_lag_seconds"] == 0.0
+    assert len(await _entries(user)) == 2
+
+
+async def test_rows_past_max_pending_are_dropped_and_counted(
+    user, writer, monkeypatch
+):
+    monkeypatch.setattr(settings.audit, "batch_size", 10)
+    monkeypatch.setattr(settings.audit, "max_pending", 3)
+    for index in range(5):
+        user.first_name = f"name-{index}"
+        await user.save()
+
+    assert writer.stats == {**writer.stats, "buffered": 3, "dropped": 2}
+    await writer.flush()
+    assert len(await _entries(user)) == 4
+
+
+async def test_failed_flush_keeps_rows_for_the_next_one(user, writer, monkeypatch):
+    insert = audit._insert
+
+    async def failing(entries, connection=None):
+        raise ConnectionError("database unavailable")
+
+    user.first_name = "Sara"
+    await user.save()
+    monkeypatch.setattr(audit, "_insert", failing)
+    await writer.flush()
+    monkeypatch.setattr(audit, "_insert", insert)
+    await writer.flush()
+
+    assert writer.stats["failed_flushes"] == 1
+    assert writer.stats["flushed"] == 1
+    assert len(await _entries(user)) == 2
+
+
+async def test_staged_rows_commit_with_their_transaction(user, writer, inserts):
+    async with in_transaction("default") as connection, audit_staging(connection):
+        for index in range(3):
+            user.first_name = f"name-{index}"
+            await user.save(using_db=connection)
+        # nothing is written before the block ends
+        assert inserts == []
+
+    # one insert on the transaction, the writer never sees them
+    assert inserts == [3]
+    assert writer.stats["buffered"] == 0
+    assert len(await _entries(user)) == 4
+
+
+async def test_staged_rows_roll_back_with_their_transaction(user, writer):
+    with pytest.raises(RuntimeError):
+        async with in_transaction("default") as connection, audit_staging(
+            connection
+        ):
+            user.first_name = "Sara"
+            await user.save(using_db=connection)
+            raise RuntimeError("rolled back")
+
+    await writer.flush()
+    assert writer.stats["buffered"] == 0
+    assert len(await _entries(user)) == 1
+    assert (await UserAccount.get(id=user.id)).first_name is None
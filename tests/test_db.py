@@ -0,0 +1,35 @@
+import asyncpg
+import pytest
+
+from app.db import DatabaseOverloadedError, InstrumentedPool, get_pool_stats
+
+from conftest import TEST_DB_URL, postgres_only
+
+pytestmark = pytest.mark.anyio
+
+
+@postgres_only
+async def test_pool_timeout_raises_a_database_error(db):
+    pool = await InstrumentedPool(
+        TEST_DB_URL,
+        min_size=1,
+        max_size=1,
+        max_queries=50000,
+        max_inactive_connection_lifetime=300.0,
+        setup=None,
+        init=None,
+        loop=None,
+        connection_class=asyncpg.Connection,
+        record_class=asyncpg.Record,
+    )
+    timeouts = get_pool_stats()["timeouts"]
+    try:
+        async with pool.acquire():
+            # the verification worker and the sweeper see this, not an HTTP error
+            with pytest.raises(DatabaseOverloadedError) as error:
+                await pool.acquire(timeout=0.01)
+    finally:
+        await pool.close()
+
+    assert error.value.retry_after >= 0
+    assert get_pool_stats()["timeouts"] == timeouts + 1
@@ -0,0 +1,210 @@
+import asyncio
+
+import pytest
+from owjcommon.exceptions import OWJException
+
+from app.enums import IPGType, TransactionStatus
+from app.models import IPGTransaction
+from app.services.ipg.callbacks import (
+    _in_flight,
+    get_callback_stats,
+    handle_callback,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def make_process(transaction, status=TransactionStatus.VERIFYING, wait=None):
+    calls = []
+
+    async def process():
+        calls.append(transaction.id)
+        if wait is not None:
+            await wait.wait()
+        await IPGTransaction.filter(pk=transaction.id).update(status=status)
+        return status
+
+    return process, calls
+
+
+async def test_processes_pending_transaction(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    process, calls = make_process(transaction)
+
+    status = await handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+
+    assert status == TransactionStatus.VERIFYING
+    assert calls == [transaction.id]
+    assert get_callback_stats()["processed"] == 1
+
+
+async def test_repeated_callback_is_answered_from_cache(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    process, calls = make_process(transaction)
+
+    await handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    # a row changed behind the cache's back shows the answer came from memory
+    await IPGTransaction.filter(pk=transaction.id).update(
+        status=TransactionStatus.PENDING
+    )
+    status = await handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+
+    assert status == TransactionStatus.VERIFYING
+    assert calls == [transaction.id]
+    assert get_callback_stats()["cached"] == 1
+
+
+async def test_settled_transaction_is_not_processed(make_transaction):
+    transaction = await make_transaction(token="t-1", status=TransactionStatus.SUCCESS)
+    process, calls = make_process(transaction)
+
+    status = await handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+
+    assert status == TransactionStatus.SUCCESS
+    assert calls == []
+
+
+async def test_open_statuses_let_process_run(make_transaction):
+    transaction = await make_transaction(
+        token="t-1", status=TransactionStatus.VERIFYING
+    )
+    process, calls = make_process(transaction)
+
+    await handle_callback(
+        IPGType.SEP,
+        transaction.id,
+        "t-1",
+        process,
+        open_statuses=(TransactionStatus.PENDING, TransactionStatus.VERIFYING),
+    )
+
+    assert calls == [transaction.id]
+
+
+async def test_concurrent_duplicates_are_coalesced(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    release = asyncio.Event()
+    process, calls = make_process(transaction, wait=release)
+
+    first = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    duplicates = [
+        asyncio.ensure_future(
+            handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+        )
+        for _ in range(10)
+    ]
+    await asyncio.sleep(0.01)
+    release.set()
+
+    statuses = await asyncio.gather(first, *duplicates)
+
+    assert statuses == [TransactionStatus.VERIFYING] * 11
+    assert calls == [transaction.id]
+    assert get_callback_stats()["coalesced"] == 10
+    assert not _in_flight
+
+
+async def test_same_token_of_another_transaction_is_not_coalesced(make_transaction):
+    first = await make_transaction(token="t-1")
+    second = await make_transaction(token="t-1")
+    release = asyncio.Event()
+    first_process, first_calls = make_process(first, wait=release)
+    second_process, second_calls = make_process(second, TransactionStatus.FAILED)
+
+    pending = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, first.id, "t-1", first_process)
+    )
+    await asyncio.sleep(0.01)
+    status = await handle_callback(IPGType.SEP, second.id, "t-1", second_process)
+    release.set()
+    await pending
+
+    assert status == TransactionStatus.FAILED
+    assert first_calls == [first.id]
+    assert second_calls == [second.id]
+
+
+async def test_duplicate_takes_over_when_first_caller_is_cancelled(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    release = asyncio.Event()
+    process, calls = make_process(transaction, wait=release)
+
+    first = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    duplicate = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await duplicate == TransactionStatus.VERIFYING
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert calls == [transaction.id, transaction.id]
+    assert not _in_flight
+
+
+async def test_cancelled_duplicate_leaves_first_caller_running(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    release = asyncio.Event()
+    process, calls = make_process(transaction, wait=release)
+
+    first = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    duplicate = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    duplicate.cancel()
+    release.set()
+
+    assert await first == TransactionStatus.VERIFYING
+    with pytest.raises(asyncio.CancelledError):
+        await duplicate
+    assert calls == [transaction.id]
+
+
+async def test_unknown_transaction_raises_e1025(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    process, calls = make_process(transaction)
+
+    with pytest.raises(OWJException) as error:
+        await handle_callback(IPGType.SEP, transaction.id, "other", process)
+
+    assert error.value.code == "E1025"
+    assert calls == []
+    assert not _in_flight
+    assert get_callback_stats()["cache_size"] == 0
+
+
+async def test_process_error_reaches_every_duplicate(make_transaction):
+    transaction = await make_transaction(token="t-1")
+    release = asyncio.Event()
+
+    async def process():
+        await release.wait()
+        raise RuntimeError("gateway down")
+
+    first = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    duplicate = asyncio.ensure_future(
+        handle_callback(IPGType.SEP, transaction.id, "t-1", process)
+    )
+    await asyncio.sleep(0.01)
+    release.set()
+
+    results = await asyncio.gather(first, duplicate, return_exceptions=True)
+
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert get_callback_stats()["cache_size"] == 0
@@ -0,0 +1,233 @@
+import asyncio
+from datetime import timedelta
+
+import httpx
+import pytest
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.enums import TransactionStatus
+from app.models import IPGTransaction, WalletTransaction
+from app.services.ipg.reconciliation import ReconciliationSweeper
+from app.services.ipg.verification import VerificationWorker, verify_transaction
+
+from conftest import postgres_only
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def make_stale(make_transaction):
+    stale = timezone.now() - timedelta(seconds=settings.ipg.sweep_pending_after + 60)
+
+    async def make(count: int = 1, created_at=stale, **kwargs) -> list:
+        transactions = [await make_transaction(**kwargs) for _ in range(count)]
+        await IPGTransaction.filter(
+            id__in=[transaction.id for transaction in transactions]
+        ).update(created_at=created_at)
+        return transactions
+
+    return make
+
+
+def cutoff():
+    return timezone.now() - timedelta(seconds=settings.ipg.sweep_pending_after)
+
+
+async def test_sweep_settles_stale_rows_only(make_stale, make_transaction, gateway):
+    gateway.answers = [TransactionStatus.FAILED]
+    stale = await make_stale(3)
+    fresh = await make_transaction()
+    sweeper = ReconciliationSweeper()
+
+    assert await sweeper.sweep() == 3
+
+    statuses = dict(await IPGTransaction.all().values_list("id", "status"))
+    assert [statuses[transaction.id] for transaction in stale] == [
+        TransactionStatus.FAILED
+    ] * 3
+    assert statuses[fresh.id] == TransactionStatus.PENDING
+    assert sweeper.stats["by_status"] == {"FAILED": 3}
+    assert sweeper.stats["lag_seconds"] > settings.ipg.sweep_pending_after
+
+
+async def test_claim_marks_rows_verifying(make_stale):
+    (transaction,) = await make_stale()
+    before = (await IPGTransaction.get(id=transaction.id)).updated_at
+
+    (claimed,) = await ReconciliationSweeper()._claim(cutoff(), None)
+
+    assert claimed.id == transaction.id
+    assert claimed.status == TransactionStatus.VERIFYING
+    stored = await IPGTransaction.get(id=transaction.id)
+    assert stored.status == TransactionStatus.VERIFYING
+    assert stored.updated_at >= before
+
+
+async def test_keyset_continues_after_the_last_claimed_row(make_stale, monkeypatch):
+    monkeypatch.setattr(settings.ipg, "sweep_batch_size", 2)
+    # rows with the same created_at are ordered by id
+    created_at = timezone.now() - timedelta(days=1)
+    transactions = await make_stale(5, created_at=created_at)
+    sweeper = ReconciliationSweeper()
+
+    first = await sweeper._claim(cutoff(), None)
+    second = await sweeper._claim(cutoff(), (first[-1].created_at, first[-1].id))
+    third = await sweeper._claim(cutoff(), (second[-1].created_at, second[-1].id))
+
+    ids = [transaction.id for transaction in transactions]
+    assert [t.id for t in first] == ids[:2]
+    assert [t.id for t in second] == ids[2:4]
+    assert [t.id for t in third] == ids[4:]
+
+
+async def test_unanswered_rows_go_back_to_pending_once_per_sweep(
+    make_stale, gateway, monkeypatch
+):
+    monkeypatch.setattr(settings.ipg, "sweep_batch_size", 2)
+    gateway.answers = [httpx.ConnectError("reset")]
+    transactions = await make_stale(5)
+    sweeper = ReconciliationSweeper()
+
+    # the keyset keeps rows put back to PENDING out of the rest of the sweep
+    assert await sweeper.sweep() == 5
+
+    assert sorted(gateway.inquiries) == sorted(t.id for t in transactions)
+    pending = await IPGTransaction.filter(status=TransactionStatus.PENDING).count()
+    assert pending == 5
+    assert sweeper.stats["errors"] == 5
+    assert sweeper.stats["by_status"] == {}
+
+
+async def test_failed_inquiry_does_not_keep_partial_answers(make_stale, monkeypatch):
+    from app.services.ipg import verification
+
+    class PartialGateway:
+        def __init__(self, **kwargs):
+            pass
+
+        async def inquire(self, transaction):
+            transaction.status = TransactionStatus.FAILED
+            transaction.card_number = "6037-99**-****-1234"
+            raise KeyError("RRN")
+
+    monkeypatch.setattr(verification, "get_ipg_client", lambda type: PartialGateway)
+    (transaction,) = await make_stale()
+
+    await ReconciliationSweeper().sweep()
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.PENDING
+    assert transaction.card_number is None
+    assert transaction.verify_failures == 1
+
+
+async def test_rows_whose_inquiry_keeps_failing_are_left_for_review(
+    make_stale, gateway, monkeypatch
+):
+    monkeypatch.setattr(settings.ipg, "verify_max_failures", 3)
+    # e.g. NextPay's verify on an answer without card_holder
+    gateway.answers = [KeyError("card_holder")]
+    (transaction,) = await make_stale()
+    sweeper = ReconciliationSweeper()
+
+    assert [await sweeper.sweep() for _ in range(4)] == [1, 1, 1, 0]
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.VERIFYING
+    assert transaction.verify_failures == 3
+    assert sweeper.stats["left_for_review"] == 1
+    # nor does verification recovery pick it up
+    stuck = timezone.now() + timedelta(seconds=settings.ipg.verify_stuck_after)
+    monkeypatch.setattr(timezone, "now", lambda: stuck)
+    worker = VerificationWorker()
+    worker.start()
+    try:
+        assert await worker.recover() == 0
+    finally:
+        await worker.stop()
+
+
+async def test_successful_rows_are_credited_once(make_stale, gateway, wallet):
+    gateway.answers = [TransactionStatus.SUCCESS]
+    transactions = await make_stale(3)
+    sweeper = ReconciliationSweeper()
+
+    assert await sweeper.sweep() == 3
+    assert await sweeper.sweep() == 0
+
+    assert await WalletTransaction.filter(wallet_id=wallet.id).count() == 3
+    settled = await IPGTransaction.filter(status=TransactionStatus.SUCCESS)
+    assert {t.id for t in settled} == {t.id for t in transactions}
+    assert all(t.shaparak_reference_id == f"rrn-{t.id}" for t in settled)
+    assert sweeper.stats["by_status"] == {"SUCCESS": 3}
+
+
+async def test_late_sep_callback_keeps_its_refnum(make_stale, monkeypatch):
+    from app.main import app
+    from app.routes import ipg as ipg_routes
+    from app.services.ipg import verification
+
+    (transaction,) = await make_stale(token="t-1")
+
+    async def queue(transaction_id):
+        # handed to the worker, which verifies once the sweep is done
+        return TransactionStatus.VERIFYING
+
+    monkeypatch.setattr(ipg_routes, "schedule_verification", queue)
+
+    class SepGateway:
+        def __init__(self, **kwargs):
+            pass
+
+        async def inquire(self, transaction):
+            if transaction.ipg_reference_id is None:
+                # the callback arrives while the sweeper asks the gateway
+                async with httpx.AsyncClient(app=app, base_url="http://test") as c:
+                    await c.post(
+                        "/api/account/v1/ipg/callback/sep",
+                        data={
+                            "ResNum": str(transaction.id),
+                            "Token": "t-1",
+                            "RefNum": "ref-1",
+                            "Status": "2",
+                        },
+                    )
+                # what SepClient answers without a RefNum
+                transaction.status = TransactionStatus.FAILED
+                return
+            transaction.status = TransactionStatus.SUCCESS
+
+    monkeypatch.setattr(verification, "get_ipg_client", lambda type: SepGateway)
+
+    await ReconciliationSweeper().sweep()
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.VERIFYING
+    assert transaction.ipg_reference_id == "ref-1"
+    assert await verify_transaction(transaction.id) == TransactionStatus.SUCCESS
+
+
+@postgres_only
+async def test_claim_skips_rows_locked_by_another_sweeper(make_stale):
+    transactions = await make_stale(3)
+    locked = transactions[0]
+    locked_event = asyncio.Event()
+
+    async def claim():
+        await locked_event.wait()
+        return await ReconciliationSweeper()._claim(cutoff(), None)
+
+    # started outside the transaction below, so it claims on its own connection
+    other_sweeper = asyncio.ensure_future(claim())
+    async with in_transaction("default") as connection:
+        await IPGTransaction.filter(id=locked.id).select_for_update().using_db(
+            connection
+        )
+        locked_event.set()
+        batch = await other_sweeper
+
+    assert [t.id for t in batch] == [t.id for t in transactions[1:]]
+    await locked.refresh_from_db()
+    assert locked.status == TransactionStatus.PENDING
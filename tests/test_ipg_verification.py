@@ -0,0 +1,296 @@
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+
+import httpx
+import pytest
+from tortoise import timezone
+
+from app.config import settings
+from app.enums import TransactionStatus
+from app.models import IPGTransaction, WalletTransaction
+from app.services.ipg import verification
+from app.services.ipg.verification import (
+    VerificationWorker,
+    schedule_verification,
+    verify_transaction,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings.ipg, "verify_retry_base", 0.001)
+    monkeypatch.setattr(settings.ipg, "verify_retry_max", 0.01)
+    monkeypatch.setattr(settings.ipg, "verify_max_attempts", 3)
+
+
+@pytest.fixture
+async def worker():
+    worker = VerificationWorker()
+    worker.start()
+    yield worker
+    await worker.stop()
+
+
+@pytest.fixture
+def credits(monkeypatch):
+    calls = []
+    post_wallet_transaction = verification.post_wallet_transaction
+
+    async def counting(*args, **kwargs):
+        calls.append(args)
+        return await post_wallet_transaction(*args, **kwargs)
+
+    monkeypatch.setattr(verification, "post_wallet_transaction", counting)
+    return calls
+
+
+def test_backoff_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(settings.ipg, "verify_retry_base", 1.0)
+    monkeypatch.setattr(settings.ipg, "verify_retry_max", 60.0)
+    monkeypatch.setattr(verification.random, "uniform", lambda low, high: high)
+    worker = VerificationWorker()
+
+    delays = [worker._backoff(attempt) for attempt in range(1, 9)]
+
+    assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]
+
+
+def test_backoff_jitter_stays_within_half(monkeypatch):
+    monkeypatch.setattr(settings.ipg, "verify_retry_base", 1.0)
+    monkeypatch.setattr(settings.ipg, "verify_retry_max", 60.0)
+    worker = VerificationWorker()
+
+    for attempt in range(1, 9):
+        ceiling = min(2 ** (attempt - 1), 60.0)
+        assert ceiling / 2 <= worker._backoff(attempt) <= ceiling
+
+
+async def test_failed_verification_is_retried(
+    make_transaction, gateway, fast_retries, worker, credits
+):
+    gateway.answers = [
+        httpx.ConnectError("reset"),
+        httpx.ConnectError("reset"),
+        TransactionStatus.SUCCESS,
+    ]
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    assert worker.submit(transaction.id)
+    await wait_until(lambda: worker.stats["verified"] == 1)
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.SUCCESS
+    assert worker.stats["retried"] == 2
+    assert gateway.inquiries == [transaction.id] * 3
+    assert len(credits) == 1
+    assert worker.get_stats()["pending"] == 0
+
+
+async def test_verification_gives_up_after_max_attempts(
+    make_transaction, gateway, fast_retries, worker, credits
+):
+    gateway.answers = [httpx.ConnectError("reset")]
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    worker.submit(transaction.id)
+    await wait_until(lambda: worker.stats["gave_up"] == 1)
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.VERIFYING
+    assert len(gateway.inquiries) == settings.ipg.verify_max_attempts
+    assert credits == []
+    # left for recovery, which may queue it again
+    assert worker.get_stats()["pending"] == 0
+    assert transaction.verify_failures == settings.ipg.verify_max_attempts
+
+
+async def test_answered_gateway_errors_are_not_retried(
+    make_transaction, gateway, fast_retries, worker, credits
+):
+    # the gateway may have verified the payment before answering with an error
+    gateway.answers = [KeyError("ResultCode"), TransactionStatus.SUCCESS]
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    worker.submit(transaction.id)
+    await wait_until(lambda: worker.stats["gave_up"] == 1)
+
+    await transaction.refresh_from_db()
+    assert transaction.status == TransactionStatus.VERIFYING
+    assert transaction.verify_failures == 1
+    assert gateway.inquiries == [transaction.id]
+    assert worker.stats["retried"] == 0
+    assert credits == []
+
+
+async def test_transaction_is_queued_once(make_transaction, monkeypatch, worker):
+    release = asyncio.Event()
+    verified = []
+
+    async def verify(transaction_id):
+        verified.append(transaction_id)
+        await release.wait()
+
+    monkeypatch.setattr(verification, "verify_transaction", verify)
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    assert worker.submit(transaction.id)
+    assert worker.submit(transaction.id)
+    await asyncio.sleep(0.01)
+    release.set()
+    await wait_until(lambda: worker.stats["verified"] == 1)
+
+    assert verified == [transaction.id]
+    assert worker.stats["queued"] == 1
+
+
+async def test_without_a_worker_verification_runs_inline(
+    make_transaction, gateway, credits
+):
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    status = await schedule_verification(transaction.id)
+
+    assert status == TransactionStatus.SUCCESS
+    assert len(credits) == 1
+
+
+async def test_recover_claims_stuck_rows_once(make_transaction, monkeypatch, worker):
+    release = asyncio.Event()
+
+    async def verify(transaction_id):
+        await release.wait()
+
+    monkeypatch.setattr(verification, "verify_transaction", verify)
+    stuck = await make_transaction(status=TransactionStatus.VERIFYING)
+    fresh = await make_transaction(status=TransactionStatus.VERIFYING)
+    pending = await make_transaction(status=TransactionStatus.PENDING)
+    stale = timezone.now() - timedelta(seconds=settings.ipg.verify_stuck_after + 60)
+    await IPGTransaction.filter(id__in=[stuck.id, pending.id]).update(
+        updated_at=stale
+    )
+
+    assert await worker.recover() == 1
+    # a worker in another process sees the bumped updated_at and skips the row
+    other = VerificationWorker()
+    other.start()
+    try:
+        assert await other.recover() == 0
+    finally:
+        await other.stop()
+    # and this one does not queue it twice
+    assert await worker.recover() == 0
+    assert worker._queued == {stuck.id}
+    assert worker.stats["recovered"] == 1
+    release.set()
+
+    await stuck.refresh_from_db()
+    assert stuck.updated_at > stale
+    await fresh.refresh_from_db()
+    assert fresh.status == TransactionStatus.VERIFYING
+
+
+async def test_recover_leaves_rows_that_failed_too_often(
+    make_transaction, monkeypatch, worker
+):
+    release = asyncio.Event()
+
+    async def verify(transaction_id):
+        await release.wait()
+
+    monkeypatch.setattr(settings.ipg, "verify_max_failures", 3)
+    monkeypatch.setattr(verification, "verify_transaction", verify)
+    failing = await make_transaction(status=TransactionStatus.VERIFYING)
+    exhausted = await make_transaction(status=TransactionStatus.VERIFYING)
+    stale = timezone.now() - timedelta(seconds=settings.ipg.verify_stuck_after + 60)
+    await IPGTransaction.filter(id=failing.id).update(
+        updated_at=stale, verify_failures=2
+    )
+    await IPGTransaction.filter(id=exhausted.id).update(
+        updated_at=stale, verify_failures=3
+    )
+
+    assert await worker.recover() == 1
+
+    # left VERIFYING for manual review
+    assert worker._queued == {failing.id}
+    release.set()
+
+
+async def test_concurrent_verifications_credit_once(
+    make_transaction, gateway, credits, wallet
+):
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    statuses = await asyncio.gather(
+        verify_transaction(transaction.id), verify_transaction(transaction.id)
+    )
+
+    assert statuses == [TransactionStatus.SUCCESS] * 2
+    # both asked the gateway, the locked re-check in settle_transaction credits once
+    assert gateway.inquiries == [transaction.id] * 2
+    assert len(credits) == 1
+    assert await WalletTransaction.filter(wallet_id=wallet.id).count() == 1
+    await wallet.refresh_from_db()
+    assert wallet.amount == Decimal("10000")
+
+
+async def test_repeated_verification_does_not_ask_the_gateway(
+    make_transaction, gateway, credits
+):
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    await verify_transaction(transaction.id)
+    status = await verify_transaction(transaction.id)
+
+    assert status == TransactionStatus.SUCCESS
+    assert gateway.inquiries == [transaction.id]
+    assert len(credits) == 1
+
+
+async def test_settle_copies_verified_fields(make_transaction, gateway):
+    transaction = await make_transaction(status=TransactionStatus.VERIFYING)
+
+    await verify_transaction(transaction.id)
+
+    await transaction.refresh_from_db()
+    assert transaction.card_number == "6037-99**-****-1234"
+    assert transaction.shaparak_reference_id == f"rrn-{transaction.id}"
+
+
+@pytest.mark.parametrize("result_code", [0, 2])
+async def test_sep_settles_an_already_verified_payment(
+    make_transaction, ipg, monkeypatch, result_code
+):
+    # 2 answers a verify repeated after the first answer was lost
+    answer = {
+        "ResultCode": result_code,
+        "TransactionDetail": {
+            "AffectiveAmount": 10000,
+            "MaskedPan": "6037-99**-****-1234",
+            "RRN": "rrn-1",
+        },
+    }
+
+    async def post(self, path, data=None, json=None, headers=None):
+        return httpx.Response(200, json=answer)
+
+    client = verification.get_gateway_client(ipg)
+    monkeypatch.setattr(type(client), "post", post)
+    transaction = await make_transaction(
+        status=TransactionStatus.VERIFYING, ipg_reference_id="ref-1"
+    )
+
+    await client.inquire(transaction)
+
+    assert transaction.status == TransactionStatus.SUCCESS
+    assert transaction.shaparak_reference_id == "rrn-1"
@@ -0,0 +1,54 @@
+import httpx
+import pytest
+
+from app.config import settings
+from app.main import app
+
+pytestmark = pytest.mark.anyio
+
+TOKEN = "scrape-token"
+
+
+@pytest.fixture
+def scrape_token(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_scrape_token", TOKEN)
+
+
+async def scrape(headers: dict) -> httpx.Response:
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        return await client.get("/metrics", headers=headers)
+
+
+async def test_metrics_answers_the_scrape_token(scrape_token):
+    response = await scrape({"Authorization": f"Bearer {TOKEN}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "app_subsystem_stat" in response.text
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [{}, {"Authorization": "Bearer wrong"}, {"Authorization": f"Basic {TOKEN}"}],
+)
+async def test_metrics_rejects_other_credentials(scrape_token, headers):
+    response = await scrape(headers)
+
+    assert response.status_code == 401
+    assert "app_subsystem_stat" not in response.text
+
+
+async def test_metrics_rejects_user_access_tokens(scrape_token, user):
+    token = (await user.create_access_token()).access_token
+
+    response = await scrape({"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 401
+
+
+async def test_metrics_is_off_without_a_scrape_token(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_scrape_token", None)
+
+    response = await scrape({"Authorization": f"Bearer {TOKEN}"})
+
+    assert response.status_code == 404
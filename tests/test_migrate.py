@@ -0,0 +1,112 @@
+import pytest
+from tortoise import Tortoise, connections
+
+from app import migrate
+from app.config import _db_connection
+from app.enums import IPGType
+from app.models import IPG, IPGTransaction, UserAccount
+
+from conftest import TEST_DB_URL, postgres_only
+
+pytestmark = [pytest.mark.anyio, postgres_only]
+
+INDEXES = [
+    migrate._CREATE_INDEX_CONCURRENTLY.match(statement).group(1)
+    for statement in migrate._statements(
+        (migrate.MIGRATIONS_DIR / "0001_hot_path_indexes.sql").read_text()
+    )
+]
+
+
+async def _indexes() -> dict:
+    _, rows = await connections.get("default").execute_query(
+        "SELECT relname, indisvalid FROM pg_index "
+        "JOIN pg_class ON pg_class.oid = indexrelid WHERE relname = ANY($1)",
+        [INDEXES],
+    )
+    return {row["relname"]: row["indisvalid"] for row in rows}
+
+
+@pytest.fixture
+async def existing_db(db, monkeypatch):
+    # tables from before the migrations, without their indexes and columns
+    for name in INDEXES:
+        await connections.get("default").execute_script(f"DROP INDEX {name}")
+    await connections.get("default").execute_script(
+        "ALTER TABLE ipg_transactions DROP COLUMN verify_failures"
+    )
+    monkeypatch.setattr(
+        migrate,
+        "TORTOISE_ORM",
+        {
+            "connections": {"default": _db_connection(TEST_DB_URL)},
+            "apps": {
+                "models": {"models": ["app.models"], "default_connection": "default"}
+            },
+        },
+    )
+
+
+async def _upgrade() -> None:
+    await migrate.upgrade()
+    # upgrade closes its connections, reopened so db drops the database
+    await Tortoise.init(db_url=TEST_DB_URL, modules={"models": ["app.models"]})
+
+
+async def test_schema_step_leaves_indexes_of_existing_tables_to_migrations(
+    existing_db, monkeypatch
+):
+    scripts = []
+
+    async def record(connection, script):
+        scripts.append(script)
+
+    monkeypatch.setattr(migrate, "_apply_without_transaction", record)
+
+    await _upgrade()
+
+    # a plain CREATE INDEX from the schema step would block writes
+    assert await _indexes() == {}
+    assert len(scripts) == 1
+
+
+async def test_index_migration_builds_concurrently(existing_db):
+    await _upgrade()
+
+    # CONCURRENTLY fails inside a transaction block, so this ran outside one
+    assert await _indexes() == dict.fromkeys(INDEXES, True)
+    _, rows = await connections.get("default").execute_query(
+        f"SELECT version FROM {migrate.MIGRATIONS_TABLE}"
+    )
+    assert sorted(row["version"] for row in rows) == [
+        path.stem for path in migrate.get_migration_files()
+    ]
+
+
+async def test_migration_adds_columns_to_existing_tables(existing_db):
+    await _upgrade()
+
+    transaction = await IPGTransaction.create(
+        user=await UserAccount.create(phone_number="+989120000000"),
+        ipg=await IPG.create(name="sep", type=IPGType.SEP, callback_url="", url=""),
+        type="TOP_UP",
+    )
+    assert transaction.verify_failures == 0
+
+
+async def test_invalid_index_from_a_failed_build_is_rebuilt(existing_db):
+    connection = connections.get("default")
+    name = INDEXES[0]
+    await connection.execute_script(
+        f"CREATE INDEX {name} ON wallets (business_id, currency)"
+    )
+    # what an interrupted CREATE INDEX CONCURRENTLY leaves behind
+    await connection.execute_query(
+        "UPDATE pg_index SET indisvalid = false "
+        "FROM pg_class WHERE pg_class.oid = indexrelid AND relname = $1",
+        [name],
+    )
+
+    await _upgrade()
+
+    assert (await _indexes())[name] is True
@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app import openapi
+from app.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+def test_committed_openapi_matches_the_routes():
+    # a fresh process imports app.main before Tortoise is initialised, like a
+    # worker does. The model schemas differ once the relations are set up
+    result = subprocess.run(
+        [sys.executable, "-m", "app.openapi", "check"],
+        cwd=Path(openapi.__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+async def test_precomputed_openapi_is_served_with_an_etag():
+    from app.main import app
+
+    assert settings.openapi_precomputed
+    body = openapi.OPENAPI_ARTEFACT.read_bytes()
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        plain = await client.get(app.openapi_url, headers={"Accept-Encoding": ""})
+        zipped = await client.get(app.openapi_url, headers={"Accept-Encoding": "gzip"})
+        cached = await client.get(
+            app.openapi_url, headers={"If-None-Match": plain.headers["ETag"]}
+        )
+
+    assert plain.content == body
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert json.loads(zipped.content) == json.loads(body)
+    assert cached.status_code == 304
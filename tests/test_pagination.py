@@ -0,0 +1,128 @@
+from decimal import Decimal
+
+import pytest
+from owjcommon.enums import CurrencyChoices
+
+from app.enums import TransactionStatus
+from app.models import IPGTransaction, UserAccount, Wallet, WalletTransaction
+from app.schemas.finance import IPGTransactionFilter, WalletTransactionFilter
+from app.services.pagination import get_cursor_results_with_filter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def ledger(user, wallet):
+    other = await UserAccount.create(phone_number="+989120000001")
+    other_wallet = await Wallet.create(user=other, currency=CurrencyChoices.IRR)
+    rows = {}
+    for name, owner_wallet, amount, note, reference in [
+        ("top_up", wallet, "100", "Top up", "ref-1"),
+        ("card_top_up", wallet, "250", "top up by card", "ref-2"),
+        ("refund", other_wallet, "250", "refund", "ref-1"),
+        ("no_note", other_wallet, "100", None, None),
+    ]:
+        rows[name] = await WalletTransaction.create(
+            wallet=owner_wallet,
+            preformed_by=user,
+            amount=Decimal(amount),
+            note=note,
+            reference=reference,
+        )
+    return rows
+
+
+async def _names(rows: dict, model=WalletTransaction, size: int = 2, **filters):
+    # pages through every result, so the keyset is exercised on each filter
+    schema = {
+        WalletTransaction: WalletTransactionFilter,
+        IPGTransaction: IPGTransactionFilter,
+    }[model]
+    user_filters = schema(**filters).dict(exclude_unset=True)
+    ids = []
+    cursor = None
+    while True:
+        page = await get_cursor_results_with_filter(
+            model, size, cursor, user_filters=user_filters
+        )
+        ids += [item.id for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(ids) == len(set(ids))
+    names = {row.id: name for name, row in rows.items()}
+    return {names[id] for id in ids}
+
+
+async def test_like_matches_text_case_insensitively(ledger):
+    assert await _names(ledger, note="top up", match_type="like") == {
+        "top_up",
+        "card_top_up",
+    }
+
+
+async def test_exact_matches_the_whole_value(ledger):
+    assert await _names(ledger, note="Top up", match_type="exact") == {"top_up"}
+    assert await _names(ledger, note="top up", match_type="exact") == set()
+
+
+async def test_negated_match_types_leave_out_null_values(ledger):
+    assert await _names(ledger, note="top up", match_type="not_like") == {"refund"}
+    assert await _names(ledger, note="Top up", match_type="not_exact") == {
+        "card_top_up",
+        "refund",
+    }
+
+
+async def test_like_compares_non_text_values_exactly(ledger):
+    assert await _names(ledger, amount=Decimal("250"), match_type="like") == {
+        "card_top_up",
+        "refund",
+    }
+    # a foreign key is filtered by its id
+    assert await _names(
+        ledger, wallet=ledger["refund"].wallet_id, match_type="like"
+    ) == {"refund", "no_note"}
+
+
+async def test_logical_op_joins_the_fields(ledger):
+    filters = {"amount": Decimal("250"), "reference": "ref-1", "match_type": "like"}
+
+    assert await _names(ledger, logical_op="and", **filters) == {"refund"}
+    assert await _names(ledger, logical_op="or", **filters) == {
+        "top_up",
+        "card_top_up",
+        "refund",
+    }
+
+
+async def test_like_compares_enum_values_exactly(make_transaction):
+    failed = await make_transaction(status=TransactionStatus.FAILED, type="TOP_UP")
+    await make_transaction(status=TransactionStatus.SUCCESS, type="top_up_card")
+    rows = {"failed": failed}
+
+    assert await _names(
+        rows, IPGTransaction, status=TransactionStatus.FAILED, match_type="like"
+    ) == {"failed"}
+
+
+async def test_pages_follow_each_other_without_gaps(ledger):
+    first = await get_cursor_results_with_filter(WalletTransaction, 3)
+    second = await get_cursor_results_with_filter(
+        WalletTransaction, 3, first["next_cursor"]
+    )
+
+    listed = [item.id for item in first["items"] + second["items"]]
+    newest_first = await WalletTransaction.all().order_by("-created_at", "-id")
+    assert listed == [row.id for row in newest_first]
+    assert second["next_cursor"] is None
+
+
+async def test_total_is_counted_only_on_request(ledger):
+    page = await get_cursor_results_with_filter(WalletTransaction, 3)
+    counted = await get_cursor_results_with_filter(
+        WalletTransaction, 3, count_total=True
+    )
+
+    assert page["total_pages"] is None
+    assert counted["total_pages"] == 2
@@ -0,0 +1,60 @@
+import pytest
+from owjcommon.enums import UserPermission
+
+from app.models import UserAccount, UserGroup
+from app.services.auth import permissions
+from app.services.auth.permissions import get_cached_permissions
+
+pytestmark = pytest.mark.anyio
+
+READ = UserPermission.WALLET_READ.value
+UPDATE = UserPermission.WALLET_UPDATE.value
+
+
+@pytest.fixture(autouse=True)
+def clear_permissions():
+    permissions._user_permissions.clear()
+
+
+@pytest.fixture
+async def members(db):
+    first = await UserAccount.create(phone_number="+989120000001")
+    second = await UserAccount.create(phone_number="+989120000002")
+    readers = await UserGroup.create(name="readers", permissions=[READ])
+    others = await UserGroup.create(name="others", permissions=[])
+    await readers.add_users([first.id])
+    await others.add_users([second.id])
+    return first, second, readers
+
+
+async def test_a_group_change_reaches_its_members_only(members):
+    first, second, readers = members
+    assert READ in await first.get_permissions()
+    await second.get_permissions()
+
+    readers.permissions = [READ, UPDATE]
+    await readers.save()
+
+    assert get_cached_permissions(first.id, first.type) is None
+    assert get_cached_permissions(second.id, second.type) is not None
+    assert UPDATE in await first.get_permissions()
+
+
+async def test_a_deleted_group_no_longer_grants(members):
+    first, second, readers = members
+    assert READ in await first.get_permissions()
+
+    await readers.delete()
+
+    assert READ not in await first.get_permissions()
+
+
+async def test_membership_changes_reach_the_user(members):
+    first, second, readers = members
+    assert READ not in await second.get_permissions()
+
+    await readers.add_users([second.id])
+    assert READ in await second.get_permissions()
+
+    await readers.remove_users([second.id])
+    assert READ not in await second.get_permissions()
@@ -0,0 +1,190 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from owjcommon.enums import CurrencyChoices
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from app.enums import TransactionStatus
+from app.models import (
+    IPG,
+    BusinessAccount,
+    IPGTransaction,
+    UserAccount,
+    UserToken,
+    Wallet,
+    WalletTransaction,
+)
+
+from conftest import postgres_only
+
+pytestmark = [pytest.mark.anyio, postgres_only]
+
+
+@pytest.fixture
+async def seeded(user, wallet, ipg):
+    business = await BusinessAccount.create(name="agency")
+    users = [
+        await UserAccount.create(phone_number=f"+98912100{index:04d}", business=business)
+        for index in range(20)
+    ]
+    wallets = [
+        Wallet(user=owner, business=business, currency=currency)
+        for owner in users
+        for currency in CurrencyChoices
+    ]
+    await Wallet.bulk_create(wallets)
+    wallets = await Wallet.all()
+    ipgs = [ipg] + [
+        await IPG.create(
+            name=f"sep-{index}", type=ipg.type, callback_url=ipg.callback_url, url=ipg.url
+        )
+        for index in range(19)
+    ]
+    now = timezone.now()
+    await WalletTransaction.bulk_create(
+        [
+            WalletTransaction(
+                wallet=wallets[index % len(wallets)],
+                preformed_by=user,
+                amount=Decimal("1"),
+                currency=CurrencyChoices.IRR,
+                balance=Decimal(index),
+                created_at=now - timedelta(minutes=index),
+            )
+            for index in range(2000)
+        ],
+        batch_size=500,
+    )
+    await IPGTransaction.bulk_create(
+        [
+            IPGTransaction(
+                user=user,
+                ipg=ipgs[index % len(ipgs)],
+                wallet=wallet,
+                type="TOP_UP",
+                amount=Decimal("1"),
+                status=list(TransactionStatus)[index % len(TransactionStatus)],
+                token=f"token-{index}",
+                created_at=now - timedelta(minutes=index),
+            )
+            for index in range(2000)
+        ],
+        batch_size=500,
+    )
+    await UserToken.bulk_create(
+        [
+            UserToken(
+                jti=f"00000000-0000-0000-0000-{index:012d}",
+                user=users[index % len(users)],
+                expire=now + timedelta(minutes=index),
+            )
+            for index in range(2000)
+        ],
+        batch_size=500,
+    )
+    async with in_transaction("default") as connection:
+        await connection.execute_script("ANALYZE")
+    return {"business": business, "user": users[0], "wallet": wallets[0], "ipg": ipg}
+
+
+def _scans(plan: dict) -> list:
+    nodes = [(plan["Node Type"], plan.get("Index Name") or plan.get("Relation Name"))]
+    for child in plan.get("Plans", []):
+        nodes += _scans(child)
+    return nodes
+
+
+async def _plan(query) -> list:
+    async with in_transaction("default") as connection:
+        # seq scans are priced out, so one only shows up when no index fits
+        await connection.execute_script("SET LOCAL enable_seqscan = off")
+        _, rows = await connection.execute_query(
+            f"EXPLAIN (FORMAT JSON) {query.sql()}"
+        )
+    plan = rows[0]["QUERY PLAN"]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return _scans(plan[0]["Plan"])
+
+
+def _queries(seeded) -> dict:
+    """Each route's query with the index it should be served by, None for any."""
+    now = timezone.now()
+    page = ("-created_at", "-id")
+    return {
+        "wallets by business and currency": (
+            Wallet.filter(
+                business_id=seeded["business"].id, currency=CurrencyChoices.IRR
+            ),
+            "idx_wallets_busines_949f81",
+        ),
+        "wallet ledger page": (
+            WalletTransaction.filter(wallet_id=seeded["wallet"].id)
+            .order_by(*page)
+            .limit(11),
+            "idx_wallet_tran_wallet__0efa19",
+        ),
+        "ledger page": (
+            WalletTransaction.all().order_by(*page).limit(11),
+            "idx_wallet_tran_created_28b827",
+        ),
+        "ledger page after cursor": (
+            WalletTransaction.filter(created_at__lt=now - timedelta(minutes=1000))
+            .order_by(*page)
+            .limit(11),
+            "idx_wallet_tran_created_28b827",
+        ),
+        "user ledger page": (
+            WalletTransaction.filter(wallet__user_id=seeded["user"].id)
+            .order_by(*page)
+            .limit(11),
+            None,
+        ),
+        "ipg transactions of a gateway": (
+            IPGTransaction.filter(ipg_id=seeded["ipg"].id).order_by(*page).limit(11),
+            "idx_ipg_transac_ipg_id_55dfc5",
+        ),
+        "ipg transactions page": (
+            IPGTransaction.all().order_by(*page).limit(11),
+            "idx_ipg_transac_created_8fdbdb",
+        ),
+        "ipg callback lookup": (
+            IPGTransaction.filter(id=1000, token="token-999"),
+            "ipg_transactions_pkey",
+        ),
+        "stale pending claim": (
+            IPGTransaction.filter(status=TransactionStatus.PENDING, created_at__lt=now)
+            .order_by("created_at", "id")
+            .limit(200),
+            "idx_ipg_transac_status_4ccf0d",
+        ),
+        "stuck verifying recovery": (
+            IPGTransaction.filter(
+                status=TransactionStatus.VERIFYING, updated_at__lt=now
+            ),
+            "idx_ipg_transac_status_4ccf0d",
+        ),
+        "tokens of a user": (
+            UserToken.filter(user_id=seeded["user"].id),
+            "idx_user_tokens_user_id_d47a88",
+        ),
+        "expired tokens": (
+            UserToken.filter(expire__lt=now),
+            "idx_user_tokens_expire_d1de25",
+        ),
+    }
+
+
+async def test_hot_queries_use_their_index(seeded):
+    wrong_plans = {}
+    for name, (query, index) in _queries(seeded).items():
+        scans = await _plan(query)
+        if any(node == "Seq Scan" for node, _ in scans) or (
+            index is not None and index not in {target for _, target in scans}
+        ):
+            wrong_plans[name] = scans
+
+    assert wrong_plans == {}
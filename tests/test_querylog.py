@@ -0,0 +1,65 @@
+import httpx
+import pytest
+from owjcommon.enums import CurrencyChoices
+from tortoise import Tortoise
+
+from app.config import _db_connection
+from app.main import app
+from app.models import UserAccount, Wallet
+from app.services.querylog import query_budget
+
+from conftest import TEST_DB_URL, postgres_only
+
+pytestmark = [pytest.mark.anyio, postgres_only]
+
+WALLETS_URL = "/api/account/v1/wallet/me"
+
+
+@pytest.fixture
+async def app_db():
+    # the app's own engine, whose pooled connections carry the query loggers
+    await Tortoise.init(
+        config={
+            "connections": {"default": _db_connection(TEST_DB_URL)},
+            "apps": {
+                "models": {"models": ["app.models"], "default_connection": "default"}
+            },
+        },
+        _create_db=True,
+    )
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise._drop_databases()
+
+
+@pytest.fixture
+async def headers(app_db):
+    user = await UserAccount.create(phone_number="+989120000000")
+    for currency in CurrencyChoices:
+        await Wallet.create(user=user, currency=currency)
+    token = (await user.create_access_token()).access_token
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def test_wallet_listing_stays_within_its_query_budget(headers):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        # loads the user, then reads every wallet in one query
+        async with query_budget(2):
+            response = await client.get(WALLETS_URL, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == len(CurrencyChoices)
+
+        # the principal cache leaves the wallet read only
+        async with query_budget(1) as stats:
+            response = await client.get(WALLETS_URL, headers=headers)
+        assert response.status_code == 200
+        assert stats.count == 1
+
+
+async def test_query_budget_fails_with_the_query_shapes(headers):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        with pytest.raises(AssertionError, match="budget is 0") as error:
+            async with query_budget(0):
+                await client.get(WALLETS_URL, headers=headers)
+
+    assert 'FROM "wallets"' in str(error.value)
@@ -0,0 +1,48 @@
+import base64
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.config import settings
+from app.models import UserAccount
+from app.rotate_keys import rotate_otp_secrets
+from app.services.auth import encrypt, get_otp
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def new_key(monkeypatch):
+    old_key = settings.encryption_key
+    monkeypatch.setattr(settings, "encryption_key", Fernet.generate_key())
+    monkeypatch.setattr(settings, "previous_encryption_keys", [old_key])
+    encrypt.get_cipher.cache_clear()
+    yield old_key
+    encrypt.get_cipher.cache_clear()
+
+
+async def test_secrets_are_rewritten_under_the_current_key(db, new_key):
+    secret = "JBSWY3DPEHPK3PXP"
+    old = Fernet(new_key).encrypt(secret.encode())
+    users = [
+        await UserAccount.create(phone_number="+989120000001", otp_hash=old.decode()),
+        # stored base64 encoded twice, as before
+        await UserAccount.create(
+            phone_number="+989120000002",
+            otp_hash=base64.urlsafe_b64encode(old).decode(),
+        ),
+        await UserAccount.create(
+            phone_number="+989120000003", otp_hash=encrypt.encrypt(secret)
+        ),
+    ]
+    code = await get_otp(users[0].otp_hash)
+
+    assert await rotate_otp_secrets(batch_size=2, dry_run=True) == 2
+    assert await rotate_otp_secrets(batch_size=2) == 2
+    assert await rotate_otp_secrets(batch_size=2) == 0
+
+    current = Fernet(settings.encryption_key)
+    for user in users:
+        await user.refresh_from_db()
+        assert current.decrypt(user.otp_hash.encode()).decode() == secret
+        assert await user.check_otp(code)
@@ -0,0 +1,222 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from owjcommon.enums import CurrencyChoices
+from owjcommon.exceptions import OWJException
+
+from app.enums import BatchPostingMode
+from app.models import BusinessAccount, UserAccount, Wallet, WalletTransaction
+from app.schemas.finance import (
+    WalletTransactionRequestByBusinessID,
+    WalletTransactionRequestByUserID,
+)
+from app.services.wallet import (
+    INSUFFICIENT_BALANCE,
+    WALLET_NOT_FOUND,
+    create_wallets_for_users,
+    post_wallet_transaction,
+    post_wallet_transactions,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_credit_returns_the_new_balance(user, wallet):
+    first = await post_wallet_transaction(
+        wallet.id, Decimal("100"), CurrencyChoices.IRR, user.id
+    )
+    second = await post_wallet_transaction(
+        wallet.id, Decimal("-30"), CurrencyChoices.IRR, user.id
+    )
+
+    assert first.balance == Decimal("100")
+    assert second.balance == Decimal("70")
+    await wallet.refresh_from_db()
+    assert wallet.amount == Decimal("70")
+
+
+async def test_debit_over_the_limit_is_refused(user, wallet):
+    with pytest.raises(OWJException) as error:
+        await post_wallet_transaction(
+            wallet.id, Decimal("-1"), CurrencyChoices.IRR, user.id
+        )
+
+    assert error.value.code == INSUFFICIENT_BALANCE
+    assert await WalletTransaction.filter(wallet_id=wallet.id).count() == 0
+
+
+async def test_concurrent_debits_cannot_overdraw(user, wallet):
+    await Wallet.filter(id=wallet.id).update(
+        amount=Decimal("100"), limit=Decimal("20")
+    )
+
+    async def debit():
+        try:
+            return await post_wallet_transaction(
+                wallet.id, Decimal("-30"), CurrencyChoices.IRR, user.id
+            )
+        except OWJException as error:
+            return error.code
+
+    # each debit's balance check and update is one statement on the row
+    results = await asyncio.gather(*(debit() for _ in range(10)))
+
+    posted = [result.balance for result in results if not isinstance(result, str)]
+    assert sorted(posted) == [Decimal(value) for value in ("-20", "10", "40", "70")]
+    assert results.count(INSUFFICIENT_BALANCE) == 6
+    await wallet.refresh_from_db()
+    assert wallet.amount == Decimal("-20")
+    assert len(await _ledger(wallet)) == 4
+
+
+async def test_missing_wallet_is_reported(user, wallet):
+    with pytest.raises(OWJException) as error:
+        await post_wallet_transaction(
+            wallet.id + 1, Decimal("100"), CurrencyChoices.IRR, user.id
+        )
+
+    assert error.value.code == WALLET_NOT_FOUND
+
+
+def _item(amount, user_id=None, business_id=None, **kwargs):
+    # debits are built without validation, the request schema only takes credits
+    schema = WalletTransactionRequestByUserID
+    owner = {"user_id": user_id}
+    if business_id is not None:
+        schema = WalletTransactionRequestByBusinessID
+        owner = {"business_id": business_id}
+    return schema.model_construct(
+        amount=Decimal(amount),
+        currency=CurrencyChoices.IRR,
+        note=None,
+        reference=None,
+        **owner,
+        **kwargs,
+    )
+
+
+async def _ledger(wallet) -> list:
+    return await WalletTransaction.filter(wallet_id=wallet.id).order_by("id")
+
+
+async def test_batch_posts_items_on_one_wallet_in_order(user, wallet):
+    results = await post_wallet_transactions(
+        [_item("100", user.id), _item("50", user.id), _item("-30", user.id)],
+        user.id,
+        BatchPostingMode.ALL_OR_NOTHING,
+    )
+
+    assert [result["balance"] for result in results] == [
+        Decimal("100"),
+        Decimal("150"),
+        Decimal("120"),
+    ]
+    assert all(result["posted"] and result["error"] is None for result in results)
+    ledger = await _ledger(wallet)
+    assert [row.balance for row in ledger] == [
+        Decimal("100"),
+        Decimal("150"),
+        Decimal("120"),
+    ]
+    await wallet.refresh_from_db()
+    assert wallet.amount == ledger[-1].balance == Decimal("120")
+
+
+async def test_batch_finds_wallets_by_business(user, wallet):
+    business = await BusinessAccount.create(name="agency")
+    business_wallet = await Wallet.create(
+        user=await UserAccount.create(phone_number="+989120000001", business=business),
+        business=business,
+        currency=CurrencyChoices.IRR,
+    )
+
+    (result,) = await post_wallet_transactions(
+        [_item("70", business_id=business.id)], user.id, BatchPostingMode.BEST_EFFORT
+    )
+
+    assert result["wallet_id"] == business_wallet.id
+    await business_wallet.refresh_from_db()
+    assert business_wallet.amount == Decimal("70")
+
+
+async def test_all_or_nothing_posts_nothing_when_an_item_fails(user, wallet):
+    stranger = await UserAccount.create(phone_number="+989120000001")
+
+    results = await post_wallet_transactions(
+        [_item("100", user.id), _item("100", stranger.id), _item("-500", user.id)],
+        user.id,
+        BatchPostingMode.ALL_OR_NOTHING,
+    )
+
+    assert [result["error"] for result in results] == [
+        None,
+        WALLET_NOT_FOUND,
+        INSUFFICIENT_BALANCE,
+    ]
+    assert not any(result["posted"] for result in results)
+    assert all(result["balance"] is None for result in results)
+    assert await _ledger(wallet) == []
+    await wallet.refresh_from_db()
+    assert wallet.amount == Decimal("0")
+
+
+async def test_best_effort_posts_the_items_that_can_be_posted(user, wallet):
+    results = await post_wallet_transactions(
+        [
+            _item("100", user.id),
+            _item("100", user.id + 1000),
+            _item("-500", user.id),
+            _item("-40", user.id),
+        ],
+        user.id,
+        BatchPostingMode.BEST_EFFORT,
+    )
+
+    assert [result["posted"] for result in results] == [True, False, False, True]
+    assert [result["error"] for result in results] == [
+        None,
+        WALLET_NOT_FOUND,
+        INSUFFICIENT_BALANCE,
+        None,
+    ]
+    # the refused debit does not count towards the later items
+    assert results[3]["balance"] == Decimal("60")
+    ledger = await _ledger(wallet)
+    assert [row.amount for row in ledger] == [Decimal("100"), Decimal("-40")]
+    await wallet.refresh_from_db()
+    assert wallet.amount == ledger[-1].balance == Decimal("60")
+
+
+async def test_debit_may_use_the_wallet_limit(user, wallet):
+    wallet.limit = Decimal("50")
+    await wallet.save()
+
+    results = await post_wallet_transactions(
+        [_item("-50", user.id), _item("-1", user.id)],
+        user.id,
+        BatchPostingMode.BEST_EFFORT,
+    )
+
+    assert [result["error"] for result in results] == [None, INSUFFICIENT_BALANCE]
+    await wallet.refresh_from_db()
+    assert wallet.amount == Decimal("-50")
+
+
+async def test_wallets_are_created_once_per_currency(user):
+    business = await BusinessAccount.create(name="agency")
+    other = await UserAccount.create(phone_number="+989120000001")
+    existing = await Wallet.create(user=user, currency=CurrencyChoices.IRR)
+
+    await create_wallets_for_users([user.id, other.id], business=business)
+    await create_wallets_for_users([user.id, other.id], business=business)
+
+    wallets = await Wallet.all().order_by("user_id", "currency")
+    assert [(w.user_id, w.currency) for w in wallets] == [
+        (owner, currency)
+        for owner in (user.id, other.id)
+        for currency in CurrencyChoices
+    ]
+    assert existing.id in {w.id for w in wallets}
+    # the wallet that already existed keeps its business
+    assert {w.business_id for w in wallets if w.id != existing.id} == {business.id}